@@ -0,0 +1,146 @@
+import threading
+import time
+
+# Binance order statuses after which an order is no longer open
+_CLOSED_STATUSES = {'FILLED', 'CANCELED', 'EXPIRED', 'REJECTED'}
+
+# Function to build a position entry from a signed position amount
+def position_entry(symbol, position_amt, entry_price, unrealized_pnl=0.0):
+    return {
+        'symbol': symbol,
+        'side': 'long' if position_amt > 0 else 'short',
+        'positionAmt': position_amt,
+        'contracts': abs(position_amt),
+        'entryPrice': entry_price,
+        'unrealizedPnl': unrealized_pnl,
+    }
+
+# Function to build an open order entry with the fields the scripts read
+def order_entry(order_id, symbol, side, order_type, price, amount, filled, status, reduce_only):
+    return {
+        'id': str(order_id),
+        'symbol': symbol,
+        'side': side.lower(),
+        'type': order_type.lower(),
+        'price': price,
+        'amount': amount,
+        'filled': filled,
+        'status': status,
+        'reduceOnly': reduce_only,
+    }
+
+# Local copy of the account's open positions and orders, keyed by Binance
+# symbol id. Kept current by the user-data stream (ORDER_TRADE_UPDATE and
+# ACCOUNT_UPDATE) and reconciled in bulk from REST, so signal handling reads
+# positions from memory and a restarted bot starts from the exchange's state.
+# Only one-way position mode (positionSide BOTH) is tracked, like the scripts
+class AccountState:
+    def __init__(self):
+        self.positions = {}
+        self.open_orders = {}
+        # Event time of the last stream update per symbol, so a reconciliation
+        # that started earlier does not overwrite it with older data
+        self.event_times = {}
+        self.reconciled_at = None
+        self.lock = threading.Lock()
+        # Set once the first reconciliation has loaded the exchange's state
+        self.ready = threading.Event()
+        # Set while the user-data stream is connected, so readers know the
+        # state is live rather than only as fresh as the last reconciliation
+        self.connected = threading.Event()
+        # Called with every user-data message after it has been applied
+        self.listeners = []
+
+    def position(self, symbol):
+        return self.positions.get(symbol)
+
+    def orders(self, symbol):
+        with self.lock:
+            return list(self.open_orders.get(symbol, {}).values())
+
+    # 'BUY' for a long position, 'SELL' for a short one, None when flat, to
+    # restore last_order_types after a restart
+    def last_order_type(self, symbol):
+        position = self.positions.get(symbol)
+        if position is None:
+            return None
+        return 'BUY' if position['side'] == 'long' else 'SELL'
+
+    # Function to apply an ORDER_TRADE_UPDATE event
+    def apply_order_update(self, message):
+        order = message['o']
+        symbol = order['s']
+        with self.lock:
+            self.event_times[symbol] = message['E']
+            orders = self.open_orders.setdefault(symbol, {})
+            if order['X'] in _CLOSED_STATUSES:
+                orders.pop(str(order['i']), None)
+            else:
+                orders[str(order['i'])] = order_entry(
+                    order['i'], symbol, order['S'], order['o'], float(order['p']), float(order['q']),
+                    float(order['z']), order['X'], order.get('R', False)
+                )
+            if not orders:
+                del self.open_orders[symbol]
+
+    # Function to apply the positions of an ACCOUNT_UPDATE event
+    def apply_account_update(self, message):
+        with self.lock:
+            for position in message['a'].get('P', []):
+                if position.get('ps', 'BOTH') != 'BOTH':
+                    continue
+                symbol = position['s']
+                self.event_times[symbol] = message['E']
+                position_amt = float(position['pa'])
+                if position_amt == 0:
+                    self.positions.pop(symbol, None)
+                else:
+                    self.positions[symbol] = position_entry(symbol, position_amt, float(position['ep']), float(position['up']))
+
+    # Function to apply one user-data stream message
+    def handle_message(self, message):
+        event = message.get('e')
+        if event == 'ORDER_TRADE_UPDATE':
+            self.apply_order_update(message)
+        elif event == 'ACCOUNT_UPDATE':
+            self.apply_account_update(message)
+        for listener in self.listeners:
+            listener(message)
+
+    # Function to replace the state with the exchange's positions and open
+    # orders. Symbols with stream events newer than the start of the requests
+    # keep their streamed state
+    def reconcile(self, exchange):
+        started = exchange.milliseconds()
+        positions = {}
+        for position in exchange.fetch_positions():
+            info = position['info']
+            position_amt = float(info['positionAmt'])
+            if info.get('positionSide', 'BOTH') == 'BOTH' and position_amt != 0:
+                positions[info['symbol']] = position_entry(
+                    info['symbol'], position_amt, float(info['entryPrice']), float(info['unRealizedProfit'])
+                )
+        open_orders = {}
+        for order in exchange.fapiPrivateGetOpenOrders():
+            open_orders.setdefault(order['symbol'], {})[str(order['orderId'])] = order_entry(
+                order['orderId'], order['symbol'], order['side'], order['type'], float(order['price']),
+                float(order['origQty']), float(order['executedQty']), order['status'], order['reduceOnly']
+            )
+
+        with self.lock:
+            streamed = {symbol for symbol, event_time in self.event_times.items() if event_time > started}
+            for symbol in set(self.positions) | set(positions):
+                if symbol not in streamed:
+                    if symbol in positions:
+                        self.positions[symbol] = positions[symbol]
+                    else:
+                        self.positions.pop(symbol, None)
+            for symbol in set(self.open_orders) | set(open_orders):
+                if symbol not in streamed:
+                    if symbol in open_orders:
+                        self.open_orders[symbol] = open_orders[symbol]
+                    else:
+                        self.open_orders.pop(symbol, None)
+            self.reconciled_at = time.time()
+        self.ready.set()
+        print(f"Reconciled {len(positions)} positions and {sum(len(orders) for orders in open_orders.values())} open orders")
@@ -0,0 +1,186 @@
+import asyncio
+import time
+import numpy as np
+from config import fetch_max_concurrency, fetch_weight_budget, fetch_sweep_timeout
+from ticker_snapshot import TickerSnapshot
+from ohlcv import TIMESTAMP, parse_klines
+from exchange_factory import create_async_exchange
+from metrics import EXCHANGE_REQUEST_SECONDS, EXCHANGE_REQUEST_ERRORS, RATE_LIMIT_WAIT_SECONDS, FETCH_TIMEOUTS, STAGE_SECONDS
+
+# Event loop and async Binance Futures client shared by every sweep, so markets
+# are loaded once and HTTP connections are reused between sweeps
+_loop = None
+_exchange = None
+_tickers = None
+
+# Weight budgets by their weight per minute, kept across sweeps so sweeps that
+# follow each other within a minute share one minute's weight
+_budgets = {}
+
+# Weight of the bulk 24hr ticker and book ticker requests (no symbol)
+TICKERS_WEIGHT = 40 + 2
+
+# Binance returns at most 1500 klines per request
+MAX_KLINES_LIMIT = 1500
+
+# Binance futures klines request weight depends on the requested limit
+def kline_weight(limit):
+    if limit is None or limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+# Token bucket holding the request weight a sweep may spend per minute
+class WeightBudget:
+    def __init__(self, weight_per_minute):
+        self.capacity = float(weight_per_minute)
+        self.tokens = float(weight_per_minute)
+        self.refill_rate = weight_per_minute / 60.0
+        self.last_refill = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+
+    async def acquire(self, weight):
+        weight = min(weight, self.capacity)
+        self._refill()
+        while self.tokens < weight:
+            wait = (weight - self.tokens) / self.refill_rate
+            RATE_LIMIT_WAIT_SECONDS.inc(wait, limiter='sweep_budget')
+            await asyncio.sleep(wait)
+            self._refill()
+        self.tokens -= weight
+
+# Function to get the shared event loop
+def get_loop():
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop
+
+# Function to get the shared async Binance Futures client
+def get_exchange():
+    global _exchange
+    if _exchange is None:
+        # Each request also draws from the weight shared with the other bot processes
+        _exchange = create_async_exchange(get_loop())
+    return _exchange
+
+# Function to get the weight budget shared by every sweep
+def get_budget(weight_per_minute):
+    if weight_per_minute not in _budgets:
+        _budgets[weight_per_minute] = WeightBudget(weight_per_minute)
+    return _budgets[weight_per_minute]
+
+# Function to get the ticker snapshot shared by every sweep
+def get_tickers():
+    global _tickers
+    if _tickers is None:
+        _tickers = TickerSnapshot()
+    return _tickers
+
+# Function to refresh the ticker snapshot with two bulk requests
+async def refresh_tickers(exchange, tickers, budget):
+    if not tickers.is_fresh():
+        await budget.acquire(TICKERS_WEIGHT)
+        try:
+            with EXCHANGE_REQUEST_SECONDS.time(endpoint='tickers'):
+                await tickers.refresh_async(exchange)
+        except Exception:
+            EXCHANGE_REQUEST_ERRORS.inc(endpoint='tickers')
+            raise
+
+# Function to fetch candles for one symbol as a (candles x 6) array. The raw
+# klines endpoint is parsed straight into the array instead of going through
+# ccxt's per-candle parsing. Gaps longer than one request are paged through
+# from `since` on, MAX_KLINES_LIMIT candles at a time
+async def fetch_symbol(exchange, symbol, timeframe, limit, semaphore, budget, cache=None):
+    since = None
+    if cache is not None:
+        # Only request the candles newer than the cached history
+        since, limit = cache.request_window(symbol, limit)
+
+    pages = []
+    while True:
+        request = {'symbol': symbol, 'interval': timeframe, 'limit': min(limit, MAX_KLINES_LIMIT)}
+        if since is not None:
+            request['startTime'] = since
+        async with semaphore:
+            await budget.acquire(kline_weight(request['limit']))
+            try:
+                with EXCHANGE_REQUEST_SECONDS.time(endpoint='fetch_ohlcv'):
+                    page = parse_klines(await exchange.fapiPublicGetKlines(request))
+            except Exception:
+                EXCHANGE_REQUEST_ERRORS.inc(endpoint='fetch_ohlcv')
+                raise
+        pages.append(page)
+        limit -= len(page)
+        # A short page has reached the newest candle
+        if since is None or limit <= 0 or len(page) < request['limit']:
+            break
+        since = int(page[-1, TIMESTAMP]) + 1
+    ohlcv = pages[0] if len(pages) == 1 else np.concatenate(pages)
+
+    if cache is not None:
+        ohlcv = cache.merge(symbol, ohlcv)
+    return ohlcv
+
+# Function to fetch all symbols concurrently within the sweep timeout. Tickers
+# come from the shared snapshot, refreshed in bulk alongside the candles.
+# `exchange` defaults to the shared client
+async def fetch_snapshot_async(symbols, timeframe, limit, cache=None, tickers=None, max_concurrency=fetch_max_concurrency,
+                               weight_budget=fetch_weight_budget, timeout=fetch_sweep_timeout, exchange=None):
+    exchange = get_exchange() if exchange is None else exchange
+    await exchange.load_markets()
+    tickers = get_tickers() if tickers is None else tickers
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    budget = get_budget(weight_budget)
+    ticker_task = asyncio.ensure_future(refresh_tickers(exchange, tickers, budget))
+    tasks = {
+        asyncio.ensure_future(fetch_symbol(exchange, symbol, timeframe, limit, semaphore, budget, cache)): symbol
+        for symbol in symbols
+    }
+    done, pending = await asyncio.wait([ticker_task, *tasks], timeout=timeout)
+
+    if ticker_task in pending:
+        print("Timed out fetching tickers")
+    elif ticker_task.exception() is not None:
+        print(f"Error fetching tickers: {ticker_task.exception()}")
+    done.discard(ticker_task)
+
+    for task in pending:
+        task.cancel()
+        if task is not ticker_task:
+            print(f"Timed out fetching data for {tasks[task]}")
+            FETCH_TIMEOUTS.inc()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results = {}
+    for task in done:
+        if task.exception() is not None:
+            print(f"Error fetching data for {tasks[task]}: {task.exception()}")
+            continue
+        # Symbols missing from the ticker snapshot get an empty ticker
+        results[tasks[task]] = {'ohlcv': task.result(), 'ticker': tickers.get(tasks[task]) or {}}
+
+    # Keep the snapshot in the same order as the requested symbols
+    return {symbol: results[symbol] for symbol in symbols if symbol in results}
+
+# Function to fetch a complete per-sweep snapshot from synchronous code
+def fetch_snapshot(symbols, timeframe, limit, **kwargs):
+    with STAGE_SECONDS.time(stage='fetch'):
+        return get_loop().run_until_complete(fetch_snapshot_async(symbols, timeframe, limit, **kwargs))
+
+# Function to release the shared async client
+def close():
+    global _exchange
+    if _exchange is not None:
+        get_loop().run_until_complete(_exchange.close())
+        _exchange = None
@@ -0,0 +1,200 @@
+import argparse
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from signals import SIGNAL_BARS, ema_matrix, trend_signals, confirmed_crossover_signals, gap_crossover_signals
+
+# Parameter sets and order semantics of the strategy scripts. 'flip' closes the
+# open position before opening the opposite one (close_open_position), 'stack'
+# just adds a fixed USDT order per signal
+STRATEGIES = {
+    'main': dict(short_ema_period=9, long_ema_period=21, rule=trend_signals,
+                 order_type='market', position_mode='flip', fixed_quantity_usdt=100),
+    'main1': dict(short_ema_period=9, long_ema_period=21, rule=trend_signals,
+                  order_type='limit', limit_offset_percentage=0.1, position_mode='flip', fixed_quantity_usdt=100),
+    'main2': dict(short_ema_period=9, long_ema_period=21, rule=trend_signals,
+                  order_type='market', position_mode='flip', fixed_quantity_usdt=100),
+    'main3': dict(short_ema_period=5, long_ema_period=10, rule=trend_signals,
+                  order_type='market', position_mode='flip', fixed_quantity_usdt=100),
+    'run': dict(short_ema_period=7, long_ema_period=99, rule=confirmed_crossover_signals,
+                order_type='market', position_mode='stack', fixed_quantity_usdt=11),
+    'run_bot': dict(short_ema_period=7, long_ema_period=21, rule=confirmed_crossover_signals,
+                    order_type='market', position_mode='stack', fixed_quantity_usdt=10),
+    '2': dict(short_ema_period=5, long_ema_period=200, rule=gap_crossover_signals,
+              rule_params={'min_percentage_condition': 0.3},
+              order_type='market', position_mode='stack', fixed_quantity_usdt=5),
+}
+
+# Binance USDT-M futures default fees
+TAKER_FEE = 0.0004
+MAKER_FEE = 0.0002
+
+# Function to download candle history for backtesting into the candle store,
+# continuing from the last stored candle of each symbol
+def download_history(exchange, store, symbols, timeframe, since, limit=1500):
+    for symbol in symbols:
+        last_timestamp = store.last_timestamp(symbol, timeframe)
+        start = since if last_timestamp is None else max(since, last_timestamp + 1)
+        downloaded = 0
+        while True:
+            batch = exchange.fetch_ohlcv(symbol, timeframe, since=start, limit=limit)
+            # The last candle may still be forming
+            closed = [candle for candle in batch if candle[0] + exchange.parse_timeframe(timeframe) * 1000 <= exchange.milliseconds()]
+            downloaded += store.append(symbol, timeframe, closed)
+            if len(batch) < limit:
+                break
+            start = batch[-1][0] + 1
+        print(f"Downloaded {downloaded} candles for {symbol}")
+
+# Function to load stored candle history as {symbol: (candles x 6) array}
+def load_history(store, symbols, timeframe, since=None):
+    history = {}
+    for symbol in symbols:
+        candles = store.read_ohlcv(symbol, timeframe, since)
+        if len(candles):
+            history[symbol] = candles
+    return history
+
+# Function to forward fill NaN values along the bars axis of a (symbols x bars) matrix
+def forward_fill(matrix):
+    index = np.where(np.isnan(matrix), 0, np.arange(matrix.shape[1]))
+    np.maximum.accumulate(index, axis=1, out=index)
+    return matrix[np.arange(matrix.shape[0])[:, None], index]
+
+# Function to align candle histories on one timeline, returning the timestamps and
+# (symbols x bars) high/low/close matrices. Gaps inside a history are forward
+# filled, bars before a symbol's first candle stay NaN
+def align_history(history):
+    symbols = list(history)
+    timestamps = np.unique(np.concatenate([history[symbol][:, 0] for symbol in symbols]))
+    matrices = {column: np.full((len(symbols), len(timestamps)), np.nan) for column in ('high', 'low', 'close')}
+    for row, symbol in enumerate(symbols):
+        candles = history[symbol]
+        positions = np.searchsorted(timestamps, candles[:, 0])
+        matrices['high'][row, positions] = candles[:, 2]
+        matrices['low'][row, positions] = candles[:, 3]
+        matrices['close'][row, positions] = candles[:, 4]
+    matrices['close'] = forward_fill(matrices['close'])
+    return symbols, timestamps, matrices
+
+# Function to evaluate a signal rule at every bar, returning +1 (buy), -1 (sell) or 0.
+# Each bar is evaluated as if it were the latest one, so it plays the role of
+# the forming candle in the live scripts
+def signal_matrix(closes, short_ema_period, long_ema_period, rule, rule_params=None, short_ema=None, long_ema=None):
+    short_ema = ema_matrix(closes, short_ema_period) if short_ema is None else short_ema
+    long_ema = ema_matrix(closes, long_ema_period) if long_ema is None else long_ema
+    buy, sell = rule(
+        sliding_window_view(short_ema, SIGNAL_BARS, axis=1),
+        sliding_window_view(long_ema, SIGNAL_BARS, axis=1),
+        **(rule_params or {})
+    )
+    signals = np.zeros(closes.shape, dtype=np.int8)
+    signals[:, SIGNAL_BARS - 1:] = np.where(buy, 1, np.where(sell, -1, 0))
+    # No signal until a symbol has as many candles as the scripts require
+    signals[np.cumsum(~np.isnan(closes), axis=1) < long_ema_period] = 0
+    return signals
+
+# Function to keep only signals that differ from the last order type, like the
+# last_order_types check in the scripts
+def order_events(signals):
+    index = np.where(signals != 0, np.arange(signals.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    last = signals[np.arange(signals.shape[0])[:, None], index]
+    previous = np.zeros_like(last)
+    previous[:, 1:] = last[:, :-1]
+    return np.where((signals != 0) & (signals != previous), signals, 0)
+
+# Function to backtest one strategy over aligned history. Market orders fill at
+# the signal bar's close; limit orders are placed limit_offset_percentage
+# inside the close and fill on the next bar if its range reaches the price
+def run_backtest(symbols, timestamps, matrices, short_ema_period, long_ema_period, rule, rule_params=None,
+                 order_type='market', position_mode='flip', fixed_quantity_usdt=100, limit_offset_percentage=0.1,
+                 taker_fee=TAKER_FEE, maker_fee=MAKER_FEE, short_ema=None, long_ema=None):
+    closes, highs, lows = matrices['close'], matrices['high'], matrices['low']
+    events = order_events(signal_matrix(closes, short_ema_period, long_ema_period, rule, rule_params, short_ema, long_ema))
+    # Quantity is sized from the close at the time of the signal
+    quantity = np.where(events != 0, fixed_quantity_usdt / closes, 0.0)
+
+    if order_type == 'limit':
+        fill_price = np.full(closes.shape, np.nan)
+        limit_price = closes * (1 - events * limit_offset_percentage / 100)
+        next_low = np.roll(lows, -1, axis=1)
+        next_high = np.roll(highs, -1, axis=1)
+        filled = (
+            ((events == 1) & (next_low <= limit_price)) |
+            ((events == -1) & (next_high >= limit_price))
+        )
+        filled[:, -1] = False
+        # Book the fill on the bar after the signal
+        filled = np.roll(filled, 1, axis=1)
+        fill_price[filled] = np.roll(limit_price, 1, axis=1)[filled]
+        direction = np.roll(events, 1, axis=1) * filled
+        quantity = np.roll(quantity, 1, axis=1) * filled
+        fee_rate = maker_fee
+    else:
+        filled = events != 0
+        fill_price = np.where(filled, closes, np.nan)
+        direction = events
+        fee_rate = taker_fee
+
+    if position_mode == 'flip':
+        # Each filled order leaves exactly its own quantity as the position
+        target = np.where(filled, direction * quantity, np.nan)
+        target[:, 0] = np.where(filled[:, 0], target[:, 0], 0.0)
+        position = forward_fill(target)
+    else:
+        position = np.cumsum(direction * quantity, axis=1)
+
+    traded = np.diff(position, axis=1, prepend=0.0)
+    traded_value = np.where(filled, traded * fill_price, 0.0)
+    fees = np.abs(traded_value) * fee_rate
+    cash = -np.cumsum(traded_value + fees, axis=1)
+    equity = cash + position * np.nan_to_num(closes)
+
+    total_equity = equity.sum(axis=0)
+    drawdown = np.maximum.accumulate(total_equity) - total_equity
+    return {
+        'symbols': symbols,
+        'timestamps': timestamps,
+        'equity': total_equity,
+        'pnl_by_symbol': equity[:, -1],
+        'fees_by_symbol': fees.sum(axis=1),
+        'trades_by_symbol': np.count_nonzero(filled, axis=1),
+        'total_pnl': float(total_equity[-1]),
+        'total_fees': float(fees.sum()),
+        'max_drawdown': float(drawdown.max()),
+    }
+
+# Function to turn a backtest result into a per-symbol pandas table for reporting
+def summary(result):
+    import pandas as pd
+    return pd.DataFrame({
+        'pnl': result['pnl_by_symbol'],
+        'fees': result['fees_by_symbol'],
+        'trades': result['trades_by_symbol'],
+    }, index=result['symbols']).sort_values('pnl', ascending=False)
+
+if __name__ == '__main__':
+    from ccxt import Exchange
+    from candle_store import CandleStore
+    from config import symbols, time_interval, candle_store_path
+
+    parser = argparse.ArgumentParser(description='Backtest the EMA crossover strategies on stored candles')
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='main')
+    parser.add_argument('--path', default=candle_store_path, help='Candle store directory')
+    parser.add_argument('--timeframe', default=time_interval)
+    parser.add_argument('--since', help='Only test from this date (e.g. 2023-01-01)')
+    parser.add_argument('--download-since', help='Download history from this date (e.g. 2023-01-01) before testing')
+    args = parser.parse_args()
+
+    store = CandleStore(args.path)
+    if args.download_since:
+        from exchange_factory import create_exchange
+        exchange = create_exchange()
+        download_history(exchange, store, symbols, args.timeframe, exchange.parse8601(args.download_since + 'T00:00:00Z'))
+
+    since = Exchange.parse8601(args.since + 'T00:00:00Z') if args.since else None
+    history = load_history(store, symbols, args.timeframe, since)
+    result = run_backtest(*align_history(history), **STRATEGIES[args.strategy])
+    print(summary(result).to_string())
+    print(f"Total PnL: {result['total_pnl']:.2f} USDT, fees: {result['total_fees']:.2f} USDT, "
+          f"max drawdown: {result['max_drawdown']:.2f} USDT")
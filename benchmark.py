@@ -0,0 +1,331 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import signals
+import order_executor
+from async_fetcher import fetch_snapshot
+from account_state import AccountState
+from candle_cache import CandleCache
+from candle_store import CandleStore
+from ema_state import EMABook
+from market_index import MarketIndex
+from mock_exchange import MockVenue, AsyncMockExchange
+from ohlcv import timeframe_ms
+from order_executor import execute_orders, flip_order
+from signals import evaluate_signals, trend_signals
+from ticker_snapshot import TickerSnapshot
+
+# Same parameters as main.py
+SHORT_EMA_PERIOD = 9
+LONG_EMA_PERIOD = 21
+FIXED_QUANTITY_USDT = 100
+FETCH_LIMIT = 100
+
+# Stages reported for each sweep, nested ones indented under their parent
+STAGES = (
+    'sweep',
+    'fetch', 'fetch.merge', 'fetch.tickers',
+    'signals', 'signals.close_matrix', 'signals.ema_seeds', 'signals.ema_matrix', 'signals.rule', 'signals.select',
+    'orders', 'orders.round',
+    'pandas_reference',
+)
+
+# Wall time, and while tracemalloc is tracing the memory, spent per stage.
+# `allocated` is the traced memory a stage left behind, `peak` how far the
+# traced memory rose above its level at the start of a top-level stage
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+        self.allocated = {}
+        self.peaks = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        tracing = tracemalloc.is_tracing()
+        top_level = '.' not in name and name != 'sweep'
+        if tracing:
+            before = tracemalloc.get_traced_memory()[0]
+            if top_level:
+                tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - started
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                self.allocated[name] = self.allocated.get(name, 0) + current - before
+                if top_level:
+                    self.peaks[name] = max(self.peaks.get(name, 0), peak - before)
+
+# Function to wrap a function of the sweep so its calls are timed as `stage`
+def timed(timer, stage, function):
+    def wrapper(*args, **kwargs):
+        with timer.stage(stage):
+            return function(*args, **kwargs)
+    return wrapper
+
+# Function to time the functions a sweep calls by swapping in timed wrappers
+# for the duration of one sweep
+@contextlib.contextmanager
+def instrument(timer, context):
+    targets = [
+        (signals, 'close_matrix', 'signals.close_matrix'),
+        (signals, 'ema_matrix', 'signals.ema_matrix'),
+        (signals, 'select_signals', 'signals.select'),
+        (order_executor, 'round_orders', 'orders.round'),
+        (context['cache'], 'merge', 'fetch.merge'),
+        (context['tickers'], 'update', 'fetch.tickers'),
+        (context['ema_book'], 'seeds', 'signals.ema_seeds'),
+    ]
+    originals = [(owner, name, owner.__dict__.get(name)) for owner, name, _ in targets]
+    for owner, name, stage in targets:
+        setattr(owner, name, timed(timer, stage, getattr(owner, name)))
+    try:
+        yield
+    finally:
+        for owner, name, original in originals:
+            if original is None:
+                # Instance attribute shadowing a method
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+
+# Function to build the venue, trading rules, candle history and state of one
+# benchmark case: `symbol_count` symbols with `window` candles each. The venue
+# clock runs `lag_candles` behind real time and catches up one candle per
+# sweep, so every sweep sees one newly closed candle per symbol like a bot
+# woken up at each candle close
+def setup_case(symbol_count, window, timeframe, seed, latency, lag_candles, store_path):
+    from config import symbols as config_symbols
+    names = list(config_symbols[:symbol_count])
+    names += [f"SYN{index:04d}USDT" for index in range(symbol_count - len(names))]
+
+    interval_ms = timeframe_ms(timeframe)
+    lag = [lag_candles * interval_ms]
+    history_days = window * interval_ms // 86400000 + 2
+    venue = MockVenue(names, timeframe, seed, history_days, weight_limit_per_minute=10 ** 12,
+                      clock=lambda: int(time.time() * 1000) - lag[0])
+
+    market_index = MarketIndex().build(venue.fapiPublicGetExchangeInfo(), venue.fapiPrivateGetLeverageBracket())
+    cache = CandleCache(timeframe, window, CandleStore(store_path))
+    now = venue.clock()
+    last = (now - venue.start) // interval_ms
+    for symbol in names:
+        cache.merge(symbol, venue.candles(symbol, interval_ms, max(last - window + 1, 0), last, now))
+
+    account_state = AccountState()
+    venue.listeners.append(account_state.handle_message)
+    return {
+        'symbols': names,
+        'timeframe': timeframe,
+        'timeframe_ms': interval_ms,
+        'venue': venue,
+        'lag': lag,
+        'exchange': AsyncMockExchange(venue, latency),
+        'market_index': market_index,
+        'cache': cache,
+        # Refreshed on every sweep
+        'tickers': TickerSnapshot(ttl=0),
+        'ema_book': EMABook(),
+        'account_state': account_state,
+        'last_order_types': {symbol: None for symbol in names},
+    }
+
+# Function to turn signals into flip orders like handle_signals in main.py
+def build_orders(context, snapshot, found):
+    orders = []
+    cancels = []
+    for symbol, signal in found.items():
+        latest_candle = snapshot[symbol]['ticker']
+        if 'close' not in latest_candle:
+            print(f"Error: 'close' not found in the latest_candle for {symbol}")
+            continue
+        latest_close = float(latest_candle['close'])
+        quantity = FIXED_QUANTITY_USDT / latest_close
+        print(f"Symbol: {symbol}, Latest Close: {latest_close}, Quantity: {quantity}")
+        order = flip_order(symbol, signal, quantity, context['account_state'].position(symbol), price=latest_close)
+        context['last_order_types'][symbol] = signal
+        # Every order on the case's venue is the benchmark's own
+        cancels.extend((symbol, order['id']) for order in context['account_state'].orders(symbol))
+        if order is not None:
+            orders.append(order)
+    return orders, cancels
+
+# Function to time the original per-symbol pandas pipeline (DataFrame,
+# ewm, to_datetime) on a snapshot, for comparison with the batched signals
+def pandas_reference(snapshot):
+    import pandas as pd
+    for symbol in snapshot:
+        df = pd.DataFrame(snapshot[symbol]['ohlcv'], columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        df['short_ema'] = df['close'].ewm(span=SHORT_EMA_PERIOD, adjust=False).mean()
+        df['long_ema'] = df['close'].ewm(span=LONG_EMA_PERIOD, adjust=False).mean()
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        df.set_index('timestamp', inplace=True)
+
+# Function to run one sweep of the EMA strategy against the case's venue:
+# fetch new candles and tickers, evaluate the signals of every symbol and
+# execute the resulting orders. Returns the stage timer and the order count
+def run_sweep(context, with_pandas=False):
+    context['lag'][0] = max(context['lag'][0] - context['timeframe_ms'], 0)
+    timer = StageTimer()
+    rule = timed(timer, 'signals.rule', trend_signals)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), instrument(timer, context):
+        with timer.stage('sweep'):
+            with timer.stage('fetch'):
+                snapshot = fetch_snapshot(
+                    context['symbols'], context['timeframe'], FETCH_LIMIT, cache=context['cache'],
+                    tickers=context['tickers'], weight_budget=10 ** 12, exchange=context['exchange'])
+            with timer.stage('signals'):
+                found = evaluate_signals(snapshot, context['ema_book'], SHORT_EMA_PERIOD, LONG_EMA_PERIOD, rule,
+                                         context['last_order_types'])
+            with timer.stage('orders'):
+                orders, cancels = build_orders(context, snapshot, found)
+                if orders or cancels:
+                    execute_orders(orders, context['market_index'], cancels, exchange=context['exchange'])
+        if with_pandas:
+            with timer.stage('pandas_reference'):
+                pandas_reference(snapshot)
+    return timer, len(orders)
+
+# Function to benchmark one case: a cold sweep (EMA states seeded from the
+# whole window), `sweeps` warm sweeps and two more warm sweeps traced with
+# tracemalloc, the second one reported for allocations
+def run_case(symbol_count, window, timeframe, sweeps, seed, latency, with_pandas):
+    with tempfile.TemporaryDirectory() as store_path:
+        setup_started = time.perf_counter()
+        context = setup_case(symbol_count, window, timeframe, seed, latency, sweeps + 4, store_path)
+        setup_seconds = time.perf_counter() - setup_started
+
+        cold, cold_orders = run_sweep(context, with_pandas)
+        warm = [run_sweep(context, with_pandas)[0] for _ in range(sweeps)]
+        tracemalloc.start()
+        try:
+            # Warm up under tracing first, so memory freed by the traced sweep
+            # was traced when it was allocated
+            run_sweep(context, with_pandas)
+            traced, _ = run_sweep(context, with_pandas)
+        finally:
+            tracemalloc.stop()
+
+    stages = [stage for stage in STAGES if stage in cold.seconds]
+    return {
+        'symbols': symbol_count,
+        'window': window,
+        'sweeps': sweeps,
+        'setup_seconds': setup_seconds,
+        'cold_orders': cold_orders,
+        'cold': {stage: cold.seconds[stage] for stage in stages},
+        'warm': {stage: statistics.median(timer.seconds.get(stage, 0.0) for timer in warm) for stage in stages},
+        'allocated': {stage: traced.allocated.get(stage, 0) for stage in stages},
+        'peak': traced.peaks,
+        'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'history_bytes': context['cache'].nbytes,
+    }
+
+# Function to describe the code and environment a run measured
+def run_info():
+    repo = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, False
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'commit': commit,
+        'dirty': dirty,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+    }
+
+def print_case(case):
+    print(f"{case['symbols']} symbols x {case['window']} candles: cold sweep {case['cold']['sweep'] * 1000:.1f} ms "
+          f"({case['cold_orders']} orders), warm sweep {case['warm']['sweep'] * 1000:.1f} ms median of {case['sweeps']}, "
+          f"setup {case['setup_seconds']:.1f} s, candle history {case['history_bytes'] / 2 ** 20:.1f} MB, "
+          f"max RSS {case['max_rss'] / 2 ** 20:.0f} MB")
+    print(f"  {'stage':<24}{'cold ms':>10}{'warm ms':>10}{'alloc KB':>11}{'peak KB':>10}")
+    for stage, seconds in case['cold'].items():
+        peak = case['peak'].get(stage)
+        print(f"  {'  ' * stage.count('.') + stage.split('.')[-1]:<24}{seconds * 1000:>10.2f}{case['warm'][stage] * 1000:>10.2f}"
+              f"{case['allocated'][stage] / 1024:>11.1f}{'' if peak is None else f'{peak / 1024:.1f}':>10}")
+
+# Function to load the previous run stored in the results file
+def previous_run(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        lines = [line for line in file if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+# Function to print stages whose warm sweep time or allocations grew by more
+# than `threshold` (a fraction) since the previous run
+def compare(previous, run, threshold):
+    cases = {(case['symbols'], case['window']): case for case in previous['cases']}
+    regressions = 0
+    print(f"Compared with {previous['info']['commit']}{' (dirty)' if previous['info']['dirty'] else ''} "
+          f"from {previous['info']['time']}:")
+    for case in run['cases']:
+        before = cases.get((case['symbols'], case['window']))
+        if before is None:
+            continue
+        for stage, seconds in case['warm'].items():
+            old = before['warm'].get(stage)
+            if old and seconds > old * (1 + threshold):
+                regressions += 1
+                print(f"  {case['symbols']}x{case['window']} {stage}: {old * 1000:.2f} -> {seconds * 1000:.2f} ms "
+                      f"(+{(seconds / old - 1) * 100:.0f}%)")
+            old = before['allocated'].get(stage)
+            new = case['allocated'].get(stage)
+            if old and old > 0 and new > old * (1 + threshold):
+                regressions += 1
+                print(f"  {case['symbols']}x{case['window']} {stage}: allocated {old / 1024:.1f} -> {new / 1024:.1f} KB")
+    if not regressions:
+        print("  no stage regressed")
+    return regressions
+
+if __name__ == '__main__':
+    from config import time_interval, mock_seed
+
+    parser = argparse.ArgumentParser(description='Benchmark the strategy sweep against the mock exchange')
+    parser.add_argument('--symbols', default='50,200,1000', help='Comma separated symbol counts')
+    parser.add_argument('--windows', default='100,1000,5000', help='Comma separated candles of history per symbol')
+    parser.add_argument('--timeframe', default=time_interval)
+    parser.add_argument('--sweeps', type=int, default=5, help='Warm sweeps per case (at most 90)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every mocked request')
+    parser.add_argument('--seed', type=int, default=mock_seed)
+    parser.add_argument('--pandas', action='store_true', help='Also time the original pandas EMA pipeline')
+    parser.add_argument('--output', default='benchmark_results.jsonl', help='Results file, one run per line')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative growth reported as a regression')
+    args = parser.parse_args()
+    # A case starts sweeps + 4 candles behind real time and catches up one candle
+    # per sweep; the cap keeps that lag inside the venue's two spare days of
+    # history at 15m. Each sweep is one candle behind the cache, well within its
+    # depth, so no sweep refetches the whole history
+    sweeps = min(max(args.sweeps, 1), 90)
+
+    run = {'info': run_info(), 'cases': []}
+    for window in (int(value) for value in args.windows.split(',')):
+        for symbol_count in (int(value) for value in args.symbols.split(',')):
+            case = run_case(symbol_count, window, args.timeframe, sweeps, args.seed, args.latency, args.pandas)
+            print_case(case)
+            run['cases'].append(case)
+
+    previous = previous_run(args.output)
+    if previous is not None:
+        compare(previous, run, args.threshold)
+    with open(args.output, 'a') as file:
+        file.write(json.dumps(run) + '\n')
+    print(f"Results appended to {args.output}")
@@ -0,0 +1,150 @@
+import time
+import numpy as np
+from ohlcv import COLUMNS, TIMESTAMP, CLOSE, empty_ohlcv, parse_ohlcv, timeframe_ms
+
+# Fixed-size history of the last `depth` candles of one symbol. Every candle
+# is written twice, at slot i and i + depth of a (2 x depth) x 6 float64
+# buffer, so the newest candles are always one contiguous slice and views for
+# indicators never copy. Appending or overwriting the forming bar is O(1) and
+# memory stays at 2 x depth x 6 x 8 bytes however long the bot runs
+class CandleRing:
+    __slots__ = ('depth', 'buffer', 'end', 'length')
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.buffer = np.empty((2 * depth, len(COLUMNS)))
+        self.end = 0  # Slot after the newest candle
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes
+
+    def last_timestamp(self):
+        return int(self.buffer[self.end - 1 + self.depth, TIMESTAMP]) if self.length else None
+
+    # Function to get the newest `count` candles (all by default) as a
+    # read-only view; it follows later writes, so copy it to keep it
+    def view(self, count=None):
+        count = self.length if count is None else min(count, self.length)
+        view = self.buffer[self.end + self.depth - count:self.end + self.depth]
+        view.flags.writeable = False
+        return view
+
+    def clear(self):
+        self.end = 0
+        self.length = 0
+
+    # Function to drop all but the oldest `length` stored candles
+    def truncate(self, length):
+        self.end = (self.end - (self.length - length)) % self.depth
+        self.length = length
+
+    # Function to append candles after the newest one
+    def write(self, rows):
+        rows = rows[-self.depth:]
+        if len(rows) == 1:
+            self.buffer[self.end] = self.buffer[self.end + self.depth] = rows[0]
+        else:
+            slots = (self.end + np.arange(len(rows))) % self.depth
+            self.buffer[slots] = rows
+            self.buffer[slots + self.depth] = rows
+        self.end = (self.end + len(rows)) % self.depth
+        self.length = min(self.length + len(rows), self.depth)
+
+    # Function to merge a candle array: stored candles from the first new
+    # timestamp on (e.g. the forming bar) are overwritten
+    def merge(self, rows):
+        if len(rows):
+            first_timestamp = rows[0, TIMESTAMP]
+            last_timestamp = self.last_timestamp()
+            if last_timestamp is not None and first_timestamp <= last_timestamp:
+                if first_timestamp == last_timestamp:
+                    self.truncate(self.length - 1)
+                else:
+                    self.truncate(int(self.view()[:, TIMESTAMP].searchsorted(first_timestamp)))
+            self.write(rows)
+        return self.view()
+
+# In-memory candle history per symbol, so each sweep only downloads the candles
+# that are newer than the last stored one. Each symbol's history is a
+# CandleRing of `depth` candles, so the cache of a timeframe takes a fixed
+# symbols x 2 x depth x 6 float64. With a CandleStore, history is loaded from
+# disk on first use and closed candles are persisted as they arrive
+class CandleCache:
+    def __init__(self, timeframe, depth, store=None):
+        self.timeframe = timeframe
+        self.timeframe_ms = timeframe_ms(timeframe)
+        self.depth = depth
+        self.store = store
+        self.rings = {}
+
+    @property
+    def nbytes(self):
+        return sum(ring.nbytes for ring in self.rings.values())
+
+    def ring(self, symbol):
+        ring = self.rings.get(symbol)
+        if ring is None:
+            ring = self.rings[symbol] = CandleRing(self.depth)
+        return ring
+
+    # Function to load a symbol's most recent history from the candle store
+    def load(self, symbol):
+        if self.store is not None and symbol not in self.rings:
+            self.ring(symbol).merge(self.store.read_ohlcv(symbol, self.timeframe, limit=self.depth))
+        return self.get(symbol)
+
+    # Timestamp of the last stored candle, or None when nothing is stored yet
+    def last_timestamp(self, symbol):
+        ring = self.rings.get(symbol)
+        return ring.last_timestamp() if ring is not None else None
+
+    # Function to work out the since/limit pair for the next request of a
+    # symbol. The whole gap since the last stored candle is requested, however
+    # long, so the history (and the store) stays contiguous; the caller pages
+    # through it
+    def request_window(self, symbol, limit, now_ms=None):
+        self.load(symbol)
+        last_timestamp = self.last_timestamp(symbol)
+        if last_timestamp is None:
+            return None, limit
+
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        # The last stored candle is requested again because it may still have been forming
+        missing = (now_ms - last_timestamp) // self.timeframe_ms + 1
+        if missing > self.depth:
+            # The gap is longer than the history kept, start again from the latest window
+            self.rings[symbol].clear()
+            return None, limit
+        return last_timestamp, max(int(missing), 1)
+
+    # Function to merge freshly fetched candles (a candle array or ccxt
+    # candles) into the stored history, returning a view of the history.
+    # Fetched klines end with the forming candle; `closed` says the last one
+    # has closed too, like the candles of the kline stream
+    def merge(self, symbol, ohlcv, closed=False):
+        ohlcv = parse_ohlcv(ohlcv)
+        candles = self.ring(symbol).merge(ohlcv)
+        if len(ohlcv) and self.store is not None:
+            # Only closed candles are persisted
+            self.store.append(symbol, self.timeframe, ohlcv if closed else ohlcv[:-1])
+        return candles
+
+    # Function to merge a closed kline stream candle and return the history as
+    # a sweep right after the close sees it: followed by the next candle, just
+    # opened at the close. The signal rules and EMAs treat the last candle as
+    # still forming, so without it the closed candle would be evaluated as if
+    # it were forming and signals on it would come a candle late. The opened
+    # candle is only added to the returned copy, not to the history
+    def merge_closed(self, symbol, candle):
+        candles = self.merge(symbol, [candle], closed=True)
+        close = candles[-1, CLOSE]
+        return np.vstack([candles, [candles[-1, TIMESTAMP] + self.timeframe_ms, close, close, close, close, 0.0]])
+
+    def get(self, symbol):
+        ring = self.rings.get(symbol)
+        return ring.view() if ring is not None else empty_ohlcv()
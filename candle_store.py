@@ -0,0 +1,123 @@
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+from config import candle_store_path
+from ohlcv import COLUMNS, TIMESTAMP, empty_ohlcv, parse_ohlcv
+
+# On-disk candle history, one directory per timeframe/symbol/year holding one
+# raw float64 file per column. Writes only ever append, reads memory-map the
+# files so the strategy loop, backtests and reporting share history without
+# copying it or hitting the exchange. Every bot appends to the same store, so
+# appends to a symbol's history are serialized with an flock
+class CandleStore:
+    def __init__(self, root=candle_store_path):
+        self.root = root
+
+    def symbol_path(self, symbol, timeframe):
+        return os.path.join(self.root, timeframe, symbol)
+
+    # Years stored for a symbol, oldest first
+    def partitions(self, symbol, timeframe):
+        path = self.symbol_path(symbol, timeframe)
+        if not os.path.isdir(path):
+            return []
+        return sorted(int(name) for name in os.listdir(path) if name.isdigit())
+
+    # Number of complete rows in a partition; a crash between column writes can
+    # leave some columns one row longer than the others
+    def partition_length(self, symbol, timeframe, year):
+        path = os.path.join(self.symbol_path(symbol, timeframe), str(year))
+        sizes = [
+            os.path.getsize(os.path.join(path, f"{column}.f8")) if os.path.exists(os.path.join(path, f"{column}.f8")) else 0
+            for column in COLUMNS
+        ]
+        return min(sizes) // 8
+
+    # Function to memory-map one column of a partition (zero-copy)
+    def map_column(self, symbol, timeframe, year, column, length=None):
+        length = self.partition_length(symbol, timeframe, year) if length is None else length
+        if length == 0:
+            return np.empty(0)
+        file = os.path.join(self.symbol_path(symbol, timeframe), str(year), f"{column}.f8")
+        return np.memmap(file, dtype=np.float64, mode='r', shape=(length,))
+
+    # Timestamp of the last stored candle as it is on disk, None when nothing is stored
+    def last_timestamp(self, symbol, timeframe):
+        for year in reversed(self.partitions(symbol, timeframe)):
+            timestamps = self.map_column(symbol, timeframe, year, 'timestamp')
+            if len(timestamps):
+                return int(timestamps[-1])
+        return None
+
+    # Exclusive lock on a symbol's history, shared with the other bot processes
+    @contextmanager
+    def locked(self, symbol, timeframe):
+        path = self.symbol_path(symbol, timeframe)
+        os.makedirs(path, exist_ok=True)
+        fd = os.open(os.path.join(path, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    # Function to append closed candles (a candle array or ccxt candles);
+    # candles at or before the last stored one are skipped. The last stored
+    # timestamp is read under the lock, as another bot may have appended since
+    def append(self, symbol, timeframe, candles):
+        rows = parse_ohlcv(candles)
+        if len(rows) == 0:
+            return 0
+        with self.locked(symbol, timeframe):
+            last_timestamp = self.last_timestamp(symbol, timeframe)
+            if last_timestamp is not None:
+                rows = rows[rows[:, TIMESTAMP] > last_timestamp]
+            if len(rows):
+                self.write(symbol, timeframe, rows)
+        return len(rows)
+
+    # Function to write rows after the stored ones (callers hold the lock)
+    def write(self, symbol, timeframe, rows):
+        years = rows[:, 0].astype('datetime64[ms]').astype('datetime64[Y]').astype(int) + 1970
+        for year in np.unique(years):
+            partition = rows[years == year]
+            path = os.path.join(self.symbol_path(symbol, timeframe), str(year))
+            os.makedirs(path, exist_ok=True)
+            # Cut columns back to the complete rows before appending
+            length = self.partition_length(symbol, timeframe, year)
+            for index, column in enumerate(COLUMNS):
+                with open(os.path.join(path, f"{column}.f8"), 'ab') as file:
+                    file.truncate(length * 8)
+                    file.write(np.ascontiguousarray(partition[:, index]).tobytes())
+
+    # Function to read columns of a symbol's history from `since` on. A single
+    # partition is returned as memory-mapped views, several are concatenated
+    def read(self, symbol, timeframe, since=None, columns=COLUMNS):
+        parts = {column: [] for column in columns}
+        for year in self.partitions(symbol, timeframe):
+            if since is not None and year < time.gmtime(since / 1000).tm_year:
+                continue
+            length = self.partition_length(symbol, timeframe, year)
+            start = 0
+            if since is not None:
+                start = int(np.searchsorted(self.map_column(symbol, timeframe, year, 'timestamp', length), since))
+            for column in columns:
+                parts[column].append(self.map_column(symbol, timeframe, year, column, length)[start:])
+        return {
+            column: (arrays[0] if len(arrays) == 1 else np.concatenate(arrays) if arrays else np.empty(0))
+            for column, arrays in parts.items()
+        }
+
+    # Function to read history as a (candles x 6) array like ccxt's fetch_ohlcv
+    def read_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        data = self.read(symbol, timeframe, since)
+        ohlcv = np.column_stack([data[column] for column in COLUMNS]) if len(data['timestamp']) else empty_ohlcv()
+        timestamps = ohlcv[:, TIMESTAMP]
+        if len(ohlcv) > 1 and not (timestamps[1:] > timestamps[:-1]).all():
+            # Stores written without the lock can hold repeated or unordered
+            # candles: keep the last copy of each, in time order
+            _, last = np.unique(timestamps[::-1], return_index=True)
+            ohlcv = ohlcv[len(ohlcv) - 1 - last]
+        return ohlcv[-limit:] if limit else ohlcv
@@ -4,8 +4,8 @@ BINANCE_API_KEY = ''
 BINANCE_API_SECRET = ''
 
 # Telegram API keys
-#TELEGRAM_BOT_TOKEN = 
-#TELEGRAM_CHAT_ID = 
+TELEGRAM_BOT_TOKEN = ''
+TELEGRAM_CHAT_ID = ''
 
 
 # List of futures trading pairs (symbols)
@@ -47,3 +47,77 @@ symbols = [
 
 # Time interval for fetching historical data
 time_interval = '15m'  # You can change this to '4h', '1d', etc.
+
+# Concurrent fetch engine settings
+fetch_max_concurrency = 20  # Maximum number of symbols fetched at the same time
+fetch_weight_budget = 1200  # Binance request weight a sweep may use per minute
+fetch_sweep_timeout = 30  # Seconds before a sweep returns with whatever has been fetched
+
+# Number of candles kept in memory per symbol and timeframe (a fixed 2 x depth x 6 float64 ring buffer)
+candle_cache_depth = 1000
+
+# Event-driven mode: evaluate each symbol when its kline stream reports a closed candle
+stream_mode = False
+kline_stream_url = 'wss://fstream.binance.com'  # Point at a local replay server to test offline
+
+# Seconds to wait after a candle closes before running the next sweep
+candle_close_delay = 0.3
+
+# Request weight governor shared by every bot process on this machine
+weight_governor_path = '/tmp/binance_weight_governor'
+weight_limit_per_minute = 2000  # Binance futures allows 2400 per minute per IP, keep some headroom
+
+# Directory of the on-disk candle history shared by the bots, backtests and reporting
+candle_store_path = 'candles'
+
+# Seconds a bulk ticker/book ticker snapshot is served before it is refreshed
+ticker_ttl = 5
+
+# User-data stream feeding the local position/order state
+user_data_stream_url = 'wss://fstream.binance.com'  # Point at a local fake server to test offline
+position_reconcile_interval = 300  # Seconds between bulk position/open order reconciliations
+
+# Order execution pipeline settings
+order_max_workers = 10  # Maximum number of order requests in flight at the same time
+
+# Seconds between background refreshes of the per-symbol trading rules
+market_index_refresh_interval = 3600
+
+# Deterministic mock exchange for offline runs and load benchmarks
+mock_exchange = False  # Trade against the in-process mock instead of Binance
+mock_latency = 0.05  # Seconds added to every mocked request
+mock_weight_limit_per_minute = 2400  # Request weight the mock accepts per minute
+mock_seed = 42  # Seed of the synthetic price paths
+mock_history_days = 30  # Days of synthetic candles before the current time
+
+# Metrics export (latency histograms, request/error counts, rate-limit waits, sweep duration)
+metrics_port = None  # Port of the Prometheus text endpoint /metrics, None to disable
+metrics_dump_path = None  # JSON dump file, e.g. 'metrics/{script}.json' (one file per bot), None to disable
+metrics_dump_interval = 60  # Seconds between JSON dumps
+sweep_warning_ratio = 0.5  # Warn when a sweep takes longer than this fraction of the candle interval
+
+# Strategies run together by strategy_host.py, sharing one market data feed and one execution layer
+host_strategies = ['main', 'main1', 'main3', 'run', '2']
+
+# Telegram notifications, queued and sent in the background as digests
+telegram_coalesce_seconds = 2  # Seconds to wait for the rest of a burst before sending a digest
+telegram_min_interval = 1  # Minimum seconds between two messages to the chat (Telegram allows about one per second)
+telegram_max_pending = 500  # Queued messages beyond this are dropped and only counted
+telegram_max_retries = 5  # Retries of a digest on rate limits and network errors
+
+# Open order reports of telegram_bot.py
+order_report_interval = 5  # Seconds between checks for new, filled and cancelled orders (in memory while the user-data stream is connected)
+order_poll_interval = 60  # Seconds between REST polls of the open orders while the user-data stream is down
+
+# Read-only Telegram commands (/positions, /pnl, /signals, /spread, /latency) answered by strategy_host.py from memory.
+# Telegram hands a bot's updates to a single poller, so use another bot than telegram_bot.py's; empty to disable
+telegram_commands_token = ''
+
+# Journal of each strategy's signals, orders and positions, replayed on restart
+state_journal_path = 'state'  # Directory of the journals and their snapshots
+state_journal_compact_every = 1000  # Entries after which the state is snapshotted and the journal starts over
+state_journal_fsync = False  # Also fsync every entry to survive power loss; a flush already survives a crash of the bot
+
+# Warm start: market metadata (ccxt markets, exchangeInfo and leverage brackets) cached on disk
+market_cache_path = 'cache'  # Directory of the cached market metadata
+market_cache_max_age = 86400  # Seconds a cached copy is used at startup instead of loading it from Binance
@@ -0,0 +1,127 @@
+from collections import deque
+import numpy as np
+from ohlcv import TIMESTAMP, CLOSE
+from signals import ema_matrix
+
+# Exponential moving average updated one candle at a time. Each step uses the
+# same arithmetic as pandas ewm(span=period, adjust=False), so the values are
+# identical to recomputing the whole series with pandas
+class IncrementalEMA:
+    __slots__ = ('period', 'alpha', 'old_weight', 'value', 'timestamp', 'history')
+
+    def __init__(self, period, history=8):
+        com = (period - 1) / 2.0
+        self.period = period
+        self.alpha = 1. / (1. + com)
+        self.old_weight = 1. - self.alpha
+        self.value = None  # EMA at the last closed candle
+        self.timestamp = None  # Timestamp of the last closed candle
+        self.history = deque(maxlen=history)  # EMA values of the most recent closed candles
+
+    def step(self, value, close):
+        if value is None:
+            return close
+        # Same as pandas: a constant series is left untouched to avoid rounding drift
+        if value != close:
+            return ((self.old_weight * value) + (self.alpha * close)) / (self.old_weight + self.alpha)
+        return value
+
+    # Function to add a closed candle in O(1)
+    def update(self, timestamp, close):
+        self.value = self.step(self.value, close)
+        self.timestamp = timestamp
+        self.history.append(self.value)
+        return self.value
+
+    # EMA including the still-open candle, without committing it
+    def provisional(self, close):
+        return self.step(self.value, close)
+
+    # Function to seed the state from closed candles (a candle array)
+    def seed(self, candles):
+        self.value = None
+        self.timestamp = None
+        self.history.clear()
+        for timestamp, close in zip(candles[:, TIMESTAMP].tolist(), candles[:, CLOSE].tolist()):
+            self.update(int(timestamp), close)
+        return self
+
+    # Function to set the state from EMA values already calculated for the
+    # closed candles, the last one at `timestamp`
+    def restore(self, timestamp, values):
+        self.history.clear()
+        self.history.extend(values[-self.history.maxlen:])
+        self.value = self.history[-1] if self.history else None
+        self.timestamp = timestamp if self.history else None
+        return self
+
+    # Whether the state has to be seeded again from `closed` candles: nothing
+    # seeded yet, or the history no longer overlaps the state
+    def needs_seed(self, closed):
+        return self.timestamp is None or not len(closed) or closed[0, TIMESTAMP] > self.timestamp
+
+# Incremental EMA states per (symbol, period), kept in sync with the candle history
+class EMABook:
+    def __init__(self, history=8):
+        self.history = history
+        self.states = {}
+
+    def state(self, symbol, period):
+        key = (symbol, period)
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = IncrementalEMA(period, self.history)
+        return state
+
+    # Function to bring a state up to date with a symbol's candle array; the
+    # last candle is treated as still forming and is never committed
+    def sync(self, symbol, period, candles):
+        state = self.state(symbol, period)
+        closed = candles[:-1]
+        if state.needs_seed(closed):
+            return state.seed(closed)
+
+        # First closed candle the state has not seen yet
+        start = closed[:, TIMESTAMP].searchsorted(state.timestamp, side='right')
+        if start < len(closed):
+            for timestamp, close in zip(closed[start:, TIMESTAMP].tolist(), closed[start:, CLOSE].tolist()):
+                state.update(int(timestamp), close)
+        return state
+
+    # Function to seed the states of many symbols at once: their closes are
+    # stacked into one NaN-padded matrix and the EMA is calculated for all of
+    # them in a single pass over the bars
+    def seed_all(self, symbols, period, candles_by_symbol):
+        closed = [candles_by_symbol[symbol][:-1] for symbol in symbols]
+        closes = np.full((len(symbols), max(len(candles) for candles in closed)), np.nan)
+        for row, candles in enumerate(closed):
+            if len(candles):
+                closes[row, closes.shape[1] - len(candles):] = candles[:, CLOSE]
+        emas = ema_matrix(closes, period)[:, -self.history:]
+        for row, (symbol, candles) in enumerate(zip(symbols, closed)):
+            values = emas[row, -len(candles):].tolist() if len(candles) else []
+            self.state(symbol, period).restore(int(candles[-1, TIMESTAMP]) if len(candles) else None, values)
+
+    # Function to get the last n EMA values, the last one for the forming candle
+    def tail(self, symbol, period, candles, n):
+        if not len(candles):
+            return []
+        state = self.sync(symbol, period, candles)
+        values = list(state.history)[-(n - 1):] if n > 1 else []
+        values.append(state.provisional(float(candles[-1, CLOSE])))
+        return values
+
+    # Function to get, per symbol, the committed EMA just before the last `bars`
+    # candles, used to seed batched evaluation (NaN when the window reaches back
+    # to the first candle)
+    def seeds(self, symbols, period, candles_by_symbol, bars):
+        stale = [symbol for symbol in symbols if self.state(symbol, period).needs_seed(candles_by_symbol[symbol][:-1])]
+        if len(stale) > 1:
+            self.seed_all(stale, period, candles_by_symbol)
+
+        seeds = np.full(len(symbols), np.nan)
+        for row, symbol in enumerate(symbols):
+            state = self.sync(symbol, period, candles_by_symbol[symbol])
+            if len(state.history) >= bars:
+                seeds[row] = state.history[-bars]
+        return seeds
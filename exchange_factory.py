@@ -0,0 +1,46 @@
+from config import BINANCE_API_KEY, BINANCE_API_SECRET, mock_exchange
+from weight_governor import govern_exchange
+from market_cache import load_markets, restore_markets
+
+# Function to create a Binance Futures client whose requests all go through
+# the weight governor shared with the other bot processes (or a mock client
+# when mock_exchange is set). Markets come from the disk cache when it is
+# fresh, so the first order does not wait for ccxt's load_markets. ccxt is
+# imported here, only by the processes that need each flavour
+def create_exchange():
+    if mock_exchange:
+        # Offline: trade against the in-process mock venue
+        from mock_exchange import MockExchange, get_venue
+        return MockExchange(get_venue())
+    import ccxt
+    exchange = ccxt.binance({
+        'apiKey': BINANCE_API_KEY,
+        'secret': BINANCE_API_SECRET,
+        'enableRateLimit': True,
+        'options': {
+            'defaultType': 'future',  # Set the default type to futures
+        }
+    })
+    exchange = govern_exchange(exchange)
+    load_markets(exchange)
+    return exchange
+
+# Function to create an async Binance Futures client bound to an event loop,
+# also drawing from the shared weight governor
+def create_async_exchange(loop):
+    if mock_exchange:
+        from mock_exchange import AsyncMockExchange, get_venue
+        return AsyncMockExchange(get_venue())
+    import ccxt.async_support as ccxt_async
+    exchange = ccxt_async.binance({
+        'apiKey': BINANCE_API_KEY,
+        'secret': BINANCE_API_SECRET,
+        'enableRateLimit': True,
+        'asyncio_loop': loop,
+        'options': {
+            'defaultType': 'future',  # Set the default type to futures
+        }
+    })
+    # Without a fresh cache the markets are loaded on the first sweep
+    restore_markets(exchange)
+    return govern_exchange(exchange)
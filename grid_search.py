@@ -0,0 +1,158 @@
+import argparse
+import itertools
+import numpy as np
+from multiprocessing import Pool, shared_memory
+from backtest import STRATEGIES, load_history, align_history, run_backtest
+from signals import ema_matrix, trend_signals, confirmed_crossover_signals, gap_crossover_signals
+from ohlcv import timeframe_ms
+
+RULES = {
+    'trend': trend_signals,
+    'confirmed_crossover': confirmed_crossover_signals,
+    'gap_crossover': gap_crossover_signals,
+}
+
+# Matrices of every interval in the grid, attached from shared memory in each worker
+_matrices = {}
+_segments = []
+# EMAs already calculated by this worker, keyed by (interval, period)
+_ema_cache = {}
+_EMA_CACHE_SIZE = 32
+
+# Function to resample aligned (symbols x bars) matrices to a longer interval
+def resample_history(timestamps, matrices, interval):
+    interval_ms = timeframe_ms(interval)
+    buckets = (timestamps // interval_ms) * interval_ms
+    new_timestamps, starts = np.unique(buckets, return_index=True)
+    ends = np.append(starts[1:], len(timestamps)) - 1
+    return new_timestamps, {
+        'high': np.fmax.reduceat(matrices['high'], starts, axis=1),
+        'low': np.fmin.reduceat(matrices['low'], starts, axis=1),
+        'close': matrices['close'][:, ends],
+    }
+
+# Function to copy an interval's matrices into one shared memory block
+def share_matrices(matrices):
+    stacked_shape = (3,) + matrices['close'].shape
+    segment = shared_memory.SharedMemory(create=True, size=int(np.prod(stacked_shape)) * 8)
+    stacked = np.ndarray(stacked_shape, dtype=np.float64, buffer=segment.buf)
+    for index, column in enumerate(('high', 'low', 'close')):
+        stacked[index] = matrices[column]
+    return segment, stacked_shape
+
+# Worker initializer: map the shared matrices without copying them
+def attach_matrices(layout):
+    for interval, (name, shape) in layout.items():
+        segment = shared_memory.SharedMemory(name=name)
+        _segments.append(segment)
+        stacked = np.ndarray(shape, dtype=np.float64, buffer=segment.buf)
+        _matrices[interval] = {'high': stacked[0], 'low': stacked[1], 'close': stacked[2]}
+
+def cached_ema(interval, period):
+    key = (interval, period)
+    if key not in _ema_cache:
+        if len(_ema_cache) >= _EMA_CACHE_SIZE:
+            _ema_cache.pop(next(iter(_ema_cache)))
+        _ema_cache[key] = ema_matrix(_matrices[interval]['close'], period)
+    return _ema_cache[key]
+
+# Function to backtest one parameter set in a worker
+def run_parameter_set(params):
+    interval, short_ema_period, long_ema_period, min_percentage_condition, rule_name, order_settings = params
+    matrices = _matrices[interval]
+    rule_params = {'min_percentage_condition': min_percentage_condition} if rule_name == 'gap_crossover' else None
+    result = run_backtest(
+        None, None, matrices, short_ema_period, long_ema_period, RULES[rule_name], rule_params,
+        short_ema=cached_ema(interval, short_ema_period), long_ema=cached_ema(interval, long_ema_period),
+        **order_settings
+    )
+    return {
+        'interval': interval,
+        'short_ema_period': short_ema_period,
+        'long_ema_period': long_ema_period,
+        'min_percentage_condition': min_percentage_condition,
+        'total_pnl': result['total_pnl'],
+        'total_fees': result['total_fees'],
+        'max_drawdown': result['max_drawdown'],
+        'trades': int(result['trades_by_symbol'].sum()),
+    }
+
+# Function to build every valid parameter combination, ordered so that
+# consecutive tasks share EMAs in the worker cache
+def parameter_grid(intervals, short_periods, long_periods, min_percentage_conditions, rule_name, order_settings):
+    if rule_name != 'gap_crossover':
+        # The threshold only applies to the gap rule
+        min_percentage_conditions = [None]
+    return [
+        (interval, short_period, long_period, threshold, rule_name, order_settings)
+        for interval, short_period, long_period, threshold in itertools.product(
+            intervals, short_periods, long_periods, min_percentage_conditions)
+        if short_period < long_period
+    ]
+
+# Function to run the grid over all symbols with a process pool; candle data is
+# shared with the workers through shared memory instead of pickled per task.
+# Returns a pandas table ranked by total PnL
+def grid_search(history, base_interval, intervals, short_periods, long_periods, min_percentage_conditions,
+                rule_name='gap_crossover', order_settings=None, processes=None):
+    import pandas as pd
+
+    order_settings = order_settings or {}
+    symbols, timestamps, matrices = align_history(history)
+    segments = []
+    layout = {}
+    try:
+        for interval in intervals:
+            if interval == base_interval:
+                interval_matrices = matrices
+            else:
+                _, interval_matrices = resample_history(timestamps, matrices, interval)
+            segment, shape = share_matrices(interval_matrices)
+            segments.append(segment)
+            layout[interval] = (segment.name, shape)
+
+        tasks = parameter_grid(intervals, short_periods, long_periods, min_percentage_conditions, rule_name, order_settings)
+        print(f"Running {len(tasks)} parameter sets over {len(symbols)} symbols")
+        with Pool(processes, initializer=attach_matrices, initargs=(layout,)) as pool:
+            rows = pool.map(run_parameter_set, tasks, chunksize=max(1, len(tasks) // (4 * (processes or 8))))
+    finally:
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+
+    return pd.DataFrame(rows).sort_values('total_pnl', ascending=False).reset_index(drop=True)
+
+# Function to parse a comma separated list of numbers or a start:stop:step range
+def parse_values(text, cast):
+    if ':' in text:
+        start, stop, step = (cast(value) for value in text.split(':'))
+        return [cast(value) for value in np.arange(start, stop, step)]
+    return [cast(value) for value in text.split(',')]
+
+if __name__ == '__main__':
+    from candle_store import CandleStore
+    from config import symbols, time_interval, candle_store_path
+
+    parser = argparse.ArgumentParser(description='Grid search EMA periods and thresholds over stored candles')
+    parser.add_argument('--path', default=candle_store_path, help='Candle store directory')
+    parser.add_argument('--intervals', default=time_interval, help='Comma separated, resampled from the stored candles')
+    parser.add_argument('--short', default='3:16:1', help='Short EMA periods, list or start:stop:step')
+    parser.add_argument('--long', default='10:210:10', help='Long EMA periods, list or start:stop:step')
+    parser.add_argument('--thresholds', default='0,0.1,0.2,0.3,0.5', help='min_percentage_condition values')
+    parser.add_argument('--rule', choices=sorted(RULES), default='gap_crossover')
+    parser.add_argument('--orders-like', choices=sorted(STRATEGIES), default='2',
+                        help='Use the order type, position mode and sizing of this strategy')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--output', help='Write the ranked table to this CSV file')
+    args = parser.parse_args()
+
+    strategy = STRATEGIES[args.orders_like]
+    order_settings = {key: strategy[key] for key in ('order_type', 'position_mode', 'fixed_quantity_usdt', 'limit_offset_percentage') if key in strategy}
+    ranked = grid_search(
+        load_history(CandleStore(args.path), symbols, time_interval), time_interval, args.intervals.split(','),
+        parse_values(args.short, int), parse_values(args.long, int), parse_values(args.thresholds, float),
+        args.rule, order_settings, args.processes
+    )
+    print(ranked.head(50).to_string())
+    if args.output:
+        ranked.to_csv(args.output, index=False)
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import aiohttp
+from config import kline_stream_url
+
+# Binance allows at most 200 streams on one combined stream connection
+MAX_STREAMS_PER_CONNECTION = 200
+
+# Function to build the stream name of a symbol's klines
+def stream_name(symbol, interval):
+    return f"{symbol.lower()}@kline_{interval}"
+
+# Function to split the symbols into the groups of one connection each
+def connection_symbols(symbols):
+    return [symbols[start:start + MAX_STREAMS_PER_CONNECTION] for start in range(0, len(symbols), MAX_STREAMS_PER_CONNECTION)]
+
+# Function to build combined stream URLs for all symbols
+def stream_urls(symbols, interval, base_url=kline_stream_url):
+    return [
+        f"{base_url}/stream?streams=" + '/'.join(stream_name(symbol, interval) for symbol in group)
+        for group in connection_symbols(symbols)
+    ]
+
+# Function to turn a combined stream kline message into (symbol, ccxt candle, closed)
+def parse_kline_message(message):
+    kline = message.get('data', message).get('k')
+    if kline is None:
+        return None
+    candle = [kline['t'], float(kline['o']), float(kline['h']), float(kline['l']), float(kline['c']), float(kline['v'])]
+    return kline['s'], candle, kline['x']
+
+# Function to build a combined stream kline message from a ccxt candle, used to
+# make replay recordings out of REST history
+def kline_message(symbol, interval, candle, closed=True):
+    timestamp, open_, high, low, close, volume = candle[:6]
+    return {
+        'stream': stream_name(symbol, interval),
+        'data': {
+            'e': 'kline',
+            'E': timestamp,
+            's': symbol,
+            'k': {
+                't': timestamp, 's': symbol, 'i': interval,
+                'o': str(open_), 'h': str(high), 'l': str(low), 'c': str(close), 'v': str(volume),
+                'x': closed,
+            },
+        },
+    }
+
+# Function to follow one combined stream connection, reconnecting when it
+# drops. Candles that close while disconnected are never sent again, so every
+# connection first calls on_connect() in `executor`, to catch up over REST,
+# before handling the messages buffered meanwhile
+async def follow_stream(url, on_candle, closed_only=True, on_connect=None, executor=None,
+                        reconnect_delay=1, max_reconnect_delay=60):
+    loop = asyncio.get_event_loop()
+    delay = reconnect_delay
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.ws_connect(url, heartbeat=60) as ws:
+                    delay = reconnect_delay
+                    if on_connect is not None:
+                        await loop.run_in_executor(executor, on_connect)
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        parsed = parse_kline_message(json.loads(msg.data))
+                        if parsed is None:
+                            continue
+                        symbol, candle, closed = parsed
+                        if closed or not closed_only:
+                            on_candle(symbol, candle)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Kline stream error: {e}")
+            print(f"Kline stream disconnected, reconnecting in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_reconnect_delay)
+
+# Function to stream klines for all symbols and call on_candle(symbol, candle)
+# for every closed candle. on_connect(symbols) is called with the symbols of a
+# connection each time it (re)connects; the calls run one at a time in a
+# worker thread, so they can use the blocking REST fetcher
+async def stream_klines(symbols, interval, on_candle, base_url=kline_stream_url, closed_only=True, on_connect=None):
+    executor = ThreadPoolExecutor(1, thread_name_prefix='kline-catch-up')
+    await asyncio.gather(*[
+        follow_stream(url, on_candle, closed_only, None if on_connect is None else partial(on_connect, group), executor)
+        for url, group in zip(stream_urls(symbols, interval, base_url), connection_symbols(symbols))
+    ])
+
+# Function to run the kline stream from synchronous code
+def run_kline_stream(symbols, interval, on_candle, base_url=kline_stream_url, closed_only=True, on_connect=None):
+    asyncio.new_event_loop().run_until_complete(
+        stream_klines(symbols, interval, on_candle, base_url, closed_only, on_connect))
+
+# Function to record stream messages to a JSON lines file for later replay
+async def record_klines(symbols, interval, path, duration, base_url=kline_stream_url):
+    async def record(url, file):
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(url) as ws:
+                async for msg in ws:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    file.write(msg.data + '\n')
+
+    with open(path, 'w') as file:
+        tasks = [asyncio.ensure_future(record(url, file)) for url in stream_urls(symbols, interval, base_url)]
+        await asyncio.wait(tasks, timeout=duration)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+# Function to load a JSON lines recording
+def load_recording(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+# Local stand-in for the Binance combined stream endpoint. Replays recorded
+# messages to every client, filtered to the streams it subscribed to
+class KlineReplayServer:
+    def __init__(self, messages, host='127.0.0.1', port=0, delay=0.0):
+        self.messages = messages
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.clients = set()
+        self.runner = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def handle(self, request):
+        from aiohttp import web
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.clients.add(ws)
+        try:
+            streams = set(request.query.get('streams', '').split('/'))
+            for message in self.messages:
+                if message.get('stream') in streams:
+                    await ws.send_str(json.dumps(message))
+                    await asyncio.sleep(self.delay)
+            # Keep the connection open like the real endpoint until the client leaves
+            async for _ in ws:
+                pass
+        finally:
+            self.clients.discard(ws)
+        return ws
+
+    async def start(self):
+        # The server side of aiohttp is only loaded by offline tests
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/stream', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        # Pick up the real port when an ephemeral one was requested
+        self.port = self.runner.addresses[0][1]
+        return self.url
+
+    async def stop(self):
+        for ws in list(self.clients):
+            await ws.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+# Function to serve a recording until interrupted
+async def serve_recording(path, host, port, delay):
+    server = KlineReplayServer(load_recording(path), host, port, delay)
+    print(f"Replaying {path} on {await server.start()}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+if __name__ == '__main__':
+    from config import symbols, time_interval
+
+    parser = argparse.ArgumentParser(description='Record or replay Binance futures kline streams')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record_parser = subparsers.add_parser('record')
+    record_parser.add_argument('path')
+    record_parser.add_argument('--duration', type=float, default=3600)
+    replay_parser = subparsers.add_parser('replay')
+    replay_parser.add_argument('path')
+    replay_parser.add_argument('--host', default='127.0.0.1')
+    replay_parser.add_argument('--port', type=int, default=8765)
+    replay_parser.add_argument('--delay', type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        asyncio.run(record_klines(symbols, time_interval, args.path, args.duration))
+    else:
+        asyncio.run(serve_recording(args.path, args.host, args.port, args.delay))
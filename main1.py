@@ -1,17 +1,22 @@
-import ccxt
-import pandas as pd
 import time
-from config import BINANCE_API_KEY, BINANCE_API_SECRET, symbols, time_interval
-
-# Create a Binance Futures client
-exchange = ccxt.binance({
-    'apiKey': BINANCE_API_KEY,
-    'secret': BINANCE_API_SECRET,
-    'enableRateLimit': True,
-    'options': {
-        'defaultType': 'future',  # Set the default type to futures
-    }
-})
+from config import symbols, time_interval, candle_cache_depth, stream_mode
+from async_fetcher import fetch_snapshot, get_tickers
+from exchange_factory import create_exchange
+from market_index import MarketIndex, start_market_index
+from account_state import AccountState
+from order_executor import execute_orders, flip_order
+from candle_cache import CandleCache
+from candle_store import CandleStore
+from ema_state import EMABook
+from kline_stream import run_kline_stream
+from scheduler import CandleScheduler
+from metrics import start_metrics
+from state_journal import open_journal
+from user_data_stream import start_user_data_stream
+from signals import evaluate_signals, trend_signals
+
+# Create a Binance Futures client, rate limited together with the other bot processes
+exchange = create_exchange()
 
 # Define EMA strategy parameters
 short_ema_period = 9
@@ -21,135 +26,179 @@ long_ema_period = 21
 last_order_types = {symbol: None for symbol in symbols}
 open_orders = {symbol: None for symbol in symbols}
 
-# Fixed quantity in USDT worth of contracts
-fixed_quantity_usdt = 100
+# Journal of the signals and orders as they are decided, replayed on restart so
+# signals already acted on before a crash are not ordered again
+journal = open_journal('main1')
+last_order_types.update(journal.last_order_types)
+open_orders.update(journal.orders)
 
-# Define risk parameters
-limit_offset_percentage = 0.1  # 0.1% for both long and short
-take_profit_percentage = 1.0  # 1% take profit
+# Keep candle history in memory so each sweep only downloads new candles, and
+# persist closed candles so restarts resume from disk
+candle_cache = CandleCache(time_interval, candle_cache_depth, CandleStore())
 
-# Function to fetch historical data for futures with EMA calculation
-def fetch_ohlcv(symbol, timeframe, limit):
-    ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
-    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+# Short and long EMAs per symbol, updated incrementally as candles close
+ema_book = EMABook()
 
-    # Calculate short and long EMAs
-    df['short_ema'] = calculate_ema(df, short_ema_period)
-    df['long_ema'] = calculate_ema(df, long_ema_period)
+# Wake up right after each candle closes instead of sleeping a fixed time
+candle_scheduler = CandleScheduler(time_interval)
 
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    df.set_index('timestamp', inplace=True)
-    return df
+# Lot size, tick size and minimum notional of every symbol, to round orders
+market_index = MarketIndex()
 
-# Function to calculate EMA
-def calculate_ema(df, period, column='close'):
-    return df[column].ewm(span=period, adjust=False).mean()
+# Positions and open orders kept current by the user-data stream
+account_state = AccountState()
 
-# Function to place a limit buy order with offset
-def place_limit_buy_order(symbol, quantity, offset_percentage):
-    try:
-        ticker = exchange.fetch_ticker(symbol)
-        limit_price = float(ticker['ask']) * (1 - offset_percentage / 100)
-
-        order = exchange.create_limit_buy_order(
-            symbol=symbol,
-            amount=quantity,
-            price=limit_price
-        )
-        print(f"Limit Buy Order placed for {symbol} at {limit_price}: {order}")
-        return order
-    except Exception as e:
-        print(f"Error placing Limit Buy Order for {symbol}: {e}")
+# Fixed quantity in USDT worth of contracts
+fixed_quantity_usdt = 100
 
-# Function to place a limit sell order with offset
-def place_limit_sell_order(symbol, quantity, offset_percentage):
-    try:
-        ticker = exchange.fetch_ticker(symbol)
-        limit_price = float(ticker['bid']) * (1 + offset_percentage / 100)
-
-        order = exchange.create_limit_sell_order(
-            symbol=symbol,
-            amount=quantity,
-            price=limit_price
-        )
-        print(f"Limit Sell Order placed for {symbol} at {limit_price}: {order}")
-        return order
-    except Exception as e:
-        print(f"Error placing Limit Sell Order for {symbol}: {e}")
+# Define risk parameters
+limit_offset_percentage = 0.1  # 0.1% for both long and short
+take_profit_percentage = 1.0  # 1% take profit
 
-# Function to close open positions
-def close_open_position(symbol):
+# Function to calculate a limit price with offset from the best ask (buy) or
+# bid (sell) of the shared ticker snapshot, refreshed in bulk once stale
+def offset_limit_price(symbol, side, offset_percentage):
+    ticker = get_tickers().get(symbol, exchange)
+    if side == 'BUY':
+        return float(ticker['ask']) * (1 - offset_percentage / 100)
+    return float(ticker['bid']) * (1 + offset_percentage / 100)
+
+# Function to get a symbol's position from the local account state, only
+# when this script's last order on the symbol was acked, so positions other
+# bots opened on the same account are left alone
+def own_position(symbol):
+    if open_orders[symbol] and open_orders[symbol].get('id'):
+        return account_state.position(symbol)
+    return None
+
+# Function to get the ids of this script's orders still open on a symbol, so
+# orders other bots placed on the same account are never cancelled
+def own_order_ids(symbol):
+    own_id = open_orders[symbol] and open_orders[symbol].get('id')
+    return [order['id'] for order in account_state.orders(symbol) if order['id'] == own_id]
+
+# Function to evaluate the EMA rules for all symbols of a snapshot at once
+def evaluate_snapshot(snapshot):
+    return evaluate_signals(snapshot, ema_book, short_ema_period, long_ema_period, trend_signals, last_order_types)
+
+# Function to act on the signals of a snapshot
+def handle_signals(snapshot, signals):
+    orders = []
+    cancels = []
+    # Symbols whose signal is acted on, recorded once the orders are acked
+    settled = []
+    for symbol, signal in signals.items():
+        # Latest candlestick for each symbol from the snapshot
+        latest_candle = snapshot[symbol]['ticker']
+
+        if 'close' not in latest_candle:
+            print(f"Error: 'close' not found in the latest_candle for {symbol}")
+            continue
+
+        latest_close = float(latest_candle['close'])
+
+        # Check if latest_close is None
+        if latest_close is None:
+            print(f"Error: latest_close is None for {symbol}")
+            continue
+
+        # Calculate the quantity based on the fixed USDT value
+        quantity = fixed_quantity_usdt / latest_close
+
+        print(f"Symbol: {symbol}, Latest Close: {latest_close}, Quantity: {quantity}")
+
+        # Make trading decisions for each symbol
+        if signal == 'BUY':
+            print(f'{symbol} Buy Signal')
+            # Cancel the previous limit order, then close the position and open the
+            # long one with a single limit order with offset
+            order = flip_order(symbol, 'BUY', quantity, own_position(symbol), 'limit',
+                               offset_limit_price(symbol, 'BUY', limit_offset_percentage))
+
+        elif signal == 'SELL':
+            print(f'{symbol} Sell Signal')
+            # Cancel the previous limit order, then close the position and open the
+            # short one with a single limit order with offset
+            order = flip_order(symbol, 'SELL', quantity, own_position(symbol), 'limit',
+                               offset_limit_price(symbol, 'SELL', limit_offset_percentage))
+
+        # Cancel this script's previous order on the symbol if it is still open
+        cancels.extend((symbol, order_id) for order_id in own_order_ids(symbol))
+        if order is not None:
+            orders.append(order)
+        else:
+            # The position is already on the side of the signal
+            settled.append(symbol)
+
+    # Submit the orders of all symbols concurrently
+    if orders or cancels:
+        for result in execute_orders(orders, market_index, cancels):
+            # Rejected orders do not change what this script holds, and
+            # their signal is evaluated again on the next candle
+            if result['id'] is not None:
+                settled.append(result['symbol'])
+                open_orders[result['symbol']] = result
+                journal.record_order(result['symbol'], result)
+
+    # Record the signals acted on, so they are not acted on again
+    for symbol in settled:
+        last_order_types[symbol] = signals[symbol]
+        journal.record_signal(symbol, signals[symbol])
+
+# Function to evaluate a symbol as soon as its kline stream reports a closed candle
+def on_closed_candle(symbol, candle):
     try:
-        if open_orders[symbol]:
-            position = exchange.fetch_position(symbol)
-            if position['side'] == 'long':
-                close_price = float(position['entryPrice']) * (1 + take_profit_percentage / 100)
-                order = place_limit_sell_order(symbol, position['positionAmt'], limit_offset_percentage)
-                print(f"Closing open position for {symbol} with take profit: {order}")
-            elif position['side'] == 'short':
-                close_price = float(position['entryPrice']) * (1 - take_profit_percentage / 100)
-                order = place_limit_buy_order(symbol, position['positionAmt'], limit_offset_percentage)
-                print(f"Closing open position for {symbol} with take profit: {order}")
+        snapshot = {symbol: {'ohlcv': candle_cache.merge_closed(symbol, candle), 'ticker': {'close': candle[4]}}}
+        handle_signals(snapshot, evaluate_snapshot(snapshot))
     except Exception as e:
-        print(f"Error closing open position for {symbol}: {e}")
+        print(f'An error occurred: {e}')
 
-# Function to close open orders
-def close_open_orders(symbol):
+# Function to catch up on the candles that closed while the kline stream was
+# disconnected: the gap is fetched into the cache and evaluated like a sweep
+def catch_up(stream_symbols):
     try:
-        if open_orders[symbol]:
-            exchange.cancel_order(open_orders[symbol]['id'], symbol=symbol)
-            print(f"Cancelled open order for {symbol}: {open_orders[symbol]['id']}")
+        snapshot = fetch_snapshot(stream_symbols, time_interval, 100, cache=candle_cache)
+        handle_signals(snapshot, evaluate_snapshot(snapshot))
     except Exception as e:
-        print(f"Error cancelling open order for {symbol}: {e}")
+        print(f'An error occurred: {e}')
 
 # Main trading function for futures
 def ema_strategy():
+    # Export latency, error and sweep duration metrics of this bot
+    start_metrics()
+
+    # Load the trading rules once and keep them fresh in the background
+    start_market_index(market_index, exchange)
+
+    # Follow positions and orders on the user-data stream and resume the last
+    # order types from the positions this script held when it was restarted,
+    # or from the journal for symbols without one of its positions
+    start_user_data_stream(exchange, account_state)
+    account_state.ready.wait(30)
+    for symbol in symbols:
+        if own_position(symbol) is not None:
+            last_order_types[symbol] = account_state.last_order_type(symbol)
+
+    if stream_mode:
+        # Load the candle history once, then follow the kline stream,
+        # catching up over REST on every (re)connection
+        fetch_snapshot(symbols, time_interval, 100, cache=candle_cache)
+        run_kline_stream(symbols, time_interval, on_closed_candle, on_connect=catch_up)
+        return
+
     while True:
         try:
-            for symbol in symbols:
-                # Fetch historical data for each symbol
-                historical_data = fetch_ohlcv(symbol, time_interval, 100)
-
-                # Fetch the latest candlestick for each symbol
-                latest_candle = exchange.fetch_ticker(symbol)
-
-                if 'close' not in latest_candle:
-                    print(f"Error: 'close' not found in the latest_candle for {symbol}")
-                    continue
-
-                latest_close = float(latest_candle['close'])
-
-                # Check if latest_close is None
-                if latest_close is None:
-                    print(f"Error: latest_close is None for {symbol}")
-                    continue
-
-                # Calculate the quantity based on the fixed USDT value
-                quantity = fixed_quantity_usdt / latest_close
-
-                print(f"Symbol: {symbol}, Latest Close: {latest_close}, Quantity: {quantity}")
-
-                # Make trading decisions for each symbol
-                if historical_data['short_ema'].iloc[-1] > historical_data['long_ema'].iloc[-1] and last_order_types[symbol] != 'BUY':
-                    print(f'{symbol} Buy Signal')
-                    # Implement your buy logic here for futures
-                    # For example, place a limit buy order with offset
-                    close_open_position(symbol)
-                    close_open_orders(symbol)
-                    open_orders[symbol] = place_limit_buy_order(symbol, quantity, limit_offset_percentage)
-                    last_order_types[symbol] = 'BUY'
-
-                elif historical_data['short_ema'].iloc[-1] < historical_data['long_ema'].iloc[-1] and last_order_types[symbol] != 'SELL':
-                    print(f'{symbol} Sell Signal')
-                    # Implement your sell logic here for futures
-                    # For example, place a limit sell order with offset
-                    close_open_position(symbol)
-                    close_open_orders(symbol)
-                    open_orders[symbol] = place_limit_sell_order(symbol, quantity, limit_offset_percentage)
-                    last_order_types[symbol] = 'SELL'
-
-            # Sleep for some time (e.g., 5 minutes) before checking again
-            time.sleep(300)
+            # Fetch historical data and the latest ticker for all symbols concurrently
+            snapshot = fetch_snapshot(symbols, time_interval, 100, cache=candle_cache)
+
+            # Evaluate the EMA rules for all symbols at once and act on the signals
+            handle_signals(snapshot, evaluate_snapshot(snapshot))
+
+            # Report how long after the candle close the sweep finished
+            candle_scheduler.sweep_done()
+
+            # Wait until just after the next candle closes before checking again
+            candle_scheduler.wait()
 
         except Exception as e:
             print(f'An error occurred: {e}')
@@ -0,0 +1,57 @@
+import json
+import os
+import time
+from config import market_cache_path, market_cache_max_age, mock_exchange
+
+# Function to get the file of a cached document; the mock venue's metadata is
+# kept apart so it never stands in for Binance's
+def cache_file(name, path=market_cache_path):
+    return os.path.join(path, f"{'mock_' if mock_exchange else ''}{name}.json")
+
+# Function to read a cached JSON document, None when it is missing, damaged or
+# older than max_age seconds
+def read_cache(name, max_age=market_cache_max_age, path=market_cache_path):
+    file = cache_file(name, path)
+    try:
+        if time.time() - os.path.getmtime(file) > max_age:
+            return None
+        with open(file) as cached:
+            return json.load(cached)
+    except (OSError, ValueError):
+        return None
+
+# Function to write a JSON document to the cache, replacing it atomically
+def write_cache(name, document, path=market_cache_path):
+    file = cache_file(name, path)
+    try:
+        os.makedirs(path, exist_ok=True)
+        temporary = f"{file}.tmp"
+        with open(temporary, 'w') as cached:
+            json.dump(document, cached)
+        os.replace(temporary, file)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Error caching {name}: {e}")
+
+# Function to give a ccxt client its markets from the disk cache, so neither
+# startup nor the first order waits for load_markets. Returns False when
+# nothing fresh is cached
+def restore_markets(exchange):
+    cached = read_cache('markets')
+    if cached is None:
+        return False
+    exchange.set_markets(cached['markets'], cached['currencies'] or None)
+    return True
+
+# Function to load a sync ccxt client's markets, from the disk cache when it
+# is fresh, otherwise from the exchange into the cache (on errors ccxt loads
+# them lazily later)
+def load_markets(exchange):
+    if restore_markets(exchange):
+        return exchange.markets
+    try:
+        exchange.load_markets()
+    except Exception as e:
+        print(f"Error loading markets: {e}")
+        return None
+    write_cache('markets', {'markets': exchange.markets, 'currencies': exchange.currencies})
+    return exchange.markets
@@ -0,0 +1,156 @@
+import threading
+import numpy as np
+from config import market_index_refresh_interval
+from market_cache import read_cache, write_cache
+
+# Binance quotes quantities and prices with at most 8 decimals
+_DECIMALS = 8
+# Tolerance for quantities/prices that are a whole number of steps up to float error
+_EPSILON = 1e-9
+
+# Function to count the decimals of a step such as '0.001'
+def step_decimals(step):
+    step = step.rstrip('0')
+    return len(step.split('.')[1]) if '.' in step else 0
+
+# Trading rules of every futures symbol from exchangeInfo, held in arrays
+# indexed by symbol row so a whole sweep's orders are rounded in one go:
+# lot step size and minimum quantity (limit and market), tick size, minimum
+# notional and maximum leverage. Built with one request at startup instead of
+# ccxt's lazy load_markets
+class MarketIndex:
+    def __init__(self):
+        self.rows = {}
+        self.step_size = np.empty(0)
+        self.min_qty = np.empty(0)
+        self.market_step_size = np.empty(0)
+        self.market_min_qty = np.empty(0)
+        self.tick_size = np.empty(0)
+        self.min_notional = np.empty(0)
+        self.max_leverage = np.empty(0)
+        self.quantity_decimals = np.empty(0, dtype=np.int8)
+        self.price_decimals = np.empty(0, dtype=np.int8)
+
+    # Function to (re)build the arrays from an exchangeInfo response and,
+    # optionally, the leverage brackets
+    def build(self, exchange_info, leverage_brackets=None):
+        symbols = [info for info in exchange_info['symbols'] if info.get('contractType') == 'PERPETUAL']
+        columns = {name: np.full(len(symbols), np.nan) for name in (
+            'step_size', 'min_qty', 'market_step_size', 'market_min_qty', 'tick_size', 'min_notional', 'max_leverage')}
+        quantity_decimals = np.zeros(len(symbols), dtype=np.int8)
+        price_decimals = np.zeros(len(symbols), dtype=np.int8)
+        max_leverage = {
+            entry['symbol']: max(bracket['initialLeverage'] for bracket in entry['brackets'])
+            for entry in leverage_brackets or []
+        }
+
+        for row, info in enumerate(symbols):
+            filters = {item['filterType']: item for item in info['filters']}
+            columns['step_size'][row] = float(filters['LOT_SIZE']['stepSize'])
+            columns['min_qty'][row] = float(filters['LOT_SIZE']['minQty'])
+            market_lot = filters.get('MARKET_LOT_SIZE', filters['LOT_SIZE'])
+            columns['market_step_size'][row] = float(market_lot['stepSize'])
+            columns['market_min_qty'][row] = float(market_lot['minQty'])
+            columns['tick_size'][row] = float(filters['PRICE_FILTER']['tickSize'])
+            columns['min_notional'][row] = float(filters.get('MIN_NOTIONAL', {}).get('notional', 0))
+            columns['max_leverage'][row] = max_leverage.get(info['symbol'], np.nan)
+            quantity_decimals[row] = step_decimals(filters['LOT_SIZE']['stepSize'])
+            price_decimals[row] = step_decimals(filters['PRICE_FILTER']['tickSize'])
+
+        # Swap in the new arrays only once they are all complete
+        for name, values in columns.items():
+            setattr(self, name, values)
+        self.quantity_decimals = quantity_decimals
+        self.price_decimals = price_decimals
+        self.rows = {info['symbol']: row for row, info in enumerate(symbols)}
+        return self
+
+    # Function to load the rules with a sync ccxt client and cache them on disk;
+    # leverage brackets need an API key and are skipped without one
+    def refresh(self, exchange):
+        try:
+            leverage_brackets = exchange.fapiPrivateGetLeverageBracket()
+        except Exception as e:
+            print(f"Could not load leverage brackets: {e}")
+            leverage_brackets = None
+        exchange_info = exchange.fapiPublicGetExchangeInfo()
+        self.build(exchange_info, leverage_brackets)
+        write_cache('trading_rules', {'exchange_info': exchange_info, 'leverage_brackets': leverage_brackets})
+        print(f"Loaded trading rules for {len(self.rows)} symbols")
+        return self
+
+    # Function to load the rules from the disk cache, False when nothing fresh is cached
+    def restore(self):
+        cached = read_cache('trading_rules')
+        if cached is None:
+            return False
+        self.build(cached['exchange_info'], cached['leverage_brackets'])
+        print(f"Loaded trading rules for {len(self.rows)} symbols from the cache")
+        return True
+
+    def row_indices(self, symbols):
+        return np.array([self.rows[symbol] for symbol in symbols], dtype=np.intp)
+
+    # Function to floor quantities to each symbol's step size (market and limit
+    # orders have their own lot rules, `market` may be one flag per quantity).
+    # Quantities below the minimum quantity, or below the minimum notional at
+    # `prices`, become 0
+    def round_quantities(self, symbols, quantities, prices=None, market=True):
+        rows = self.row_indices(symbols)
+        step_size = np.where(market, self.market_step_size[rows], self.step_size[rows])
+        min_qty = np.where(market, self.market_min_qty[rows], self.min_qty[rows])
+        quantities = np.asarray(quantities, dtype=float)
+        rounded = np.round(np.floor(quantities / step_size + _EPSILON) * step_size, _DECIMALS)
+        too_small = rounded < min_qty
+        if prices is not None:
+            too_small |= rounded * np.asarray(prices, dtype=float) < self.min_notional[rows]
+        return np.where(too_small, 0.0, rounded)
+
+    # Function to round limit prices to each symbol's tick size, down for buys
+    # and up for sells so the offset from the book is never reduced
+    def round_prices(self, symbols, prices, sides):
+        rows = self.row_indices(symbols)
+        tick_size = self.tick_size[rows]
+        ticks = np.asarray(prices, dtype=float) / tick_size
+        buy = np.asarray(sides) == 'BUY'
+        ticks = np.where(buy, np.floor(ticks + _EPSILON), np.ceil(ticks - _EPSILON))
+        return np.round(ticks * tick_size, _DECIMALS)
+
+    # Function to round one order quantity, raising when it is below the minimums
+    def round_quantity(self, symbol, quantity, price=None, market=True):
+        rounded = self.round_quantities([symbol], [quantity], None if price is None else [price], market)[0]
+        if rounded == 0:
+            raise ValueError(f"quantity {quantity} is below the minimum order size of {symbol}")
+        return float(rounded)
+
+    def round_price(self, symbol, price, side):
+        return float(self.round_prices([symbol], [price], [side])[0])
+
+    # Function to format a rounded quantity or price as Binance expects
+    def format_quantity(self, symbol, quantity):
+        return f"{quantity:.{self.quantity_decimals[self.rows[symbol]]}f}"
+
+    def format_price(self, symbol, price):
+        return f"{price:.{self.price_decimals[self.rows[symbol]]}f}"
+
+# Function to load the index at startup and refresh it in a background thread.
+# With fresh rules on disk the bot starts from those and the first refresh
+# runs in the background right away
+def start_market_index(index, exchange, refresh_interval=market_index_refresh_interval):
+    restored = index.restore()
+    if not restored:
+        index.refresh(exchange)
+
+    def refresh_loop():
+        # Cached rules are refreshed right away
+        delay = 0 if restored else refresh_interval
+        while not stop.wait(delay):
+            delay = refresh_interval
+            try:
+                index.refresh(exchange)
+            except Exception as e:
+                print(f"Error refreshing trading rules: {e}")
+
+    stop = threading.Event()
+    threading.Thread(target=refresh_loop, name='market-index', daemon=True).start()
+    return index
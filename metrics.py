@@ -0,0 +1,234 @@
+import asyncio
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from config import metrics_port, metrics_dump_path, metrics_dump_interval
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_metrics = []
+_lock = threading.Lock()
+_started = False
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+# A metric holds one value per combination of label values. Counters only go
+# up, gauges hold the last value set
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        with _lock:
+            _metrics.append(self)
+
+    def key(self, labels):
+        return tuple((label, str(labels.get(label, ''))) for label in self.labels)
+
+    def samples(self):
+        with _lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+    def snapshot(self):
+        return [{'labels': dict(key), 'value': value} for _, key, value in self.samples()]
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = value
+
+    def get(self, **labels):
+        with _lock:
+            return self.values.get(self.key(labels))
+
+# Cumulative histogram like Prometheus': per label combination a count per
+# bucket upper bound, plus the sum and count of all observations
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with _lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry['buckets'][index] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    # Function to get the number and mean of the observations
+    def mean(self, **labels):
+        with _lock:
+            entry = self.values.get(self.key(labels))
+            if entry is None or not entry['count']:
+                return 0, None
+            return entry['count'], entry['sum'] / entry['count']
+
+    # Function to estimate a quantile of the observations from the buckets,
+    # interpolating inside a bucket like Prometheus' histogram_quantile
+    def quantile(self, q, **labels):
+        with _lock:
+            entry = self.values.get(self.key(labels))
+            if entry is None or not entry['count']:
+                return None
+            counts = list(entry['buckets'])
+            rank = q * entry['count']
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, counts):
+            if count and cumulative + count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        # Above the highest bound
+        return self.buckets[-1]
+
+    # Function to time a block of code into the histogram
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        with _lock:
+            for key, entry in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry['buckets']):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", key + (('le', repr(float(bound))),), cumulative))
+                samples.append((f"{self.name}_bucket", key + (('le', '+Inf'),), entry['count']))
+                samples.append((f"{self.name}_sum", key, entry['sum']))
+                samples.append((f"{self.name}_count", key, entry['count']))
+        return samples
+
+    def snapshot(self):
+        with _lock:
+            return [
+                {'labels': dict(key), 'buckets': dict(zip(self.buckets, entry['buckets'])),
+                 'sum': entry['sum'], 'count': entry['count']}
+                for key, entry in self.values.items()
+            ]
+
+# Metrics of the hot path, shared by every module of a bot process
+EXCHANGE_REQUEST_SECONDS = Histogram('bot_exchange_request_seconds', 'Latency of exchange requests', ('endpoint',))
+EXCHANGE_REQUEST_ERRORS = Counter('bot_exchange_request_errors_total', 'Failed exchange requests', ('endpoint',))
+RATE_LIMIT_WAIT_SECONDS = Counter('bot_rate_limit_wait_seconds_total', 'Time spent waiting for request weight', ('limiter',))
+RATE_LIMIT_HITS = Counter('bot_rate_limit_hits_total', 'Responses with status 429 or 418', ('status',))
+FETCH_TIMEOUTS = Counter('bot_fetch_timeouts_total', 'Symbols not fetched within the sweep timeout')
+STAGE_SECONDS = Histogram('bot_stage_seconds', 'Duration of the stages of a sweep', ('stage',))
+ORDERS = Counter('bot_orders_total', 'Orders submitted by outcome', ('type', 'status'))
+TELEGRAM_SEND_SECONDS = Histogram('bot_telegram_send_seconds', 'Latency of Telegram messages')
+TELEGRAM_ERRORS = Counter('bot_telegram_errors_total', 'Telegram messages that failed to send')
+TELEGRAM_DROPPED = Counter('bot_telegram_dropped_total', 'Notifications dropped because the Telegram queue was full')
+SWEEP_SECONDS = Histogram('bot_sweep_seconds', 'Duration of a sweep from wake-up to done')
+SWEEP_CLOSE_LATENCY_SECONDS = Histogram('bot_sweep_close_latency_seconds', 'Time from candle close to the end of the sweep')
+SWEEP_INTERVAL_RATIO = Gauge('bot_sweep_interval_ratio', 'Duration of the last sweep as a fraction of the candle interval')
+SLOW_SWEEPS = Counter('bot_slow_sweeps_total', 'Sweeps that took longer than the configured fraction of the candle interval')
+
+# Function to render every metric in the Prometheus text exposition format
+def render_prometheus():
+    lines = []
+    with _lock:
+        metrics = list(_metrics)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{format_labels(labels)} {value}")
+    return '\n'.join(lines) + '\n'
+
+# Function to collect every metric as a JSON-serialisable dict
+def snapshot():
+    with _lock:
+        metrics = list(_metrics)
+    return {
+        'time': time.time(),
+        'metrics': {metric.name: {'type': metric.kind, 'help': metric.help, 'samples': metric.snapshot()} for metric in metrics},
+    }
+
+# Function to write the metrics to a JSON file, replacing it atomically
+def dump_json(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as file:
+        json.dump(snapshot(), file)
+    os.replace(temporary, path)
+
+# Function to serve /metrics until the process exits
+async def serve_metrics(host, port):
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=render_prometheus(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Prometheus-Format': '0.0.4'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    await asyncio.Event().wait()
+
+def dump_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            dump_json(path)
+        except OSError as e:
+            print(f"Error writing metrics to {path}: {e}")
+
+# Function to start exporting the metrics of this process: a Prometheus text
+# endpoint on `port` and/or a JSON dump to `dump_path` every `dump_interval`
+# seconds ('{script}' in the path is replaced by the script name, so every
+# bot writes its own file). Both run in daemon threads; calling it again is a no-op
+def start_metrics(port=metrics_port, dump_path=metrics_dump_path, dump_interval=metrics_dump_interval, host='0.0.0.0'):
+    global _started
+    if _started:
+        return
+    _started = True
+    if port is not None:
+        def serve():
+            try:
+                asyncio.new_event_loop().run_until_complete(serve_metrics(host, port))
+            except OSError as e:
+                print(f"Error serving metrics on port {port}: {e}")
+        threading.Thread(target=serve, name='metrics-server', daemon=True).start()
+    if dump_path is not None:
+        script = os.path.splitext(os.path.basename(sys.argv[0] or 'bot'))[0]
+        path = dump_path.format(script=script)
+        threading.Thread(target=dump_loop, args=(path, dump_interval), name='metrics-dump', daemon=True).start()
@@ -0,0 +1,677 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+import zlib
+import numpy as np
+from datetime import datetime
+from config import time_interval, mock_seed, mock_latency, mock_weight_limit_per_minute, mock_history_days
+from ohlcv import timeframe_ms
+from async_fetcher import kline_weight
+from user_data_stream import order_update_message, account_update_message
+
+# Log return standard deviation of one synthetic candle
+VOLATILITY = 0.004
+# Relative bid/ask spread of the synthetic book
+SPREAD = 0.0002
+# Synthetic paths are generated in blocks of this many candles, so a path is
+# identical however the candles are requested
+_BLOCK = 1024
+
+# Function to work out the request weight of a mocked call like Binance futures
+def request_weight(name, params):
+    has_symbol = params.get('symbol') is not None
+    if name in ('fapiPublicGetKlines', 'fetch_ohlcv'):
+        limit = params.get('limit')
+        return kline_weight(None if limit is None else int(limit))
+    if name in ('fapiPublicGetTicker24hr', 'fetch_tickers'):
+        return 1 if has_symbol else 40
+    if name in ('fapiPublicGetTickerBookTicker', 'fetch_bids_asks'):
+        return 1 if has_symbol else 2
+    if name in ('fapiPrivateGetOpenOrders', 'fetch_open_orders', 'futures_get_open_orders'):
+        return 1 if has_symbol else 40
+    if name in ('fapiPrivatePostBatchOrders', 'fapiPrivateGetPositionRisk', 'fapiPrivateV2GetPositionRisk', 'fetch_positions', 'fetch_position'):
+        return 5
+    return 1
+
+# Deterministic stand-in for Binance USD-M futures: synthetic price paths per
+# symbol (seeded geometric random walks on the strategy timeframe), netted
+# one-way positions, market and resting limit orders, and a per-minute
+# request weight limit. It answers both ccxt's implicit Binance endpoints
+# (fapiPublicGetKlines, fapiPrivatePostOrder, ...) and the unified methods the
+# scripts use, and reports fills to user-data listeners
+class MockVenue:
+    def __init__(self, symbols, timeframe=time_interval, seed=mock_seed, history_days=mock_history_days,
+                 weight_limit_per_minute=mock_weight_limit_per_minute, clock=None):
+        self.symbols = list(symbols)
+        self.timeframe_ms = timeframe_ms(timeframe)
+        self.seed = seed
+        self.clock = clock or (lambda: int(time.time() * 1000))
+        # Start on a day boundary so every timeframe up to 1d aligns with the paths
+        self.start = (self.clock() - history_days * 86400000) // 86400000 * 86400000
+        self.weight_limit = weight_limit_per_minute
+        self.used_weight = 0
+        self.weight_window = None
+        self.paths = {}
+        self.open_orders = {}
+        self.orders = {}  # Every order by id, for order status queries
+        self.positions = {}
+        self.realized_pnl = 0.0
+        self.next_order_id = 1
+        self.listeners = []
+        self.lock = threading.RLock()
+
+    # Function to charge a request against the per-minute weight limit,
+    # raising like a 429 once it is exceeded
+    def charge(self, name, params):
+        with self.lock:
+            window = self.clock() // 60000
+            if window != self.weight_window:
+                self.weight_window = window
+                self.used_weight = 0
+            self.used_weight += request_weight(name, params)
+            if self.used_weight > self.weight_limit:
+                # ccxt is only imported once the mock raises its errors
+                import ccxt
+                raise ccxt.RateLimitExceeded(f"binance 429 Too many requests, used weight {self.used_weight}")
+            return self.used_weight
+
+    def check_symbol(self, symbol):
+        if symbol not in self.symbols:
+            import ccxt
+            raise ccxt.BadSymbol(f"binance does not have market symbol {symbol}")
+
+    # Base timeframe candles [open, high, low, close, volume] of a symbol,
+    # extended to at least `count` candles
+    def path(self, symbol, count):
+        path = self.paths.get(symbol)
+        if path is None:
+            rng = np.random.default_rng((self.seed, zlib.crc32(symbol.encode())))
+            path = self.paths[symbol] = {'rng': rng, 'last': 10 ** rng.uniform(-3, 4), 'candles': np.empty((0, 5))}
+        # One block at a time, so the float rounding of the walk never
+        # depends on how many candles were asked for at once
+        while len(path['candles']) < count:
+            noise = path['rng'].standard_normal((_BLOCK, 4))
+            closes = path['last'] * np.exp(np.cumsum(noise[:, 0] * VOLATILITY))
+            opens = np.concatenate([[path['last']], closes[:-1]])
+            highs = np.maximum(opens, closes) * (1 + np.abs(noise[:, 1]) * VOLATILITY / 2)
+            lows = np.minimum(opens, closes) * (1 - np.abs(noise[:, 2]) * VOLATILITY / 2)
+            volumes = np.exp(10 + noise[:, 3]) / closes
+            path['candles'] = np.concatenate([path['candles'], np.column_stack([opens, highs, lows, closes, volumes])])
+            path['last'] = closes[-1]
+        return path['candles']
+
+    # Function to build candles [timestamp, open, high, low, close, volume] of
+    # `interval_ms` from index `first` to `last`; the candle containing `now`
+    # is still forming and moves linearly from its open towards its close
+    def candles(self, symbol, interval_ms, first, last, now):
+        factor = interval_ms // self.timeframe_ms
+        current = (now - self.start) // self.timeframe_ms
+        end = min((last + 1) * factor, current + 1)
+        base = self.path(symbol, end)[first * factor:end].copy()
+        if end == current + 1 and len(base):
+            fraction = (now - self.start - current * self.timeframe_ms) / self.timeframe_ms
+            open_, close = base[-1, 0], base[-1, 3]
+            forming = open_ + (close - open_) * fraction
+            base[-1, 1:4] = max(open_, forming), min(open_, forming), forming
+            base[-1, 4] *= fraction
+        starts = np.arange(0, len(base), factor)
+        return np.column_stack([
+            self.start + (first + np.arange(len(starts))) * interval_ms,
+            base[starts, 0],
+            np.maximum.reduceat(base[:, 1], starts),
+            np.minimum.reduceat(base[:, 2], starts),
+            base[np.append(starts[1:], len(base)) - 1, 3],
+            np.add.reduceat(base[:, 4], starts),
+        ]) if len(base) else np.empty((0, 6))
+
+    # Latest trade price of a symbol
+    def price(self, symbol):
+        now = self.clock()
+        current = (now - self.start) // self.timeframe_ms
+        return float(self.candles(symbol, self.timeframe_ms, current, current, now)[-1, 4])
+
+    def book(self, symbol):
+        price = self.price(symbol)
+        return price * (1 - SPREAD / 2), price * (1 + SPREAD / 2)
+
+    # Binance endpoints
+
+    def fapiPublicGetExchangeInfo(self, params={}):
+        return {'timezone': 'UTC', 'serverTime': self.clock(), 'symbols': [self.symbol_info(symbol) for symbol in self.symbols]}
+
+    # Trading rules of a symbol, with precisions matched to its price level
+    def symbol_info(self, symbol):
+        price = self.path(symbol, 1)[0, 3]
+        price_decimals = int(min(8, max(1, 4 - np.floor(np.log10(price)))))
+        quantity_decimals = int(min(3, max(0, np.floor(np.log10(price)) - 1)))
+        tick_size = f"{10 ** -price_decimals:.{price_decimals}f}"
+        step_size = f"{10 ** -quantity_decimals:.{quantity_decimals}f}" if quantity_decimals else '1'
+        return {
+            'symbol': symbol, 'pair': symbol, 'contractType': 'PERPETUAL', 'status': 'TRADING',
+            'baseAsset': symbol[:-4], 'quoteAsset': 'USDT', 'marginAsset': 'USDT',
+            'pricePrecision': price_decimals, 'quantityPrecision': quantity_decimals,
+            'baseAssetPrecision': 8, 'quotePrecision': 8,
+            'orderTypes': ['LIMIT', 'MARKET'], 'timeInForce': ['GTC', 'IOC', 'FOK', 'GTX'],
+            'filters': [
+                {'filterType': 'PRICE_FILTER', 'tickSize': tick_size, 'minPrice': tick_size, 'maxPrice': '1000000'},
+                {'filterType': 'LOT_SIZE', 'stepSize': step_size, 'minQty': step_size, 'maxQty': '10000000'},
+                {'filterType': 'MARKET_LOT_SIZE', 'stepSize': step_size, 'minQty': step_size, 'maxQty': '1000000'},
+                {'filterType': 'MIN_NOTIONAL', 'notional': '5'},
+            ],
+        }
+
+    def fapiPrivateGetLeverageBracket(self, params={}):
+        return [
+            {'symbol': symbol, 'brackets': [{
+                'bracket': 1, 'initialLeverage': 20, 'notionalCap': 1000000, 'notionalFloor': 0,
+                'maintMarginRatio': 0.01, 'cum': 0.0,
+            }]}
+            for symbol in self.symbols
+        ]
+
+    def fapiPublicGetKlines(self, params):
+        symbol = params['symbol']
+        self.check_symbol(symbol)
+        interval_ms = timeframe_ms(params['interval'])
+        if interval_ms % self.timeframe_ms:
+            import ccxt
+            raise ccxt.BadRequest(f"binance mock only serves multiples of its {self.timeframe_ms // 60000}m paths")
+        now = self.clock()
+        limit = min(int(params.get('limit', 500)), 1500)
+        last = (now - self.start) // interval_ms
+        since = params.get('startTime')
+        first = last - limit + 1 if since is None else -(-(int(since) - self.start) // interval_ms)
+        first = max(first, 0)
+        candles = self.candles(symbol, interval_ms, first, min(first + limit - 1, last), now)
+        return [
+            [int(t), str(o), str(h), str(l), str(c), str(v), int(t) + interval_ms - 1, str(v * c), 100, str(v / 2), str(v * c / 2), '0']
+            for t, o, h, l, c, v in candles.tolist()
+        ]
+
+    def ticker_24hr(self, symbol):
+        now = self.clock()
+        last = (now - self.start) // self.timeframe_ms
+        first = max(0, last - 86400000 // self.timeframe_ms + 1)
+        candles = self.candles(symbol, self.timeframe_ms, first, last, now)
+        open_, close = candles[0, 1], candles[-1, 4]
+        return {
+            'symbol': symbol, 'priceChange': str(close - open_), 'priceChangePercent': str((close / open_ - 1) * 100),
+            'weightedAvgPrice': str(close), 'lastPrice': str(close), 'lastQty': '1', 'openPrice': str(open_),
+            'highPrice': str(candles[:, 2].max()), 'lowPrice': str(candles[:, 3].min()),
+            'volume': str(candles[:, 5].sum()), 'quoteVolume': str((candles[:, 5] * candles[:, 4]).sum()),
+            'openTime': int(candles[0, 0]), 'closeTime': now, 'firstId': 1, 'lastId': 100, 'count': 100,
+        }
+
+    def fapiPublicGetTicker24hr(self, params={}):
+        if params.get('symbol'):
+            self.check_symbol(params['symbol'])
+            return self.ticker_24hr(params['symbol'])
+        return [self.ticker_24hr(symbol) for symbol in self.symbols]
+
+    def book_ticker(self, symbol):
+        bid, ask = self.book(symbol)
+        return {'symbol': symbol, 'bidPrice': str(bid), 'bidQty': '10', 'askPrice': str(ask), 'askQty': '10', 'time': self.clock()}
+
+    def fapiPublicGetTickerBookTicker(self, params={}):
+        if params.get('symbol'):
+            self.check_symbol(params['symbol'])
+            return self.book_ticker(params['symbol'])
+        return [self.book_ticker(symbol) for symbol in self.symbols]
+
+    # Function to place an order from Binance order parameters
+    def fapiPrivatePostOrder(self, params):
+        symbol = params['symbol']
+        self.check_symbol(symbol)
+        quantity = float(params['quantity'])
+        if quantity <= 0:
+            import ccxt
+            raise ccxt.InvalidOrder("binance Quantity less than or equal to zero.")
+        with self.lock:
+            self.match_orders()
+            order = {
+                'orderId': self.next_order_id, 'symbol': symbol, 'status': 'NEW',
+                'clientOrderId': params.get('newClientOrderId', f"mock{self.next_order_id}"),
+                'price': str(params.get('price', '0')), 'avgPrice': '0', 'origQty': str(quantity), 'executedQty': '0',
+                'cumQuote': '0', 'timeInForce': params.get('timeInForce', 'GTC'), 'type': params['type'].upper(),
+                'reduceOnly': str(params.get('reduceOnly', 'false')).lower() == 'true', 'closePosition': False,
+                'side': params['side'].upper(), 'positionSide': 'BOTH', 'stopPrice': '0',
+                'origType': params['type'].upper(), 'updateTime': self.clock(),
+            }
+            self.next_order_id += 1
+            self.orders[order['orderId']] = order
+            self.emit_order(order)
+            if order['type'] == 'MARKET':
+                bid, ask = self.book(symbol)
+                self.fill(order, ask if order['side'] == 'BUY' else bid)
+            else:
+                self.open_orders[order['orderId']] = order
+                self.match_orders()
+            return dict(order)
+
+    def fapiPrivatePostBatchOrders(self, params):
+        import ccxt
+        results = []
+        for order_params in json.loads(params['batchOrders']):
+            try:
+                results.append(self.fapiPrivatePostOrder(order_params))
+            except ccxt.BaseError as e:
+                results.append({'code': -1111, 'msg': str(e)})
+        return results
+
+    def fapiPrivateDeleteOrder(self, params):
+        with self.lock:
+            order = self.open_orders.pop(int(params['orderId']), None)
+            if order is None:
+                import ccxt
+                raise ccxt.OrderNotFound(f"binance Unknown order sent. {params['orderId']}")
+            order['status'] = 'CANCELED'
+            order['updateTime'] = self.clock()
+            self.emit_order(order)
+            return dict(order)
+
+    def fapiPrivateDeleteBatchOrders(self, params):
+        import ccxt
+        results = []
+        for order_id in json.loads(params['orderIdList']):
+            try:
+                results.append(self.fapiPrivateDeleteOrder({'symbol': params['symbol'], 'orderId': order_id}))
+            except ccxt.OrderNotFound as e:
+                results.append({'code': -2011, 'msg': str(e)})
+        return results
+
+    def fapiPrivateDeleteAllOpenOrders(self, params):
+        with self.lock:
+            for order_id in [order_id for order_id, order in self.open_orders.items() if order['symbol'] == params['symbol']]:
+                self.fapiPrivateDeleteOrder({'orderId': order_id})
+        return {'code': 200, 'msg': 'The operation of cancel all open order is done.'}
+
+    def fapiPrivateGetOpenOrders(self, params={}):
+        with self.lock:
+            self.match_orders()
+            return [dict(order) for order in self.open_orders.values()
+                    if not params.get('symbol') or order['symbol'] == params['symbol']]
+
+    def fapiPrivateGetOrder(self, params):
+        with self.lock:
+            self.match_orders()
+            order = self.orders.get(int(params['orderId']))
+            if order is None:
+                import ccxt
+                raise ccxt.OrderNotFound(f"binance Order does not exist. {params['orderId']}")
+            return dict(order)
+
+    def position_risk(self, symbol):
+        amount, entry_price = self.positions.get(symbol, (0.0, 0.0))
+        price = self.price(symbol)
+        return {
+            'symbol': symbol, 'positionAmt': str(amount), 'entryPrice': str(entry_price), 'markPrice': str(price),
+            'unRealizedProfit': str((price - entry_price) * amount), 'liquidationPrice': '0', 'leverage': '20',
+            'maxNotionalValue': '1000000', 'marginType': 'cross', 'isolatedMargin': '0', 'isAutoAddMargin': 'false',
+            'positionSide': 'BOTH', 'notional': str(amount * price), 'isolatedWallet': '0', 'updateTime': self.clock(),
+        }
+
+    def fapiPrivateV2GetPositionRisk(self, params={}):
+        with self.lock:
+            self.match_orders()
+            symbols = [params['symbol']] if params.get('symbol') else self.symbols
+            return [self.position_risk(symbol) for symbol in symbols]
+
+    # Same response on the v1 path ccxt's fetch_positions uses
+    fapiPrivateGetPositionRisk = fapiPrivateV2GetPositionRisk
+
+    def fapiPrivatePostListenKey(self, params={}):
+        return {'listenKey': 'mock'}
+
+    def fapiPrivatePutListenKey(self, params={}):
+        return {}
+
+    # Matching and positions
+
+    # Function to fill resting limit orders the current price has crossed
+    def match_orders(self):
+        for order in list(self.open_orders.values()):
+            limit_price = float(order['price'])
+            bid, ask = self.book(order['symbol'])
+            if (order['side'] == 'BUY' and ask <= limit_price) or (order['side'] == 'SELL' and bid >= limit_price):
+                del self.open_orders[order['orderId']]
+                self.fill(order, limit_price)
+
+    def fill(self, order, price):
+        symbol = order['symbol']
+        quantity = float(order['origQty'])
+        signed = quantity if order['side'] == 'BUY' else -quantity
+        amount, entry_price = self.positions.get(symbol, (0.0, 0.0))
+        if order['reduceOnly']:
+            signed = max(-abs(amount), min(abs(amount), signed)) if amount * signed < 0 else 0.0
+        new_amount = round(amount + signed, 8)
+        if amount * signed < 0:
+            # Realize the closed part at the fill price
+            closed = min(abs(signed), abs(amount))
+            self.realized_pnl += closed * (price - entry_price) * np.sign(amount)
+        if new_amount == 0:
+            entry_price = 0.0
+        elif amount * new_amount <= 0:
+            entry_price = price  # Opened or flipped
+        elif abs(new_amount) > abs(amount):
+            entry_price = (amount * entry_price + signed * price) / new_amount  # Added to the position
+        if new_amount == 0:
+            self.positions.pop(symbol, None)
+        else:
+            self.positions[symbol] = (new_amount, entry_price)
+
+        order.update({
+            'status': 'FILLED', 'avgPrice': str(price), 'executedQty': order['origQty'],
+            'cumQuote': str(quantity * price), 'updateTime': self.clock(),
+        })
+        self.emit_order(order)
+        self.emit(account_update_message(symbol, new_amount, entry_price, 0.0, self.clock()))
+
+    def emit(self, message):
+        for listener in self.listeners:
+            listener(message)
+
+    def emit_order(self, order):
+        self.emit(order_update_message(
+            order['symbol'], order['orderId'], order['side'], order['type'], order['status'], order['price'],
+            order['origQty'], order['executedQty'], order['reduceOnly'], self.clock()))
+
+    # Unified ccxt methods
+
+    def load_markets(self, reload=False, params={}):
+        return {f"{symbol[:-4]}/USDT": {'id': symbol, 'symbol': f"{symbol[:-4]}/USDT"} for symbol in self.symbols}
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+        request = {'symbol': symbol, 'interval': timeframe, 'limit': limit or 500}
+        if since is not None:
+            request['startTime'] = since
+        return [[row[0]] + [float(value) for value in row[1:6]] for row in self.fapiPublicGetKlines(request)]
+
+    def parse_ticker(self, ticker, book):
+        return {
+            'symbol': f"{ticker['symbol'][:-4]}/USDT", 'timestamp': ticker['closeTime'],
+            'high': float(ticker['highPrice']), 'low': float(ticker['lowPrice']),
+            'bid': float(book['bidPrice']), 'ask': float(book['askPrice']),
+            'open': float(ticker['openPrice']), 'close': float(ticker['lastPrice']), 'last': float(ticker['lastPrice']),
+            'baseVolume': float(ticker['volume']), 'quoteVolume': float(ticker['quoteVolume']),
+            'info': ticker,
+        }
+
+    def fetch_ticker(self, symbol, params={}):
+        self.check_symbol(symbol)
+        return self.parse_ticker(self.ticker_24hr(symbol), self.book_ticker(symbol))
+
+    def fetch_tickers(self, symbols=None, params={}):
+        tickers = [self.fetch_ticker(symbol) for symbol in symbols or self.symbols]
+        # Like Binance's 24hr endpoint, the bulk tickers carry no bid/ask
+        return {ticker['symbol']: dict(ticker, bid=None, ask=None) for ticker in tickers}
+
+    def fetch_bids_asks(self, symbols=None, params={}):
+        books = [self.book_ticker(symbol) for symbol in symbols or self.symbols]
+        return {
+            f"{book['symbol'][:-4]}/USDT": {
+                'symbol': f"{book['symbol'][:-4]}/USDT", 'timestamp': book['time'],
+                'bid': float(book['bidPrice']), 'ask': float(book['askPrice']), 'info': book,
+            }
+            for book in books
+        }
+
+    def parse_position(self, risk):
+        amount = float(risk['positionAmt'])
+        return {
+            'symbol': f"{risk['symbol'][:-4]}/USDT", 'side': 'long' if amount > 0 else 'short' if amount < 0 else None,
+            'contracts': abs(amount), 'entryPrice': float(risk['entryPrice']), 'positionAmt': amount,
+            'unrealizedPnl': float(risk['unRealizedProfit']), 'info': risk,
+        }
+
+    def fetch_positions(self, symbols=None, params={}):
+        return [self.parse_position(risk) for risk in self.fapiPrivateV2GetPositionRisk()
+                if symbols is None or risk['symbol'] in symbols]
+
+    def fetch_position(self, symbol, params={}):
+        self.check_symbol(symbol)
+        return self.parse_position(self.fapiPrivateV2GetPositionRisk({'symbol': symbol})[0])
+
+    def parse_order(self, order):
+        filled = float(order['executedQty'])
+        average = float(order['avgPrice']) or None
+        return {
+            'id': str(order['orderId']), 'clientOrderId': order['clientOrderId'], 'timestamp': order['updateTime'],
+            'symbol': f"{order['symbol'][:-4]}/USDT", 'type': order['type'].lower(), 'side': order['side'].lower(),
+            'price': float(order['price']) or None, 'amount': float(order['origQty']), 'filled': filled,
+            'remaining': float(order['origQty']) - filled, 'average': average, 'cost': float(order['cumQuote']),
+            'status': {'NEW': 'open', 'FILLED': 'closed', 'CANCELED': 'canceled'}[order['status']],
+            'reduceOnly': order['reduceOnly'], 'info': order,
+        }
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        request = dict(params, symbol=symbol, type=type, side=side, quantity=amount)
+        if type == 'limit':
+            request.update(price=price, timeInForce='GTC')
+        return self.parse_order(self.fapiPrivatePostOrder(request))
+
+    def create_market_buy_order(self, symbol, amount, params={}):
+        return self.create_order(symbol, 'market', 'buy', amount, None, params)
+
+    def create_market_sell_order(self, symbol, amount, params={}):
+        return self.create_order(symbol, 'market', 'sell', amount, None, params)
+
+    def create_limit_buy_order(self, symbol, amount, price, params={}):
+        return self.create_order(symbol, 'limit', 'buy', amount, price, params)
+
+    def create_limit_sell_order(self, symbol, amount, price, params={}):
+        return self.create_order(symbol, 'limit', 'sell', amount, price, params)
+
+    def cancel_order(self, id, symbol=None, params={}):
+        return self.parse_order(self.fapiPrivateDeleteOrder({'orderId': id}))
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        return [self.parse_order(order) for order in self.fapiPrivateGetOpenOrders({'symbol': symbol})]
+
+    # python-binance Client method
+    def futures_get_open_orders(self, **params):
+        return self.fapiPrivateGetOpenOrders(params)
+
+# Names a mock client forwards to the venue
+API = {name for name in dir(MockVenue) if name.startswith('fapi') or name in (
+    'load_markets', 'fetch_ohlcv', 'fetch_ticker', 'fetch_tickers', 'fetch_bids_asks', 'fetch_positions',
+    'fetch_position', 'create_order', 'create_market_buy_order', 'create_market_sell_order',
+    'create_limit_buy_order', 'create_limit_sell_order', 'cancel_order', 'fetch_open_orders',
+    'futures_get_open_orders')}
+
+# Function to pick the request parameters of a forwarded call for weighting
+def call_params(name, args, kwargs):
+    if name.startswith('fapi'):
+        return args[0] if args else kwargs
+    params = dict(kwargs)
+    if args and isinstance(args[0], str):
+        params.setdefault('symbol', args[0])
+    if name == 'fetch_ohlcv':
+        params.setdefault('limit', args[3] if len(args) > 3 else None)
+    return params
+
+# Synchronous ccxt-shaped client of a MockVenue. Every call is charged
+# against the venue's weight limit and takes `latency` seconds
+class MockExchange:
+    def __init__(self, venue, latency=mock_latency):
+        self.venue = venue
+        self.latency = latency
+
+    def milliseconds(self):
+        return self.venue.clock()
+
+    @staticmethod
+    def parse_timeframe(timeframe):
+        return timeframe_ms(timeframe) // 1000
+
+    @staticmethod
+    def parse8601(timestamp):
+        return int(datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp() * 1000)
+
+    # Fills and cancels are pushed here instead of through a websocket
+    def subscribe_user_data(self, callback):
+        self.venue.listeners.append(callback)
+
+    def __getattr__(self, name):
+        if name not in API:
+            raise AttributeError(name)
+        method = getattr(self.venue, name)
+
+        def request(*args, **kwargs):
+            self.venue.charge(name, call_params(name, args, kwargs))
+            time.sleep(self.latency)
+            return method(*args, **kwargs)
+        return request
+
+# Async ccxt-shaped client of a MockVenue, for the fetcher and the executor
+class AsyncMockExchange(MockExchange):
+    def __getattr__(self, name):
+        if name not in API:
+            raise AttributeError(name)
+        method = getattr(self.venue, name)
+
+        async def request(*args, **kwargs):
+            self.venue.charge(name, call_params(name, args, kwargs))
+            await asyncio.sleep(self.latency)
+            return method(*args, **kwargs)
+        return request
+
+    async def close(self):
+        pass
+
+# Venue shared by every client of this process
+_venue = None
+
+def get_venue():
+    global _venue
+    if _venue is None:
+        from config import symbols
+        _venue = MockVenue(symbols)
+    return _venue
+
+# Binance REST paths served by MockExchangeServer, mapped to venue endpoints
+ROUTES = {
+    ('GET', '/fapi/v1/exchangeInfo'): 'fapiPublicGetExchangeInfo',
+    ('GET', '/fapi/v1/klines'): 'fapiPublicGetKlines',
+    ('GET', '/fapi/v1/ticker/24hr'): 'fapiPublicGetTicker24hr',
+    ('GET', '/fapi/v1/ticker/bookTicker'): 'fapiPublicGetTickerBookTicker',
+    ('GET', '/fapi/v1/leverageBracket'): 'fapiPrivateGetLeverageBracket',
+    ('GET', '/fapi/v1/openOrders'): 'fapiPrivateGetOpenOrders',
+    ('GET', '/fapi/v1/positionRisk'): 'fapiPrivateGetPositionRisk',
+    ('GET', '/fapi/v2/positionRisk'): 'fapiPrivateV2GetPositionRisk',
+    ('POST', '/fapi/v1/order'): 'fapiPrivatePostOrder',
+    ('POST', '/fapi/v1/batchOrders'): 'fapiPrivatePostBatchOrders',
+    ('DELETE', '/fapi/v1/order'): 'fapiPrivateDeleteOrder',
+    ('DELETE', '/fapi/v1/batchOrders'): 'fapiPrivateDeleteBatchOrders',
+    ('DELETE', '/fapi/v1/allOpenOrders'): 'fapiPrivateDeleteAllOpenOrders',
+    ('POST', '/fapi/v1/listenKey'): 'fapiPrivatePostListenKey',
+    ('PUT', '/fapi/v1/listenKey'): 'fapiPrivatePutListenKey',
+}
+
+# Function to point a real ccxt Binance client at a MockExchangeServer
+def mock_http_urls(exchange, url):
+    exchange.urls['api'].update({
+        'fapiPublic': f"{url}/fapi/v1",
+        'fapiPrivate': f"{url}/fapi/v1",
+        'fapiPrivateV2': f"{url}/fapi/v2",
+    })
+    return exchange
+
+# Local HTTP/websocket server speaking the Binance futures REST endpoints of a
+# MockVenue, so unmodified ccxt or python-binance clients can run against it.
+# Signatures are not checked; the user-data stream is served on /ws/{listenKey}
+class MockExchangeServer:
+    def __init__(self, venue, host='127.0.0.1', port=0, latency=mock_latency):
+        self.venue = venue
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.clients = set()
+        self.runner = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def handle(self, request):
+        import ccxt
+        from aiohttp import web
+        name = ROUTES.get((request.method, request.path))
+        if name is None:
+            return web.json_response({'code': -1100, 'msg': f"Unsupported endpoint {request.path}"}, status=404)
+        params = dict(request.query)
+        params.update(await request.post())
+        await asyncio.sleep(self.latency)
+        try:
+            used_weight = self.venue.charge(name, params)
+        except ccxt.RateLimitExceeded as e:
+            return web.json_response({'code': -1003, 'msg': str(e)}, status=429, headers={'Retry-After': '60'})
+        try:
+            result = getattr(self.venue, name)(params)
+        except ccxt.BadSymbol as e:
+            return web.json_response({'code': -1121, 'msg': str(e)}, status=400)
+        except ccxt.OrderNotFound as e:
+            return web.json_response({'code': -2011, 'msg': str(e)}, status=400)
+        except ccxt.BaseError as e:
+            return web.json_response({'code': -1111, 'msg': str(e)}, status=400)
+        return web.json_response(result, headers={'X-MBX-USED-WEIGHT-1M': str(used_weight)})
+
+    async def handle_user_data(self, request):
+        from aiohttp import web
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.clients.add(ws)
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            self.clients.discard(ws)
+        return ws
+
+    # Venue listener: forward fills and cancels to the websocket clients
+    def publish(self, message):
+        for ws in list(self.clients):
+            self.loop.call_soon_threadsafe(asyncio.ensure_future, ws.send_str(json.dumps(message)))
+
+    async def start(self):
+        # The server side of aiohttp is only loaded by offline tests
+        from aiohttp import web
+        self.loop = asyncio.get_event_loop()
+        app = web.Application()
+        app.router.add_get('/ws/{listen_key}', self.handle_user_data)
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        # Pick up the real port when an ephemeral one was requested
+        self.port = self.runner.addresses[0][1]
+        self.venue.listeners.append(self.publish)
+        return self.url
+
+    async def stop(self):
+        if self.publish in self.venue.listeners:
+            self.venue.listeners.remove(self.publish)
+        for ws in list(self.clients):
+            await ws.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+# Function to serve the mock exchange until interrupted
+async def serve_mock_exchange(host, port, latency):
+    server = MockExchangeServer(get_venue(), host, port, latency)
+    print(f"Mock Binance futures on {await server.start()}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a deterministic mock of the Binance futures REST API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=mock_latency)
+    args = parser.parse_args()
+    asyncio.run(serve_mock_exchange(args.host, args.port, args.latency))
@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+from config import (TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, telegram_coalesce_seconds, telegram_min_interval,
+                    telegram_max_pending, telegram_max_retries)
+from metrics import TELEGRAM_SEND_SECONDS, TELEGRAM_ERRORS, TELEGRAM_DROPPED
+
+# Telegram rejects messages longer than 4096 characters
+MAX_MESSAGE_LENGTH = 4096
+
+# Function to join lines into as few texts of at most `limit` characters as
+# possible, one line per text line (longer lines are cut)
+def split_messages(lines, limit=MAX_MESSAGE_LENGTH):
+    texts = []
+    text = ''
+    for line in lines:
+        line = line[:limit]
+        if text and len(text) + 1 + len(line) > limit:
+            texts.append(text)
+            text = ''
+        text = f"{text}\n{line}" if text else line
+    if text:
+        texts.append(text)
+    return texts
+
+async def create_events(count):
+    return [asyncio.Event() for _ in range(count)]
+
+# Outbound Telegram notifications, sent from a background thread so the
+# trading path never waits for Telegram. notify() only appends to a bounded
+# list; the sender waits `coalesce_seconds` for the rest of a burst (or until
+# flush()), joins the messages into as few digests as fit in a Telegram
+# message and sends them at most one per `min_interval` seconds, retrying
+# rate limits and network errors with backoff. When `max_pending` messages
+# are waiting, new ones are dropped and only counted in the next digest
+class TelegramNotifier:
+    def __init__(self, bot, chat_id, coalesce_seconds=telegram_coalesce_seconds, min_interval=telegram_min_interval,
+                 max_pending=telegram_max_pending, max_retries=telegram_max_retries):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.coalesce_seconds = coalesce_seconds
+        self.min_interval = min_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.pending = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.initialized = False
+        self.next_send = 0.0  # Monotonic time the next message may be sent
+        self.loop = asyncio.new_event_loop()
+        # Created inside their own loop, Python < 3.10 binds events on creation
+        self.wakeup, self.flushed = self.loop.run_until_complete(create_events(2))
+        threading.Thread(target=self.loop.run_until_complete, args=(self.run(),), name='telegram-notifier', daemon=True).start()
+
+    # Function to queue a message without blocking
+    def notify(self, text):
+        with self.lock:
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                TELEGRAM_DROPPED.inc()
+                return
+            self.pending.append(text)
+            first = len(self.pending) == 1
+        # Wake the sender once per burst
+        if first:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    # Function to send the queued messages now instead of after the coalescing delay,
+    # e.g. at the end of a sweep
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+        self.loop.call_soon_threadsafe(self.flushed.set)
+
+    # Function to take the queued messages as digests of at most MAX_MESSAGE_LENGTH characters
+    def digests(self):
+        with self.lock:
+            messages, self.pending = self.pending, []
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            messages.append(f"... {dropped} more messages dropped")
+        return split_messages(messages)
+
+    # Function to send one digest, keeping to the chat's rate limit and
+    # retrying rate limits and network errors
+    async def send(self, text):
+        from telegram.error import RetryAfter, NetworkError
+
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(max(0.0, self.next_send - time.monotonic()))
+            try:
+                if not self.initialized:
+                    await self.bot.initialize()
+                    self.initialized = True
+                with TELEGRAM_SEND_SECONDS.time():
+                    await self.bot.send_message(chat_id=self.chat_id, text=text)
+                self.next_send = time.monotonic() + self.min_interval
+                return
+            except RetryAfter as e:
+                # Telegram says how long to back off
+                self.next_send = time.monotonic() + float(e.retry_after)
+            except NetworkError as e:
+                self.next_send = time.monotonic() + min(2 ** attempt, 60)
+                print(f"Error sending Telegram message (attempt {attempt + 1}): {e}")
+            except Exception as e:
+                TELEGRAM_ERRORS.inc()
+                print(f"Error sending Telegram message: {e}")
+                return
+        TELEGRAM_ERRORS.inc()
+        print(f"Error sending Telegram message: giving up after {self.max_retries + 1} attempts")
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            # Let the rest of the burst arrive
+            try:
+                await asyncio.wait_for(self.flushed.wait(), self.coalesce_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.flushed.clear()
+            for digest in self.digests():
+                await self.send(digest)
+
+# Notifier of this process, created on first use from the Telegram settings in
+# config; None when no bot token or chat id is configured
+_notifier = None
+_configured = False
+
+def get_notifier():
+    global _notifier, _configured
+    if not _configured:
+        _configured = True
+        if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
+            from telegram import Bot
+            _notifier = TelegramNotifier(Bot(token=TELEGRAM_BOT_TOKEN), TELEGRAM_CHAT_ID)
+        else:
+            print("Telegram notifications disabled: set TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID in config.py")
+    return _notifier
+
+# Function to queue a Telegram notification
+def notify(text):
+    notifier = get_notifier()
+    if notifier is not None:
+        notifier.notify(text)
+
+# Function to send the queued notifications without waiting for the coalescing delay
+def flush():
+    notifier = get_notifier()
+    if notifier is not None:
+        notifier.flush()
@@ -0,0 +1,51 @@
+import numpy as np
+
+# Candles are held as (candles x 6) float64 arrays with the columns of ccxt's
+# fetch_ohlcv: timestamp (ms), open, high, low, close, volume
+COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+TIMESTAMP, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+
+# Milliseconds per unit of a timeframe, with ccxt's month and year lengths
+TIMEFRAME_UNITS = {
+    's': 1000,
+    'm': 60 * 1000,
+    'h': 60 * 60 * 1000,
+    'd': 24 * 60 * 60 * 1000,
+    'w': 7 * 24 * 60 * 60 * 1000,
+    'M': 30 * 24 * 60 * 60 * 1000,
+    'y': 365 * 24 * 60 * 60 * 1000,
+}
+
+# Function to get the length of a timeframe ('1m', '15m', '4h', '1d', ...) in
+# milliseconds, like ccxt's parse_timeframe without importing ccxt
+def timeframe_ms(timeframe):
+    return int(timeframe[:-1]) * TIMEFRAME_UNITS[timeframe[-1]]
+
+# Function to get an empty candle array
+def empty_ohlcv():
+    return np.empty((0, len(COLUMNS)))
+
+# Function to parse raw Binance klines ([open time, 'open', 'high', 'low',
+# 'close', 'volume', close time, ...] with prices as strings) into a candle
+# array in one conversion, skipping ccxt's per-row parsing
+def parse_klines(klines):
+    if not klines:
+        return empty_ohlcv()
+    return np.array(klines, dtype=object)[:, :len(COLUMNS)].astype(np.float64)
+
+# Function to turn ccxt candles (a list of lists, or already an array) into a
+# candle array; arrays are returned without copying
+def parse_ohlcv(ohlcv):
+    if isinstance(ohlcv, np.ndarray) and ohlcv.dtype == np.float64:
+        return ohlcv
+    if len(ohlcv) == 0:
+        return empty_ohlcv()
+    return np.asarray(ohlcv, dtype=np.float64).reshape(-1, len(COLUMNS))
+
+# Function to materialize a candle array as a pandas DataFrame indexed by
+# open time, for reporting and backtests only
+def to_dataframe(ohlcv):
+    import pandas as pd
+    df = pd.DataFrame(parse_ohlcv(ohlcv), columns=COLUMNS)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df.set_index('timestamp')
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+import numpy as np
+from config import order_max_workers
+from exchange_factory import create_async_exchange
+from metrics import EXCHANGE_REQUEST_SECONDS, EXCHANGE_REQUEST_ERRORS, ORDERS, STAGE_SECONDS
+
+# Binance accepts at most 5 orders per batchOrders request
+MAX_BATCH_ORDERS = 5
+# and cancels at most 10 order ids per batchOrders delete
+MAX_BATCH_CANCELS = 10
+
+# Event loop running in a background thread with its own async client, so
+# orders can be submitted from the sweep loop and from inside the kline
+# stream's running event loop alike
+_loop = None
+_exchange = None
+
+# Function to get the executor's event loop, starting its thread on first use
+def get_loop():
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        threading.Thread(target=_loop.run_forever, name='order-executor', daemon=True).start()
+    return _loop
+
+def get_exchange():
+    global _exchange
+    if _exchange is None:
+        _exchange = create_async_exchange(get_loop())
+    return _exchange
+
+# Function to build the single order that takes a symbol from its current
+# position to `quantity` contracts on the side of the signal. Closing an
+# opposite position and opening the new one become one order; returns None
+# when the position is already there. `price` is the limit price, or for a
+# market order the reference price used for the minimum notional check
+def flip_order(symbol, signal, quantity, position=None, order_type='market', price=None):
+    current = position['positionAmt'] if position is not None else 0.0
+    target = quantity if signal == 'BUY' else -quantity
+    delta = target - current
+    if delta == 0:
+        return None
+    order = {'symbol': symbol, 'side': 'BUY' if delta > 0 else 'SELL', 'type': order_type, 'quantity': abs(delta)}
+    if price is not None:
+        order['price'] = price
+    return order
+
+# Function to build the reduce-only market order that closes a position
+def close_order(symbol, position):
+    return {'symbol': symbol, 'side': 'SELL' if position['positionAmt'] > 0 else 'BUY', 'type': 'market',
+            'quantity': position['contracts'], 'reduceOnly': True}
+
+# Function to round the quantities and limit prices of all orders at once,
+# dropping orders below the symbol's minimums
+def round_orders(orders, market_index):
+    known = []
+    for order in orders:
+        if order['symbol'] in market_index.rows:
+            known.append(order)
+        else:
+            print(f"Error placing order for {order['symbol']}: no trading rules for this symbol")
+    if not known:
+        return []
+
+    symbols = [order['symbol'] for order in known]
+    market = np.array([order['type'] == 'market' for order in known])
+    prices = np.array([order.get('price', np.nan) for order in known], dtype=float)
+    quantities = market_index.round_quantities(
+        symbols, [order['quantity'] for order in known], np.nan_to_num(prices, nan=np.inf), market)
+    prices = np.where(market, prices, market_index.round_prices(symbols, prices, [order['side'] for order in known]))
+
+    rounded = []
+    for order, quantity, price in zip(known, quantities, prices):
+        if quantity == 0:
+            print(f"Skipping order for {order['symbol']}: quantity {order['quantity']} is below the minimum order size")
+            continue
+        rounded.append(dict(order, quantity=float(quantity), price=float(price)))
+    return rounded
+
+# Function to turn a rounded order into Binance order parameters
+def order_params(market_index, order):
+    params = {
+        'symbol': order['symbol'],
+        'side': order['side'],
+        'type': order['type'].upper(),
+        'quantity': market_index.format_quantity(order['symbol'], order['quantity']),
+    }
+    if order['type'] == 'limit':
+        params['price'] = market_index.format_price(order['symbol'], order['price'])
+        params['timeInForce'] = 'GTC'
+    if order.get('reduceOnly'):
+        params['reduceOnly'] = 'true'
+    return params
+
+# Function to submit up to MAX_BATCH_ORDERS orders in one request and return
+# one result per order with its submit-to-ack latency
+async def submit_batch(exchange, market_index, batch, semaphore):
+    async with semaphore:
+        endpoint = 'order' if len(batch) == 1 else 'batch_orders'
+        started = time.perf_counter()
+        try:
+            params = [order_params(market_index, order) for order in batch]
+            if len(batch) == 1:
+                acks = [await exchange.fapiPrivatePostOrder(params[0])]
+            else:
+                acks = await exchange.fapiPrivatePostBatchOrders({'batchOrders': json.dumps(params)})
+        except Exception as e:
+            EXCHANGE_REQUEST_ERRORS.inc(endpoint=endpoint)
+            acks = [{'msg': str(e)}] * len(batch)
+        latency_ms = (time.perf_counter() - started) * 1000
+        EXCHANGE_REQUEST_SECONDS.observe(latency_ms / 1000, endpoint=endpoint)
+        for order, ack in zip(batch, acks):
+            ORDERS.inc(type=order['type'], status='acked' if 'orderId' in ack else 'rejected')
+
+    # Failed orders of a batch come back as {'code', 'msg'} in their place
+    return [
+        dict(order, id=str(ack['orderId']) if 'orderId' in ack else None, status=ack.get('status', 'REJECTED'),
+             error=ack.get('msg'), latency_ms=latency_ms)
+        for order, ack in zip(batch, acks)
+    ]
+
+# Function to cancel up to MAX_BATCH_CANCELS open orders of a symbol by id in
+# one request. Only the given orders are touched, so orders other bots keep
+# on the same account stay open
+async def cancel_batch(exchange, symbol, order_ids, semaphore):
+    async with semaphore:
+        endpoint = 'cancel_order' if len(order_ids) == 1 else 'cancel_batch_orders'
+        try:
+            with EXCHANGE_REQUEST_SECONDS.time(endpoint=endpoint):
+                if len(order_ids) == 1:
+                    acks = [await exchange.fapiPrivateDeleteOrder({'symbol': symbol, 'orderId': order_ids[0]})]
+                else:
+                    acks = await exchange.fapiPrivateDeleteBatchOrders(
+                        {'symbol': symbol, 'orderIdList': json.dumps([int(order_id) for order_id in order_ids])})
+        except Exception as e:
+            EXCHANGE_REQUEST_ERRORS.inc(endpoint=endpoint)
+            acks = [{'msg': str(e)}] * len(order_ids)
+
+    # Failed cancels of a batch come back as {'code', 'msg'} in their place
+    for order_id, ack in zip(order_ids, acks):
+        if 'orderId' in ack:
+            print(f"Cancelled order {order_id} for {symbol}")
+        else:
+            print(f"Error cancelling order {order_id} for {symbol}: {ack.get('msg')}")
+
+# Function to print each order's outcome and the ack latency of the run
+def report_latency(results, elapsed_ms):
+    for result in results:
+        if result['error'] is None:
+            print(f"{result['type'].capitalize()} {result['side'].capitalize()} Order placed for {result['symbol']}: "
+                  f"{result['quantity']} ({result['id']}) acked in {result['latency_ms']:.1f} ms")
+        else:
+            print(f"Error placing {result['type'].capitalize()} {result['side'].capitalize()} Order for "
+                  f"{result['symbol']}: {result['error']}")
+    latencies = [result['latency_ms'] for result in results]
+    if latencies:
+        print(f"Submitted {len(results)} orders in {elapsed_ms:.1f} ms, ack latency "
+              f"median {statistics.median(latencies):.1f} ms, max {max(latencies):.1f} ms")
+
+# Function to submit orders for many symbols concurrently: quantities and
+# prices are rounded with the market index, the open orders in `cancels`
+# ((symbol, order id) pairs) are cancelled, then the orders go out in batches
+# with at most max_workers requests in flight. `exchange` defaults to the
+# executor's own client
+async def execute_orders_async(orders, market_index, cancels=(), max_workers=order_max_workers, exchange=None):
+    exchange = get_exchange() if exchange is None else exchange
+    orders = round_orders(orders, market_index)
+    semaphore = asyncio.Semaphore(max_workers)
+    started = time.perf_counter()
+
+    cancel_ids = {}
+    for symbol, order_id in cancels:
+        cancel_ids.setdefault(symbol, {})[order_id] = None
+    await asyncio.gather(*[
+        cancel_batch(exchange, symbol, list(order_ids)[start:start + MAX_BATCH_CANCELS], semaphore)
+        for symbol, order_ids in cancel_ids.items()
+        for start in range(0, len(order_ids), MAX_BATCH_CANCELS)
+    ])
+    batches = await asyncio.gather(*[
+        submit_batch(exchange, market_index, orders[start:start + MAX_BATCH_ORDERS], semaphore)
+        for start in range(0, len(orders), MAX_BATCH_ORDERS)
+    ])
+    results = [result for batch in batches for result in batch]
+    report_latency(results, (time.perf_counter() - started) * 1000)
+    return results
+
+# Function to execute orders from synchronous code, blocking until all are acked
+def execute_orders(orders, market_index, cancels=(), **kwargs):
+    with STAGE_SECONDS.time(stage='orders'):
+        return asyncio.run_coroutine_threadsafe(
+            execute_orders_async(orders, market_index, cancels, **kwargs), get_loop()).result()
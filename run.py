@@ -1,136 +1,151 @@
-import ccxt
-import pandas as pd
 import time
-from config import BINANCE_API_KEY, BINANCE_API_SECRET, symbols, time_interval
-
-# Create a Binance Futures client
-exchange = ccxt.binance({
-    'apiKey': BINANCE_API_KEY,
-    'secret': BINANCE_API_SECRET,
-    'enableRateLimit': True,
-    'options': {
-        'defaultType': 'future',  # Set the default type to futures
-    }
-})
+from config import symbols, time_interval, candle_cache_depth, stream_mode
+from async_fetcher import fetch_snapshot
+from exchange_factory import create_exchange
+from market_index import MarketIndex, start_market_index
+from order_executor import execute_orders
+from candle_cache import CandleCache
+from candle_store import CandleStore
+from ema_state import EMABook
+from kline_stream import run_kline_stream
+from scheduler import CandleScheduler
+from metrics import start_metrics
+from state_journal import open_journal
+from signals import evaluate_signals, confirmed_crossover_signals
+
+# Create a Binance Futures client, rate limited together with the other bot processes
+exchange = create_exchange()
 
 # Define EMA strategy parameters
 short_ema_period = 7
 long_ema_period = 99
 
+# Define minimum percentage condition
+min_percentage_condition = 0.2  # Adjust the threshold as needed
+
 # Track the last order type placed for each symbol
 last_order_types = {symbol: None for symbol in symbols}
 open_orders = {symbol: None for symbol in symbols}
 
-# Fixed quantity in USDT worth of contracts
-fixed_quantity_usdt = 11
+# Journal of the signals and orders as they are decided, replayed on restart so
+# signals already acted on before a crash are not ordered again
+journal = open_journal('run')
+last_order_types.update(journal.last_order_types)
+open_orders.update(journal.orders)
 
-# Function to fetch historical data for futures with EMA calculation
-def fetch_ohlcv(symbol, timeframe, limit):
-    ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
-    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+# Keep candle history in memory so each sweep only downloads new candles, and
+# persist closed candles so restarts resume from disk
+candle_cache = CandleCache(time_interval, candle_cache_depth, CandleStore())
 
-    # Calculate short and long EMAs
-    df['short_ema'] = calculate_ema(df, short_ema_period)
-    df['long_ema'] = calculate_ema(df, long_ema_period)
+# Short and long EMAs per symbol, updated incrementally as candles close
+ema_book = EMABook()
 
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    df.set_index('timestamp', inplace=True)
-    return df
+# Wake up right after each candle closes instead of sleeping a fixed time
+candle_scheduler = CandleScheduler(time_interval)
 
-# Function to calculate EMA
-def calculate_ema(df, period, column='close'):
-    return df[column].ewm(span=period, adjust=False).mean()
+# Lot size, tick size and minimum notional of every symbol, to round orders
+market_index = MarketIndex()
+
+# Fixed quantity in USDT worth of contracts
+fixed_quantity_usdt = 11
 
-# Function to place a market buy order
-def place_market_buy_order(symbol, quantity):
+# Function to evaluate the EMA rules for all symbols of a snapshot at once
+def evaluate_snapshot(snapshot):
+    return evaluate_signals(snapshot, ema_book, short_ema_period, long_ema_period, confirmed_crossover_signals, last_order_types, min_bars=long_ema_period)
+
+# Function to act on the signals of a snapshot
+def handle_signals(snapshot, signals):
+    orders = []
+    for symbol, signal in signals.items():
+        # Latest candlestick for each symbol from the snapshot
+        latest_candle = snapshot[symbol]['ticker']
+
+        if 'close' not in latest_candle:
+            print(f"Error: 'close' not found in the latest_candle for {symbol}")
+            continue
+
+        latest_close = latest_candle.get('close')
+
+        # Check if latest_close is None or not a valid number
+        if latest_close is None or not isinstance(latest_close, (int, float)):
+            print(f"Error: Invalid value for latest_close for {symbol}")
+            continue
+
+        # Calculate the quantity based on the fixed USDT value
+        quantity = fixed_quantity_usdt / float(latest_close)
+
+        #print(f"Symbol: {symbol}, Latest Close: {latest_close}, Quantity: {quantity}")
+
+        # Make trading decisions for each symbol
+        if signal == 'BUY':
+            print(f'{symbol} Buy Signal (Crossover)')
+            # Implement your buy logic here for futures
+            # For example, place a market buy order
+            orders.append({'symbol': symbol, 'side': 'BUY', 'type': 'market', 'quantity': quantity, 'price': float(latest_close)})
+
+        elif signal == 'SELL':
+            print(f'{symbol} Sell Signal (Crossunder)')
+            # Implement your sell logic here for futures
+            # For example, place a market sell order
+            orders.append({'symbol': symbol, 'side': 'SELL', 'type': 'market', 'quantity': quantity, 'price': float(latest_close)})
+
+    # Submit the orders of all symbols concurrently. Only acked orders are
+    # recorded, so a signal whose order was rejected is still open next sweep
+    if orders:
+        for result in execute_orders(orders, market_index):
+            if result['id'] is None:
+                continue
+            symbol = result['symbol']
+            last_order_types[symbol] = result['side']
+            journal.record_signal(symbol, result['side'])
+            open_orders[symbol] = result
+            journal.record_order(symbol, result)
+
+# Function to evaluate a symbol as soon as its kline stream reports a closed candle
+def on_closed_candle(symbol, candle):
     try:
-        order = exchange.create_market_buy_order(
-            symbol=symbol,
-            amount=quantity
-        )
-        print(f"Market Buy Order placed for {symbol}: {order}")
-        return order
+        snapshot = {symbol: {'ohlcv': candle_cache.merge_closed(symbol, candle), 'ticker': {'close': candle[4]}}}
+        handle_signals(snapshot, evaluate_snapshot(snapshot))
     except Exception as e:
-        print(f"Error placing Market Buy Order for {symbol}: {e}")
+        print(f'An error occurred: {e}')
 
-# Function to place a market sell order
-def place_market_sell_order(symbol, quantity):
+# Function to catch up on the candles that closed while the kline stream was
+# disconnected: the gap is fetched into the cache and evaluated like a sweep
+def catch_up(stream_symbols):
     try:
-        order = exchange.create_market_sell_order(
-            symbol=symbol,
-            amount=quantity
-        )
-        print(f"Market Sell Order placed for {symbol}: {order}")
-        return order
+        snapshot = fetch_snapshot(stream_symbols, time_interval, 300, cache=candle_cache)
+        handle_signals(snapshot, evaluate_snapshot(snapshot))
     except Exception as e:
-        print(f"Error placing Market Sell Order for {symbol}: {e}")
+        print(f'An error occurred: {e}')
 
 # Main trading function for futures
 def ema_strategy():
+    # Export latency, error and sweep duration metrics of this bot
+    start_metrics()
+
+    # Load the trading rules once and keep them fresh in the background
+    start_market_index(market_index, exchange)
+
+    if stream_mode:
+        # Load the candle history once, then follow the kline stream,
+        # catching up over REST on every (re)connection
+        fetch_snapshot(symbols, time_interval, 300, cache=candle_cache)
+        run_kline_stream(symbols, time_interval, on_closed_candle, on_connect=catch_up)
+        return
+
     while True:
         try:
-            for symbol in symbols:
-                # Fetch historical data for each symbol
-                historical_data = fetch_ohlcv(symbol, time_interval, 300)
-
-                # Check if there's enough data for EMA calculation
-                if len(historical_data) < long_ema_period:
-                    print(f"Not enough data for {symbol}. Waiting for more data...")
-                    continue
-
-                # Fetch the latest candlestick for each symbol
-                latest_candle = exchange.fetch_ticker(symbol)
-
-                if 'close' not in latest_candle:
-                    print(f"Error: 'close' not found in the latest_candle for {symbol}")
-                    continue
-
-                latest_close = latest_candle.get('close')
-
-                # Check if latest_close is None or not a valid number
-                if latest_close is None or not isinstance(latest_close, (int, float)):
-                    print(f"Error: Invalid value for latest_close for {symbol}")
-                    continue
-
-                # Calculate the quantity based on the fixed USDT value
-                quantity = fixed_quantity_usdt / float(latest_close)
-
-                #print(f"Symbol: {symbol}, Latest Close: {latest_close}, Quantity: {quantity}")
-                
-                # Define minimum percentage condition
-                min_percentage_condition = 0.2  # Adjust the threshold as needed
-
-                # Make trading decisions for each symbol
-                if (
-    (
-        (historical_data['short_ema'].iloc[-2] > historical_data['long_ema'].iloc[-2] and
-        historical_data['short_ema'].iloc[-3] <= historical_data['long_ema'].iloc[-3] and
-        historical_data['short_ema'].iloc[-4] <= historical_data['long_ema'].iloc[-4]) and 
-        last_order_types[symbol] != 'BUY'
-    )
-):
-                    print(f'{symbol} Buy Signal (Crossover)')
-                    # Implement your buy logic here for futures
-                    # For example, place a market buy order
-                    open_orders[symbol] = place_market_buy_order(symbol, quantity)
-                    last_order_types[symbol] = 'BUY'
-
-                elif (
-    (
-        (historical_data['long_ema'].iloc[-2] > historical_data['short_ema'].iloc[-2] and
-        historical_data['long_ema'].iloc[-3] <= historical_data['short_ema'].iloc[-3] and
-        historical_data['long_ema'].iloc[-4] <= historical_data['short_ema'].iloc[-4]) and
-        last_order_types[symbol] != 'SELL'
-    )
-):
-                    print(f'{symbol} Sell Signal (Crossunder)')
-                    # Implement your sell logic here for futures
-                    # For example, place a market sell order
-                    open_orders[symbol] = place_market_sell_order(symbol, quantity)
-                    last_order_types[symbol] = 'SELL'
-
-            # Sleep for some time (e.g., 5 minutes) before checking again
-            time.sleep(60)
+            # Fetch historical data and the latest ticker for all symbols concurrently
+            snapshot = fetch_snapshot(symbols, time_interval, 300, cache=candle_cache)
+
+            # Evaluate the EMA rules for all symbols at once and act on the signals
+            handle_signals(snapshot, evaluate_snapshot(snapshot))
+
+            # Report how long after the candle close the sweep finished
+            candle_scheduler.sweep_done()
+
+            # Wait until just after the next candle closes before checking again
+            candle_scheduler.wait()
 
         except Exception as e:
             print(f'An error occurred: {e}')
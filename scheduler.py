@@ -0,0 +1,69 @@
+import time
+from config import candle_close_delay, sweep_warning_ratio
+from metrics import SWEEP_SECONDS, SWEEP_CLOSE_LATENCY_SECONDS, SWEEP_INTERVAL_RATIO, SLOW_SWEEPS
+from ohlcv import timeframe_ms
+
+# Function to get the current time in milliseconds
+def now_ms():
+    return int(time.time() * 1000)
+
+# Function to get the open time of the candle that is currently forming. Binance
+# aligns candles from 1m up to 1d on the Unix epoch, so this is plain modular arithmetic
+def current_candle_open(timeframe, now=None):
+    now = now_ms() if now is None else now
+    duration = timeframe_ms(timeframe)
+    return now - now % duration
+
+# Function to get the time at which the currently forming candle closes
+def next_candle_close(timeframe, now=None):
+    return current_candle_open(timeframe, now) + timeframe_ms(timeframe)
+
+# Function to get how far the current time is from the nearest candle boundary
+def distance_to_candle_boundary(timeframe, now=None):
+    now = now_ms() if now is None else now
+    return min(now - current_candle_open(timeframe, now), next_candle_close(timeframe, now) - now)
+
+# Wakes the strategy loop shortly after each candle closes and reports how late
+# each wake-up and each sweep was relative to the close. Sweeps taking more
+# than warning_ratio of the candle interval are reported as slow
+class CandleScheduler:
+    def __init__(self, timeframe, delay=candle_close_delay, warning_ratio=sweep_warning_ratio):
+        self.timeframe = timeframe
+        self.delay_ms = int(delay * 1000)
+        self.warning_ratio = warning_ratio
+        self.candle_close = None
+        self.woke_at = None
+
+    # Function to sleep until the next candle close plus the configured delay
+    def wait(self):
+        candle_close = next_candle_close(self.timeframe)
+        target = candle_close + self.delay_ms
+        # Sleep in bounded steps so a system clock adjustment cannot make us oversleep
+        while True:
+            remaining = target - now_ms()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining / 1000, 60))
+
+        self.candle_close = candle_close
+        self.woke_at = now_ms()
+        print(f"Candle closed at {candle_close}, woke {self.woke_at - target} ms after target")
+        return self.woke_at - target
+
+    # Function to report how long after the candle close the sweep finished
+    def sweep_done(self):
+        if self.candle_close is None:
+            return None
+        now = now_ms()
+        latency = now - self.candle_close
+        duration = now - self.woke_at
+        print(f"Sweep finished {latency} ms after candle close ({duration} ms sweep)")
+
+        ratio = duration / timeframe_ms(self.timeframe)
+        SWEEP_SECONDS.observe(duration / 1000)
+        SWEEP_CLOSE_LATENCY_SECONDS.observe(latency / 1000)
+        SWEEP_INTERVAL_RATIO.set(ratio)
+        if ratio > self.warning_ratio:
+            SLOW_SWEEPS.inc()
+            print(f"Warning: the sweep took {ratio:.0%} of the {self.timeframe} candle interval")
+        return latency
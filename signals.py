@@ -0,0 +1,106 @@
+import numpy as np
+from metrics import STAGE_SECONDS
+from ohlcv import CLOSE, parse_ohlcv
+
+# Number of bars the crossover rules look at, the last one being the forming candle
+SIGNAL_BARS = 4
+
+# Function to assemble a (symbols x bars) matrix of the last closes per symbol
+# from their candle arrays, left-padded with NaN when a symbol has fewer candles
+def close_matrix(candles_by_symbol, symbols, bars):
+    matrix = np.full((len(symbols), bars), np.nan)
+    for row, symbol in enumerate(symbols):
+        candles = candles_by_symbol[symbol][-bars:]
+        if len(candles):
+            matrix[row, bars - len(candles):] = candles[:, CLOSE]
+    return matrix
+
+# Function to calculate EMAs for every row of a close matrix in one pass over
+# the bars. Same arithmetic as pandas ewm(span=period, adjust=False); seed is
+# the EMA before the first column (NaN to start from the first close)
+def ema_matrix(closes, period, seed=None):
+    com = (period - 1) / 2.0
+    alpha = 1. / (1. + com)
+    old_weight = 1. - alpha
+
+    emas = np.empty_like(closes)
+    value = np.full(closes.shape[0], np.nan) if seed is None else np.asarray(seed, dtype=float)
+    for column in range(closes.shape[1]):
+        close = closes[:, column]
+        updated = ((old_weight * value) + (alpha * close)) / (old_weight + alpha)
+        value = np.where(np.isnan(value), close, np.where(value != close, updated, value))
+        emas[:, column] = value
+    return emas
+
+# Signal rules. Each takes short/long EMA arrays whose last axis holds the last
+# SIGNAL_BARS bars (symbols x bars, or a sliding window over history) and
+# returns buy and sell masks
+
+# Short EMA above/below the long EMA on the forming candle (main.py, main1.py, main2.py, main3.py)
+def trend_signals(short_ema, long_ema):
+    buy = short_ema[..., -1] > long_ema[..., -1]
+    sell = short_ema[..., -1] < long_ema[..., -1]
+    return buy, sell
+
+# Crossover on the last closed candle after two candles on the other side (run.py, run_bot.py)
+def confirmed_crossover_signals(short_ema, long_ema):
+    buy = (
+        (short_ema[..., -2] > long_ema[..., -2]) &
+        (short_ema[..., -3] <= long_ema[..., -3]) &
+        (short_ema[..., -4] <= long_ema[..., -4])
+    )
+    sell = (
+        (long_ema[..., -2] > short_ema[..., -2]) &
+        (long_ema[..., -3] <= short_ema[..., -3]) &
+        (long_ema[..., -4] <= short_ema[..., -4])
+    )
+    return buy, sell
+
+# Recent crossover with a minimum percentage gap between the EMAs (2.py)
+def gap_crossover_signals(short_ema, long_ema, min_percentage_condition):
+    s1, s2, s3, s4 = (short_ema[..., -k] for k in range(1, 5))
+    l1, l2, l3, l4 = (long_ema[..., -k] for k in range(1, 5))
+    buy = (
+        (((s1 > l1) & (l2 <= s2) & (s3 <= l3)) |
+         ((s1 > l1) & (s2 >= l2) & (l3 <= s3) & (s4 <= l4))) &
+        ((s1 - l1) / s1 * 100 >= min_percentage_condition)
+    )
+    sell = (
+        (((l1 > s1) & (s2 <= l2) & (l3 <= s3)) |
+         ((l1 > s1) & (l2 >= s2) & (s3 <= l3) & (l4 <= s4))) &
+        ((l1 - s1) / l1 * 100 >= min_percentage_condition)
+    )
+    return buy, sell
+
+# Function to drop signals repeating the last order type for a symbol; a symbol
+# gets a sell only if it did not get a buy, like the if/elif in the strategies
+def select_signals(symbols, buy, sell, last_order_types):
+    last = np.array([last_order_types.get(symbol) for symbol in symbols], dtype=object)
+    buy = buy & (last != 'BUY')
+    sell = sell & ~buy & (last != 'SELL')
+    return {symbols[row]: ('BUY' if buy[row] else 'SELL') for row in np.flatnonzero(buy | sell)}
+
+# Function to evaluate a signal rule for every symbol in a snapshot at once,
+# returning {symbol: 'BUY' or 'SELL'} in snapshot order
+def evaluate_signals(snapshot, ema_book, short_ema_period, long_ema_period, rule, last_order_types,
+                     min_bars=1, **rule_params):
+    candles_by_symbol = {}
+    for symbol in snapshot:
+        ohlcv = parse_ohlcv(snapshot[symbol]['ohlcv'])
+        # Check if there's enough data for EMA calculation
+        if len(ohlcv) < max(min_bars, 1):
+            print(f"Not enough data for {symbol}. Waiting for more data...")
+            continue
+        candles_by_symbol[symbol] = ohlcv
+
+    symbols = list(candles_by_symbol)
+    if not symbols:
+        return {}
+
+    with STAGE_SECONDS.time(stage='ema'):
+        closes = close_matrix(candles_by_symbol, symbols, SIGNAL_BARS)
+        short_ema = ema_matrix(closes, short_ema_period, ema_book.seeds(symbols, short_ema_period, candles_by_symbol, SIGNAL_BARS))
+        long_ema = ema_matrix(closes, long_ema_period, ema_book.seeds(symbols, long_ema_period, candles_by_symbol, SIGNAL_BARS))
+    with STAGE_SECONDS.time(stage='signal_rule'):
+        buy, sell = rule(short_ema, long_ema, **rule_params)
+        return select_signals(symbols, buy, sell, last_order_types)
@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+from config import state_journal_path, state_journal_compact_every, state_journal_fsync
+
+# Fields of an order kept in the journal, from executor results and ccxt orders alike
+ORDER_FIELDS = ('id', 'side', 'type', 'quantity', 'price', 'filled', 'status')
+
+# Function to reduce an executor result or ccxt order to the journaled fields
+def order_record(order):
+    record = {field: order.get(field) for field in ORDER_FIELDS}
+    if record['quantity'] is None:
+        record['quantity'] = order.get('amount')
+    return record
+
+# Append-only journal of a strategy's decisions: the last signal per symbol
+# (last_order_types), the last order per symbol and, for the strategy host,
+# the strategy's position per symbol. Every entry is one JSON line written and
+# flushed before the strategy acts on it; every `compact_every` entries the
+# state is written as a snapshot and the journal starts over. On startup the
+# snapshot and the journal after it are replayed, so a restarted bot knows
+# which signals it already acted on and does not order them again. Entries
+# set values, so replaying one twice is harmless. A signal is journaled
+# before its order is sent: after a crash in between, the order is not
+# repeated (at most once)
+class StateJournal:
+    def __init__(self, name, path=state_journal_path, compact_every=state_journal_compact_every, fsync=state_journal_fsync):
+        self.name = name
+        self.snapshot_path = os.path.join(path, f"{name}.snapshot.json")
+        self.journal_path = os.path.join(path, f"{name}.journal.jsonl")
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.state = {'last_order_types': {}, 'orders': {}, 'positions': {}}
+        self.entries = 0
+        self.file = None
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def last_order_types(self):
+        return self.state['last_order_types']
+
+    @property
+    def orders(self):
+        return self.state['orders']
+
+    @property
+    def positions(self):
+        return self.state['positions']
+
+    # Function to apply one entry to the state
+    def apply(self, entry):
+        kind = entry['kind']
+        if kind == 'signal':
+            self.state['last_order_types'][entry['symbol']] = entry['signal']
+        elif kind == 'order':
+            if entry['order'] is not None:
+                self.state['orders'][entry['symbol']] = entry['order']
+            else:
+                self.state['orders'].pop(entry['symbol'], None)
+        elif kind == 'position':
+            if entry['amount']:
+                self.state['positions'][entry['symbol']] = entry['amount']
+            else:
+                self.state['positions'].pop(entry['symbol'], None)
+
+    # Function to replay the snapshot and the journal after it, then compact
+    # them into a new snapshot
+    def load(self):
+        started = time.perf_counter()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as file:
+                self.state.update(json.load(file))
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A crash can leave the last line half written
+                        print(f"Skipping a damaged entry of the {self.name} state journal")
+                        continue
+                    self.apply(entry)
+                    replayed += 1
+        self.compact()
+        print(f"Restored {self.name} state: {len(self.last_order_types)} signals, {len(self.orders)} orders, "
+              f"{len(self.positions)} positions ({replayed} journal entries) in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return self
+
+    # Function to write the state as a snapshot, replacing the old one
+    # atomically, and start an empty journal
+    def compact(self):
+        temporary = f"{self.snapshot_path}.tmp"
+        with open(temporary, 'w') as file:
+            json.dump(self.state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.snapshot_path)
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.journal_path, 'w')
+        self.entries = 0
+
+    # Function to apply an entry and append it to the journal
+    def record(self, entry):
+        with self.lock:
+            self.apply(entry)
+            if self.file is None:
+                self.file = open(self.journal_path, 'a')
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.entries += 1
+            if self.entries >= self.compact_every:
+                self.compact()
+
+    def record_signal(self, symbol, signal):
+        self.record({'kind': 'signal', 'symbol': symbol, 'signal': signal})
+
+    # Function to journal the last order of a symbol (an executor result or a ccxt order)
+    def record_order(self, symbol, order):
+        if order is not None:
+            self.record({'kind': 'order', 'symbol': symbol, 'order': order_record(order)})
+
+    # Function to journal that a symbol's position and orders were closed
+    def clear_order(self, symbol):
+        self.record({'kind': 'order', 'symbol': symbol, 'order': None})
+
+    def record_position(self, symbol, amount):
+        self.record({'kind': 'position', 'symbol': symbol, 'amount': amount})
+
+# Function to open and replay the journal of a strategy
+def open_journal(name):
+    return StateJournal(name).load()
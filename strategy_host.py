@@ -0,0 +1,278 @@
+import argparse
+import threading
+import time
+from config import symbols, time_interval, candle_cache_depth, stream_mode, host_strategies
+from async_fetcher import fetch_snapshot, get_tickers
+from exchange_factory import create_exchange
+from market_index import MarketIndex, start_market_index
+from account_state import AccountState
+from order_executor import execute_orders, flip_order
+from candle_cache import CandleCache
+from candle_store import CandleStore
+from ema_state import EMABook
+from kline_stream import run_kline_stream
+from scheduler import CandleScheduler, distance_to_candle_boundary
+from metrics import start_metrics
+from telegram_commands import start_telegram_commands
+from state_journal import open_journal
+from user_data_stream import start_user_data_stream
+from signals import evaluate_signals
+from backtest import STRATEGIES
+
+# One strategy configuration of the host: EMA periods, signal rule, order
+# type and sizing, with the parameter sets of the scripts (backtest.STRATEGIES).
+# Every strategy keeps its own last order types and its own share of the
+# account's positions, built from the fills of its orders, and journals them
+# so a restarted host resumes where it stopped. close_before_boundary_ms makes
+# the strategy close its positions and orders on sweeps that run that close to
+# the end of the interval, like main3.py
+class Strategy:
+    def __init__(self, name, short_ema_period, long_ema_period, rule, rule_params=None, order_type='market',
+                 position_mode='flip', fixed_quantity_usdt=100, limit_offset_percentage=0.1, close_before_boundary_ms=None):
+        self.name = name
+        self.short_ema_period = short_ema_period
+        self.long_ema_period = long_ema_period
+        self.rule = rule
+        self.rule_params = rule_params or {}
+        self.order_type = order_type
+        self.position_mode = position_mode
+        self.fixed_quantity_usdt = fixed_quantity_usdt
+        self.limit_offset_percentage = limit_offset_percentage
+        self.close_before_boundary_ms = close_before_boundary_ms
+        self.last_order_types = {symbol: None for symbol in symbols}
+        # Signals, last orders and positions, replayed on restart
+        self.journal = open_journal(f"host_{name}")
+        self.last_order_types.update(self.journal.last_order_types)
+        # Signed position amount per symbol filled by this strategy's orders
+        self.positions = dict(self.journal.positions)
+
+    def position(self, symbol):
+        position_amt = self.positions.get(symbol, 0.0)
+        return {'positionAmt': position_amt} if position_amt else None
+
+    # Function to check whether a sweep this far (ms) from the candle boundary
+    # closes the strategy's positions
+    def closes_at(self, time_to_boundary):
+        return (self.close_before_boundary_ms is not None and time_to_boundary is not None
+                and time_to_boundary <= self.close_before_boundary_ms)
+
+    # Function to evaluate the strategy's rule for all symbols of a snapshot
+    def evaluate(self, snapshot, ema_book):
+        return evaluate_signals(snapshot, ema_book, self.short_ema_period, self.long_ema_period, self.rule,
+                                self.last_order_types, min_bars=self.long_ema_period, **self.rule_params)
+
+    # Function to record a signal once it has been acted on
+    def record_signal(self, symbol, signal):
+        self.last_order_types[symbol] = signal
+        self.journal.record_signal(symbol, signal)
+
+    # Function to turn the signals into orders like the strategy's script:
+    # 'flip' takes this strategy's position to the other side with one order,
+    # 'stack' adds a fixed USDT order per signal. Limit orders are offset from
+    # the book and replace this strategy's previous limit orders. The signals
+    # of the orders are recorded by the host once the orders are acked.
+    # Positions and orders on close_symbols without a signal are closed; the
+    # close is a plain market order for this strategy's share, as a reduce-only
+    # one could be rejected when other strategies hold the opposite side
+    def orders(self, snapshot, signals, exchange, close_symbols=()):
+        orders = []
+        cancel_symbols = []
+        settled = []
+        for symbol, signal in signals.items():
+            latest_candle = snapshot[symbol]['ticker']
+            if latest_candle.get('close') is None:
+                print(f"[{self.name}] Error: 'close' not found in the latest_candle for {symbol}")
+                continue
+            latest_close = float(latest_candle['close'])
+            quantity = self.fixed_quantity_usdt / latest_close
+            print(f"[{self.name}] {symbol} {'Buy' if signal == 'BUY' else 'Sell'} Signal")
+
+            price = latest_close
+            if self.order_type == 'limit':
+                price = offset_limit_price(symbol, signal, self.limit_offset_percentage, exchange)
+                cancel_symbols.append(symbol)
+            if self.position_mode == 'flip':
+                order = flip_order(symbol, signal, quantity, self.position(symbol), self.order_type, price)
+            else:
+                order = {'symbol': symbol, 'side': signal, 'type': self.order_type, 'quantity': quantity, 'price': price}
+            if order is not None:
+                orders.append(dict(order, strategy=self.name, signal=signal))
+            else:
+                # The position is already on the side of the signal
+                settled.append(symbol)
+
+        for symbol in settled:
+            self.record_signal(symbol, signals[symbol])
+
+        for symbol in close_symbols:
+            if symbol in signals:
+                continue
+            cancel_symbols.append(symbol)
+            position_amt = self.positions.get(symbol, 0.0)
+            if position_amt:
+                print(f"[{self.name}] Closing open position for {symbol}")
+                order = {'symbol': symbol, 'side': 'SELL' if position_amt > 0 else 'BUY', 'type': 'market',
+                         'quantity': abs(position_amt), 'strategy': self.name, 'signal': None}
+                if snapshot[symbol]['ticker'].get('close') is not None:
+                    order['price'] = float(snapshot[symbol]['ticker']['close'])
+                orders.append(order)
+        return orders, cancel_symbols
+
+# Function to calculate a limit price with offset from the best ask (buy) or
+# bid (sell) of the shared ticker snapshot
+def offset_limit_price(symbol, side, offset_percentage, exchange):
+    ticker = get_tickers().get(symbol, exchange)
+    if side == 'BUY':
+        return float(ticker['ask']) * (1 - offset_percentage / 100)
+    return float(ticker['bid']) * (1 + offset_percentage / 100)
+
+# Runs several strategies in one process: candles and tickers are fetched and
+# cached once per sweep and fanned out to every strategy, EMAs with the same
+# period are shared through one EMABook, and the orders of all strategies go
+# out together through the order executor. Fills reported on the user-data
+# stream are attributed back to the strategy that placed the order
+class StrategyHost:
+    def __init__(self, strategies, exchange=None):
+        self.strategies = {strategy.name: strategy for strategy in strategies}
+        self.exchange = exchange or create_exchange()
+        self.market_index = MarketIndex()
+        self.account_state = AccountState()
+        self.account_state.listeners.append(self.on_user_data)
+        self.ema_book = EMABook()
+        self.candle_cache = CandleCache(time_interval, candle_cache_depth, CandleStore())
+        self.candle_scheduler = CandleScheduler(time_interval)
+        # The longest EMA needs the most history, within what the cache keeps
+        self.fetch_limit = min(candle_cache_depth, max(100, 3 * max(strategy.long_ema_period for strategy in strategies)))
+        # Order id -> strategy, and quantity filled per order id as reported by
+        # the stream; fills may arrive before the order's ack
+        self.order_owners = {}
+        self.filled = {}
+        self.attributed = {}
+        self.lock = threading.Lock()
+        # Orders placed before a restart keep their owner and attributed fills
+        for strategy in strategies:
+            for order in strategy.journal.orders.values():
+                if order.get('id') is not None:
+                    self.order_owners[order['id']] = strategy.name
+                    self.attributed[order['id']] = order.get('filled') or 0.0
+
+    # Function to record a user-data fill and attribute it to its strategy
+    def on_user_data(self, message):
+        if message.get('e') != 'ORDER_TRADE_UPDATE':
+            return
+        order = message['o']
+        with self.lock:
+            order_id = str(order['i'])
+            self.filled[order_id] = (order['s'], order['S'], max(float(order['z']), self.filled.get(order_id, (0, 0, 0.0))[2]))
+            self.attribute(order_id)
+
+    # Function to move the not yet attributed part of an order's fills into
+    # the position of the strategy that placed it (callers hold the lock)
+    def attribute(self, order_id):
+        strategy = self.strategies.get(self.order_owners.get(order_id))
+        if strategy is None or order_id not in self.filled:
+            return
+        symbol, side, filled = self.filled[order_id]
+        delta = filled - self.attributed.get(order_id, 0.0)
+        if delta > 0:
+            signed = delta if side == 'BUY' else -delta
+            position_amt = round(strategy.positions.get(symbol, 0.0) + signed, 8)
+            if position_amt:
+                strategy.positions[symbol] = position_amt
+            else:
+                strategy.positions.pop(symbol, None)
+            self.attributed[order_id] = filled
+            strategy.journal.record_position(symbol, position_amt)
+            last_order = strategy.journal.orders.get(symbol) or {}
+            strategy.journal.record_order(symbol, dict(last_order if last_order.get('id') == order_id else {}, id=order_id, side=side, filled=filled))
+
+    # Function to remember which strategy placed each acked order and record
+    # the signal it acted on. Rejected orders leave their signal open
+    def register(self, results):
+        with self.lock:
+            for result in results:
+                if result['id'] is not None:
+                    strategy = self.strategies[result['strategy']]
+                    if result['signal'] is not None:
+                        strategy.record_signal(result['symbol'], result['signal'])
+                    strategy.journal.record_order(result['symbol'], result)
+                    self.order_owners[result['id']] = result['strategy']
+                    self.attribute(result['id'])
+
+    # Function to list the (symbol, order id) of a strategy's orders still open
+    # on the symbols, leaving other strategies' and bots' orders alone
+    def open_order_ids(self, strategy, symbols):
+        with self.lock:
+            return [(symbol, order['id']) for symbol in symbols for order in self.account_state.orders(symbol)
+                    if self.order_owners.get(order['id']) == strategy.name]
+
+    # Function to evaluate every strategy on a snapshot and execute all their
+    # orders at once. time_to_boundary is how far (ms) the sweep runs from
+    # the end of the interval, for the strategies that close there
+    def handle_snapshot(self, snapshot, time_to_boundary=None):
+        orders = []
+        cancels = []
+        for strategy in self.strategies.values():
+            close_symbols = list(snapshot) if strategy.closes_at(time_to_boundary) else ()
+            strategy_orders, strategy_cancel_symbols = strategy.orders(
+                snapshot, strategy.evaluate(snapshot, self.ema_book), self.exchange, close_symbols)
+            orders.extend(strategy_orders)
+            cancels.extend(self.open_order_ids(strategy, strategy_cancel_symbols))
+        if orders or cancels:
+            self.register(execute_orders(orders, self.market_index, cancels))
+
+    # Function to evaluate a symbol as soon as its kline stream reports a closed candle
+    def on_closed_candle(self, symbol, candle):
+        try:
+            self.handle_snapshot({symbol: {'ohlcv': self.candle_cache.merge_closed(symbol, candle), 'ticker': {'close': candle[4]}}})
+        except Exception as e:
+            print(f'An error occurred: {e}')
+
+    # Function to catch up on the candles that closed while the kline stream
+    # was disconnected: the gap is fetched into the cache and evaluated like a sweep
+    def catch_up(self, stream_symbols):
+        try:
+            self.handle_snapshot(fetch_snapshot(stream_symbols, time_interval, self.fetch_limit, cache=self.candle_cache))
+        except Exception as e:
+            print(f'An error occurred: {e}')
+
+    # Main loop of the host, like ema_strategy in the scripts
+    def run(self):
+        start_metrics()
+        start_market_index(self.market_index, self.exchange)
+        start_user_data_stream(self.exchange, self.account_state)
+        self.account_state.ready.wait(30)
+        # Answer /positions, /signals, ... from this process's memory
+        start_telegram_commands(self.account_state, list(self.strategies.values()), self.ema_book)
+        print(f"Running strategies {', '.join(self.strategies)} on {len(symbols)} symbols")
+
+        if stream_mode:
+            fetch_snapshot(symbols, time_interval, self.fetch_limit, cache=self.candle_cache)
+            run_kline_stream(symbols, time_interval, self.on_closed_candle, on_connect=self.catch_up)
+            return
+
+        while True:
+            try:
+                # One fetch for all strategies
+                snapshot = fetch_snapshot(symbols, time_interval, self.fetch_limit, cache=self.candle_cache)
+                self.handle_snapshot(snapshot, distance_to_candle_boundary(time_interval))
+                self.candle_scheduler.sweep_done()
+                self.candle_scheduler.wait()
+            except Exception as e:
+                print(f'An error occurred: {e}')
+                time.sleep(60)
+
+# How close to the end of the interval (ms) the scripts close their positions
+# and orders, for those that do
+INTERVAL_END_CLOSES = {'main3': 5 * 60 * 1000}
+
+# Function to build the strategies of the host from their names
+def load_strategies(names):
+    return [Strategy(name, close_before_boundary_ms=INTERVAL_END_CLOSES.get(name), **STRATEGIES[name]) for name in names]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run several EMA strategies in one process on shared market data')
+    parser.add_argument('--strategies', default=','.join(host_strategies),
+                        help=f"Comma separated, from {', '.join(sorted(STRATEGIES))}")
+    args = parser.parse_args()
+    StrategyHost(load_strategies(args.strategies.split(','))).run()
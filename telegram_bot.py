@@ -1,64 +1,161 @@
-import os
-from binance.client import Client
-from telegram import Bot
-from telegram.ext import Updater, CommandHandler
-import schedule
+import asyncio
+import threading
 import time
-from config import BINANCE_API_KEY, BINANCE_API_SECRET, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, SYMBOLS
+from telegram.ext import Application, CommandHandler
+from exchange_factory import create_exchange
+from account_state import AccountState, order_entry
+from user_data_stream import start_user_data_stream
+from metrics import start_metrics, TELEGRAM_SEND_SECONDS, TELEGRAM_ERRORS
+from notifier import notify, flush, split_messages
+from config import TELEGRAM_BOT_TOKEN, order_report_interval, order_poll_interval
 
-# Binance API configuration
-binance_client = Client(api_key=BINANCE_API_KEY, api_secret=BINANCE_API_SECRET)
+# Binance Futures client, rate limited together with the trading bots,
+# created on first use
+_exchange = None
 
-# Telegram API configuration
-telegram_bot = Bot(token=TELEGRAM_BOT_TOKEN)
+def get_exchange():
+    global _exchange
+    if _exchange is None:
+        _exchange = create_exchange()
+    return _exchange
 
-# Variable to store the last sent message
-last_sent_message = ""
+# Open orders of the account, kept current by the user-data stream
+account_state = AccountState()
 
-# Function to get open futures orders from Binance
-def get_open_orders(context):
-    global last_sent_message
+# How a closed order is reported, by its final Binance status
+CLOSED_LABELS = {'FILLED': 'Filled', 'CANCELED': 'Cancelled', 'EXPIRED': 'Expired', 'REJECTED': 'Rejected'}
+
+# Function to describe an open order in one line
+def describe_order(order):
+    filled = f"{order['filled']:g}/" if order['filled'] else ''
+    return f"{order['symbol']}: {order['side'].upper()} {order['type'].upper()} {filled}{order['amount']:g} @ {order['price']:g}"
+
+# Function to get the open orders from REST, keyed by order id
+def fetch_open_orders():
+    return {
+        str(order['orderId']): order_entry(
+            order['orderId'], order['symbol'], order['side'], order['type'], float(order['price']),
+            float(order['origQty']), float(order['executedQty']), order['status'], order['reduceOnly'])
+        for order in get_exchange().fapiPrivateGetOpenOrders()
+    }
+
+# Function to look up the final status of an order that is no longer open
+def fetch_order_status(order):
     try:
-        open_orders = binance_client.futures_get_open_orders()
-        if open_orders:
-            orders_text = "\n".join([f"{order['symbol']}: {order['side']} {order['type']} {order['origQty']} @ {order['price']}" for order in open_orders])
-            new_message = f"Open Futures Orders:\n{orders_text}"
-
-            # Check if the message has changed before sending
-            if new_message != last_sent_message:
-                telegram_bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=new_message)
-                last_sent_message = new_message
-        else:
-            new_message = "No open orders."
-
-            # Check if the message has changed before sending
-            if new_message != last_sent_message:
-                telegram_bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=new_message)
-                last_sent_message = new_message
+        return get_exchange().fapiPrivateGetOrder({'symbol': order['symbol'], 'orderId': order['id']})['status']
     except Exception as e:
-        telegram_bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=f"Error: {str(e)}")
+        print(f"Error fetching order {order['id']} for {order['symbol']}: {e}")
+        return None
+
+# Keyed map of the open orders last reported to the chat. Each check compares
+# the current open orders with it and only reports what changed: new orders,
+# fills and orders that closed. While the user-data stream is connected the
+# current orders come from AccountState in memory and the final status of
+# closed orders from the stream's events, so checks cost no API weight;
+# otherwise the open orders are polled from REST every `poll_interval` seconds
+class OpenOrderReporter:
+    def __init__(self, state, poll_interval=order_poll_interval):
+        self.state = state
+        self.poll_interval = poll_interval
+        self.orders = None  # {order id: order entry}, None until the first check
+        self.statuses = {}  # Final status of orders closed on the stream, by order id
+        self.polled_at = None
+        self.lock = threading.Lock()
+
+    # Function to record the final status of orders as the stream reports them
+    def on_user_data(self, message):
+        if message.get('e') == 'ORDER_TRADE_UPDATE' and message['o']['X'] in CLOSED_LABELS:
+            with self.lock:
+                self.statuses[str(message['o']['i'])] = message['o']['X']
+
+    # Function to get the current open orders, None when it is not time to poll yet
+    def current_orders(self):
+        if self.state.connected.is_set():
+            if not self.state.ready.is_set():
+                return None  # Not reconciled yet
+            with self.state.lock:
+                return {order_id: dict(order) for orders in self.state.open_orders.values() for order_id, order in orders.items()}
+        if self.polled_at is not None and time.monotonic() - self.polled_at < self.poll_interval:
+            return None
+        self.polled_at = time.monotonic()
+        return fetch_open_orders()
 
-# Function to schedule the job
-def schedule_job():
-    job = schedule.every(1).minutes
-    job.do(get_open_orders, context=None)
+    # Function to compare the current open orders with the reported ones,
+    # returning one line per change
+    def changes(self, current):
+        with self.lock:
+            statuses = dict(self.statuses)
+        lines = []
+        for order_id, order in self.orders.items():
+            if order_id not in current:
+                status = statuses.get(order_id) or fetch_order_status(order)
+                lines.append(f"{CLOSED_LABELS.get(status, 'Closed')}: {describe_order(order)}")
+            elif current[order_id]['filled'] > order['filled']:
+                lines.append(f"Partially filled: {describe_order(current[order_id])}")
+        for order_id, order in current.items():
+            if order_id not in self.orders:
+                lines.append(f"New: {describe_order(order)}")
+        with self.lock:
+            # Only statuses of orders still to be reported are needed later
+            self.statuses = {order_id: status for order_id, status in self.statuses.items() if order_id in current}
+        return lines
+
+    # Function to report the changes since the last check to the chat
+    def check(self):
+        try:
+            current = self.current_orders()
+            if current is None:
+                return
+            if self.orders is None:
+                # First check: the full list, like /get_open_orders
+                lines = self.summary(current)
+            else:
+                lines = self.changes(current)
+            self.orders = current
+            for line in lines:
+                notify(line)
+            flush()
+        except Exception as e:
+            notify(f"Error: {str(e)}")
+
+    # Function to list the given (by default the reported) open orders
+    def summary(self, orders=None):
+        orders = self.orders if orders is None else orders
+        if not orders:
+            return ["No open orders."]
+        return ["Open Futures Orders:"] + [describe_order(order) for order in orders.values()]
+
+reporter = OpenOrderReporter(account_state)
+
+# Job to report open order changes, run by the job queue every order_report_interval seconds
+async def report_open_orders(context):
+    await asyncio.get_running_loop().run_in_executor(None, reporter.check)
+
+# Command to list the open orders as last reported, without any API request
+async def get_open_orders(update, context):
+    for text in split_messages(reporter.summary() if reporter.orders is not None else ["Open orders are still loading."]):
+        try:
+            with TELEGRAM_SEND_SECONDS.time():
+                await update.message.reply_text(text)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc()
+            print(f"Error sending Telegram message: {e}")
 
 # Function to start the bot
 def start_bot():
-    updater = Updater(TELEGRAM_BOT_TOKEN)
-    dp = updater.dispatcher
-
-    dp.add_handler(CommandHandler("get_open_orders", get_open_orders))
+    # Export the Telegram latency and error metrics
+    start_metrics()
 
-    updater.start_polling()
+    # Follow the account's orders on the user-data stream
+    account_state.listeners.append(reporter.on_user_data)
+    start_user_data_stream(get_exchange(), account_state)
 
-    # Schedule the job
-    schedule_job()
+    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application.add_handler(CommandHandler("get_open_orders", get_open_orders))
+    application.job_queue.run_repeating(report_open_orders, interval=order_report_interval, first=1)
 
     # Keep the program running
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    application.run_polling()
 
 if __name__ == '__main__':
     start_bot()
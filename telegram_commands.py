@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+from config import telegram_commands_token, TELEGRAM_CHAT_ID
+from metrics import (SWEEP_SECONDS, SWEEP_CLOSE_LATENCY_SECONDS, SWEEP_INTERVAL_RATIO, STAGE_SECONDS,
+                     EXCHANGE_REQUEST_SECONDS, TELEGRAM_SEND_SECONDS, TELEGRAM_ERRORS)
+from notifier import split_messages
+
+# Function to format a duration in seconds as milliseconds
+def format_ms(seconds):
+    return '-' if seconds is None else f"{seconds * 1000:.0f} ms"
+
+# Function to list the account's open positions
+def position_lines(account_state):
+    positions = sorted(dict(account_state.positions).values(), key=lambda position: position['symbol'])
+    if not positions:
+        return ["No open positions."]
+    return ["Positions:"] + [
+        f"{position['symbol']}: {position['side'].upper()} {position['contracts']:g} @ {position['entryPrice']:g} "
+        f"(PnL {position['unrealizedPnl']:+.2f} USDT)"
+        for position in positions
+    ]
+
+# Function to list the unrealized PnL of the account, largest first
+def pnl_lines(account_state):
+    positions = sorted(dict(account_state.positions).values(), key=lambda position: -abs(position['unrealizedPnl']))
+    total = sum(position['unrealizedPnl'] for position in positions)
+    return [f"Unrealized PnL: {total:+.2f} USDT over {len(positions)} positions"] + [
+        f"{position['symbol']}: {position['unrealizedPnl']:+.2f}" for position in positions
+    ]
+
+# Function to list the last signal per symbol of each strategy, optionally of some symbols only
+def signal_lines(strategies, symbols=None):
+    lines = []
+    for strategy in strategies:
+        last_order_types = dict(strategy.last_order_types)
+        for signal in ('BUY', 'SELL'):
+            signal_symbols = sorted(symbol for symbol, order_type in last_order_types.items()
+                                    if order_type == signal and (not symbols or symbol in symbols))
+            lines.append(f"[{strategy.name}] {signal} ({len(signal_symbols)}): {', '.join(signal_symbols) or '-'}")
+    return lines
+
+# Function to list the spread between the short and long EMA (at the last
+# closed candle) per symbol of each strategy, widest first
+def spread_lines(strategies, ema_book, symbols=None):
+    states = dict(ema_book.states)
+    lines = []
+    for strategy in strategies:
+        spreads = []
+        for symbol in strategy.last_order_types:
+            if symbols and symbol not in symbols:
+                continue
+            short_state = states.get((symbol, strategy.short_ema_period))
+            long_state = states.get((symbol, strategy.long_ema_period))
+            if short_state is None or long_state is None or not short_state.value or not long_state.value:
+                continue
+            spreads.append((symbol, (short_state.value - long_state.value) / long_state.value * 100))
+        spreads.sort(key=lambda spread: -abs(spread[1]))
+        lines.append(f"[{strategy.name}] EMA {strategy.short_ema_period}/{strategy.long_ema_period} spread:")
+        lines.extend(f"{symbol}: {spread:+.3f}%" for symbol, spread in spreads)
+    return lines
+
+# Function to summarize sweep timings and order latencies from the metrics
+def latency_lines():
+    count, mean = SWEEP_SECONDS.mean()
+    ratio = SWEEP_INTERVAL_RATIO.get()
+    lines = [
+        f"Sweeps: {count}, mean {format_ms(mean)}, p95 {format_ms(SWEEP_SECONDS.quantile(0.95))}"
+        + (f", last {ratio:.1%} of the interval" if ratio is not None else ''),
+        f"After candle close: median {format_ms(SWEEP_CLOSE_LATENCY_SECONDS.quantile(0.5))}, "
+        f"p95 {format_ms(SWEEP_CLOSE_LATENCY_SECONDS.quantile(0.95))}",
+    ]
+    for stage in ('fetch', 'ema', 'signal_rule', 'orders'):
+        count, mean = STAGE_SECONDS.mean(stage=stage)
+        if count:
+            lines.append(f"Stage {stage}: mean {format_ms(mean)}, p95 {format_ms(STAGE_SECONDS.quantile(0.95, stage=stage))}")
+    for endpoint in ('order', 'batch_orders', 'cancel_order', 'cancel_batch_orders'):
+        count, mean = EXCHANGE_REQUEST_SECONDS.mean(endpoint=endpoint)
+        if count:
+            lines.append(f"Order ack ({endpoint}, {count}): median {format_ms(EXCHANGE_REQUEST_SECONDS.quantile(0.5, endpoint=endpoint))}, "
+                         f"p95 {format_ms(EXCHANGE_REQUEST_SECONDS.quantile(0.95, endpoint=endpoint))}")
+    return lines
+
+# Read-only Telegram commands answered from the memory of a trading process:
+# positions and PnL from its AccountState, last signals from the strategies'
+# last_order_types, EMA spreads from its EMABook and timings from the metrics.
+# No command makes an exchange request. The bot runs on its own event loop in
+# a daemon thread, so queries never wait for or hold up the trading loop
+class TelegramCommands:
+    def __init__(self, account_state, strategies, ema_book):
+        self.account_state = account_state
+        self.strategies = strategies
+        self.ema_book = ema_book
+
+    async def reply(self, update, lines, started):
+        for text in split_messages(lines):
+            try:
+                with TELEGRAM_SEND_SECONDS.time():
+                    await update.message.reply_text(text)
+            except Exception as e:
+                TELEGRAM_ERRORS.inc()
+                print(f"Error sending Telegram message: {e}")
+        print(f"Answered {update.message.text.split()[0]} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    async def positions(self, update, context):
+        await self.reply(update, position_lines(self.account_state), time.perf_counter())
+
+    async def pnl(self, update, context):
+        await self.reply(update, pnl_lines(self.account_state), time.perf_counter())
+
+    async def signals(self, update, context):
+        symbols = {symbol.upper() for symbol in context.args}
+        await self.reply(update, signal_lines(self.strategies, symbols), time.perf_counter())
+
+    async def spread(self, update, context):
+        symbols = {symbol.upper() for symbol in context.args}
+        await self.reply(update, spread_lines(self.strategies, self.ema_book, symbols), time.perf_counter())
+
+    async def latency(self, update, context):
+        await self.reply(update, latency_lines(), time.perf_counter())
+
+    # Function to poll Telegram for commands until the process exits
+    async def serve(self, token, chat_id):
+        from telegram.ext import Application, CommandHandler, filters
+
+        # Only answer in the configured chat
+        chat_filter = filters.Chat(chat_id=int(chat_id)) if chat_id else None
+        application = Application.builder().token(token).build()
+        for command in ('positions', 'pnl', 'signals', 'spread', 'latency'):
+            application.add_handler(CommandHandler(command, getattr(self, command), filters=chat_filter))
+        async with application:
+            await application.start()
+            await application.updater.start_polling()
+            print("Answering Telegram commands /positions, /pnl, /signals, /spread and /latency")
+            await asyncio.Event().wait()
+
+# Function to answer the Telegram commands of a trading process in a
+# background thread. `strategies` have a name, last_order_types and EMA
+# periods; nothing is started without a commands bot token
+def start_telegram_commands(account_state, strategies, ema_book, token=telegram_commands_token, chat_id=TELEGRAM_CHAT_ID):
+    if not token:
+        return None
+    commands = TelegramCommands(account_state, strategies, ema_book)
+
+    def serve():
+        try:
+            asyncio.new_event_loop().run_until_complete(commands.serve(token, chat_id))
+        except Exception as e:
+            print(f"Error answering Telegram commands: {e}")
+    threading.Thread(target=serve, name='telegram-commands', daemon=True).start()
+    return commands
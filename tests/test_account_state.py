@@ -0,0 +1,139 @@
+import pytest
+from account_state import AccountState
+from mock_exchange import MockVenue, MockExchange
+from user_data_stream import order_update_message, account_update_message
+
+SYMBOLS = ['BTCUSDT', 'ETHUSDT']
+
+
+@pytest.fixture
+def venue():
+    return MockVenue(SYMBOLS, '1m', seed=7, history_days=1)
+
+
+@pytest.fixture
+def exchange(venue):
+    return MockExchange(venue, latency=0)
+
+
+def test_order_updates_track_open_orders_until_they_close():
+    state = AccountState()
+    state.handle_message(order_update_message('BTCUSDT', 1, 'BUY', 'LIMIT', 'NEW', 100.0, 2.0, event_time=1))
+    state.handle_message(order_update_message('BTCUSDT', 2, 'SELL', 'LIMIT', 'NEW', 120.0, 1.0, event_time=2))
+    state.handle_message(order_update_message('BTCUSDT', 1, 'BUY', 'LIMIT', 'PARTIALLY_FILLED', 100.0, 2.0, 0.5, event_time=3))
+    orders = {order['id']: order for order in state.orders('BTCUSDT')}
+    assert set(orders) == {'1', '2'}
+    assert orders['1']['filled'] == 0.5
+    assert orders['1']['side'] == 'buy' and orders['1']['type'] == 'limit'
+
+    state.handle_message(order_update_message('BTCUSDT', 1, 'BUY', 'LIMIT', 'FILLED', 100.0, 2.0, 2.0, event_time=4))
+    state.handle_message(order_update_message('BTCUSDT', 2, 'SELL', 'LIMIT', 'CANCELED', 120.0, 1.0, event_time=5))
+    assert state.orders('BTCUSDT') == []
+    assert 'BTCUSDT' not in state.open_orders
+
+
+def test_account_updates_open_flip_and_close_positions():
+    state = AccountState()
+    state.handle_message(account_update_message('ETHUSDT', 0.5, 2000.0, event_time=1))
+    assert state.position('ETHUSDT')['side'] == 'long'
+    assert state.last_order_type('ETHUSDT') == 'BUY'
+
+    state.handle_message(account_update_message('ETHUSDT', -0.25, 2100.0, 1.5, event_time=2))
+    position = state.position('ETHUSDT')
+    assert (position['side'], position['contracts'], position['positionAmt']) == ('short', 0.25, -0.25)
+    assert position['entryPrice'] == 2100.0 and position['unrealizedPnl'] == 1.5
+    assert state.last_order_type('ETHUSDT') == 'SELL'
+
+    state.handle_message(account_update_message('ETHUSDT', 0, 0.0, event_time=3))
+    assert state.position('ETHUSDT') is None
+    assert state.last_order_type('ETHUSDT') is None
+
+
+def test_hedge_mode_positions_are_ignored():
+    state = AccountState()
+    message = account_update_message('BTCUSDT', 1.0, 100.0)
+    message['a']['P'][0]['ps'] = 'LONG'
+    state.handle_message(message)
+    assert state.position('BTCUSDT') is None
+
+
+def test_listeners_see_every_message_after_it_is_applied():
+    state = AccountState()
+    seen = []
+    state.listeners.append(lambda message: seen.append((message['e'], state.position('BTCUSDT'))))
+    state.handle_message(account_update_message('BTCUSDT', 1.0, 100.0))
+    assert seen[0][0] == 'ACCOUNT_UPDATE' and seen[0][1]['positionAmt'] == 1.0
+
+
+def test_stream_updates_match_a_reconciliation(venue, exchange):
+    streamed = AccountState()
+    exchange.subscribe_user_data(streamed.handle_message)
+    exchange.fapiPrivatePostOrder({'symbol': 'BTCUSDT', 'side': 'BUY', 'type': 'MARKET', 'quantity': '0.01'})
+    exchange.fapiPrivatePostOrder({'symbol': 'ETHUSDT', 'side': 'SELL', 'type': 'MARKET', 'quantity': '0.2'})
+    bid, ask = venue.book('ETHUSDT')
+    exchange.fapiPrivatePostOrder({'symbol': 'ETHUSDT', 'side': 'BUY', 'type': 'LIMIT', 'quantity': '0.1',
+                                   'price': f"{bid * 0.5:.2f}", 'timeInForce': 'GTC'})
+
+    reconciled = AccountState()
+    reconciled.reconcile(exchange)
+    assert reconciled.ready.is_set()
+    for symbol in SYMBOLS:
+        assert streamed.position(symbol)['positionAmt'] == reconciled.position(symbol)['positionAmt']
+        assert [order['id'] for order in streamed.orders(symbol)] == [order['id'] for order in reconciled.orders(symbol)]
+    assert reconciled.position('ETHUSDT')['side'] == 'short'
+    assert len(reconciled.orders('ETHUSDT')) == 1
+
+
+def test_reconciliation_replaces_stale_state(exchange):
+    state = AccountState()
+    state.handle_message(account_update_message('BTCUSDT', 3.0, 100.0, event_time=0))
+    state.handle_message(order_update_message('ETHUSDT', 999, 'BUY', 'LIMIT', 'NEW', 1.0, 1.0, event_time=0))
+    state.reconcile(exchange)
+    assert state.position('BTCUSDT') is None
+    assert state.orders('ETHUSDT') == []
+
+
+def test_reconciliation_keeps_symbols_streamed_after_it_started(exchange):
+    state = AccountState()
+    # An update newer than the start of the reconciliation's requests
+    state.handle_message(account_update_message('BTCUSDT', 3.0, 100.0, event_time=exchange.milliseconds() + 60000))
+    state.reconcile(exchange)
+    assert state.position('BTCUSDT')['positionAmt'] == 3.0
+
+
+def test_stream_follows_the_fake_user_data_server_and_reconnects(exchange):
+    import asyncio
+    from user_data_stream import FakeUserDataServer, follow_user_data
+
+    # Function to wait until a condition holds, polling the event loop
+    async def wait_for(condition, timeout=5):
+        for _ in range(int(timeout / 0.01)):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError('condition not met in time')
+
+    async def run():
+        state = AccountState()
+        server = FakeUserDataServer()
+        url = await server.start()
+        follower = asyncio.ensure_future(follow_user_data(exchange, state, url, reconnect_delay=0.05))
+        try:
+            await wait_for(lambda: server.clients and state.ready.is_set())
+            await server.publish(account_update_message('BTCUSDT', 2.0, 100.0, event_time=exchange.milliseconds() + 60000))
+            await wait_for(lambda: state.position('BTCUSDT') is not None)
+            assert state.position('BTCUSDT')['positionAmt'] == 2.0
+
+            # Dropping the connection clears `connected` until the stream is back
+            for ws in list(server.clients):
+                await ws.close()
+            await wait_for(lambda: not state.connected.is_set())
+            await wait_for(lambda: server.clients and state.connected.is_set())
+            await server.publish(order_update_message('BTCUSDT', 5, 'SELL', 'LIMIT', 'NEW', 150.0, 1.0,
+                                                      event_time=exchange.milliseconds() + 60000))
+            await wait_for(lambda: state.orders('BTCUSDT'))
+        finally:
+            follower.cancel()
+            await server.stop()
+
+    asyncio.new_event_loop().run_until_complete(run())
@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+from candle_cache import CandleRing, CandleCache
+from candle_store import CandleStore
+from ohlcv import TIMESTAMP, CLOSE
+
+MINUTE = 60000
+
+# Function to build n one-minute candles starting at `start` (ms), close = index
+def candles(start, n, first_close=0):
+    rows = np.zeros((n, 6))
+    rows[:, TIMESTAMP] = start + np.arange(n) * MINUTE
+    rows[:, 1:5] = (first_close + np.arange(n))[:, None]
+    return rows
+
+
+def test_ring_wraps_around_and_keeps_the_newest_candles_contiguous():
+    ring = CandleRing(5)
+    for row in candles(0, 12):
+        ring.write(row[None, :])
+    view = ring.view()
+    assert len(ring) == 5
+    assert view[:, CLOSE].tolist() == [7, 8, 9, 10, 11]
+    # A view is one slice of the buffer, not a copy
+    assert np.shares_memory(view, ring.buffer)
+    assert view.flags.c_contiguous
+    assert not view.flags.writeable
+    assert ring.view(2)[:, CLOSE].tolist() == [10, 11]
+
+
+def test_ring_bulk_write_longer_than_depth_keeps_the_tail():
+    ring = CandleRing(4)
+    ring.write(candles(0, 3))
+    ring.write(candles(3 * MINUTE, 7, first_close=3))
+    assert ring.view()[:, CLOSE].tolist() == [6, 7, 8, 9]
+    assert ring.last_timestamp() == 9 * MINUTE
+
+
+def test_ring_merge_overwrites_the_forming_candle_and_later_ones():
+    ring = CandleRing(6)
+    ring.merge(candles(0, 5))
+    forming = candles(4 * MINUTE, 1, first_close=40)
+    ring.merge(forming)
+    assert ring.view()[:, CLOSE].tolist() == [0, 1, 2, 3, 40]
+    # Candles from an earlier timestamp on are replaced
+    ring.merge(candles(2 * MINUTE, 2, first_close=20))
+    assert ring.view()[:, CLOSE].tolist() == [0, 1, 20, 21]
+    assert len(ring) == 4
+
+
+def test_ring_merge_across_the_wrap_point():
+    ring = CandleRing(4)
+    ring.merge(candles(0, 6))
+    ring.merge(candles(5 * MINUTE, 3, first_close=50))
+    assert ring.view()[:, TIMESTAMP].tolist() == [4 * MINUTE, 5 * MINUTE, 6 * MINUTE, 7 * MINUTE]
+    assert ring.view()[:, CLOSE].tolist() == [4, 50, 51, 52]
+
+
+def test_merge_persists_all_but_the_forming_candle(tmp_path):
+    cache = CandleCache('1m', 10, CandleStore(str(tmp_path)))
+    cache.merge('BTCUSDT', candles(0, 3))
+    stored = CandleStore(str(tmp_path)).read_ohlcv('BTCUSDT', '1m')
+    assert stored[:, TIMESTAMP].tolist() == [0, MINUTE]
+
+
+def test_merge_of_a_closed_stream_candle_is_persisted(tmp_path):
+    cache = CandleCache('1m', 10, CandleStore(str(tmp_path)))
+    cache.merge('BTCUSDT', candles(0, 3))
+    cache.merge('BTCUSDT', candles(2 * MINUTE, 1, first_close=7), closed=True)
+    stored = CandleStore(str(tmp_path)).read_ohlcv('BTCUSDT', '1m')
+    assert stored[:, TIMESTAMP].tolist() == [0, MINUTE, 2 * MINUTE]
+    assert stored[-1, CLOSE] == 7
+
+
+def test_stores_sharing_a_directory_do_not_duplicate_candles(tmp_path):
+    first, second = CandleStore(str(tmp_path)), CandleStore(str(tmp_path))
+    assert first.append('BTCUSDT', '1m', candles(0, 2)) == 2
+    assert second.append('BTCUSDT', '1m', candles(0, 2)) == 0
+    assert first.append('BTCUSDT', '1m', candles(0, 3)) == 1
+    stored = second.read_ohlcv('BTCUSDT', '1m')
+    assert stored[:, TIMESTAMP].tolist() == [0, MINUTE, 2 * MINUTE]
+
+
+def test_read_drops_repeated_candles_of_an_unlocked_store(tmp_path):
+    store = CandleStore(str(tmp_path))
+    store.write('BTCUSDT', '1m', candles(0, 2))
+    store.write('BTCUSDT', '1m', candles(MINUTE, 2, first_close=5))
+    stored = store.read_ohlcv('BTCUSDT', '1m')
+    assert stored[:, TIMESTAMP].tolist() == [0, MINUTE, 2 * MINUTE]
+    assert stored[:, CLOSE].tolist() == [0, 5, 6]
+
+
+def test_request_window_asks_for_the_whole_gap_within_the_depth():
+    cache = CandleCache('1m', 3000, None)
+    cache.merge('BTCUSDT', candles(0, 10))
+    last = 9 * MINUTE
+    since, limit = cache.request_window('BTCUSDT', 100, now_ms=last + 2000 * MINUTE + 5)
+    assert since == last
+    assert limit == 2001
+    assert len(cache.get('BTCUSDT')) == 10
+
+
+def test_request_window_starts_over_when_the_gap_exceeds_the_depth():
+    cache = CandleCache('1m', 500, None)
+    cache.merge('BTCUSDT', candles(0, 10))
+    since, limit = cache.request_window('BTCUSDT', 100, now_ms=9 * MINUTE + 600 * MINUTE)
+    assert (since, limit) == (None, 100)
+    assert len(cache.get('BTCUSDT')) == 0
+
+
+@pytest.mark.parametrize('gap', [5, 1499, 1500, 3200])
+def test_fetch_pages_through_long_gaps(tmp_path, gap):
+    import asyncio
+    import async_fetcher
+
+    now = 10 ** 6 * MINUTE
+    requests = []
+
+    class Exchange:
+        async def load_markets(self):
+            pass
+
+        async def fapiPublicGetKlines(self, params):
+            requests.append(params)
+            limit = min(params['limit'], 1500)
+            first = params.get('startTime', now - (limit - 1) * MINUTE)
+            first = -(-first // MINUTE) * MINUTE
+            return [[t, '1', '1', '1', '1', '1'] for t in range(first, min(first + limit * MINUTE, now + MINUTE), MINUTE)]
+
+    class Tickers:
+        def is_fresh(self):
+            return True
+
+        def get(self, symbol):
+            return {}
+
+    cache = CandleCache('1m', 5000, CandleStore(str(tmp_path)))
+    cache.merge('BTCUSDT', candles(now - (gap + 50) * MINUTE, 51))
+    cache.request_window = lambda symbol, limit, request_window=cache.request_window: request_window(symbol, limit, now_ms=now)
+    snapshot = asyncio.new_event_loop().run_until_complete(async_fetcher.fetch_snapshot_async(
+        ['BTCUSDT'], '1m', 100, cache=cache, tickers=Tickers(), exchange=Exchange(), weight_budget=10 ** 9))
+
+    history = snapshot['BTCUSDT']['ohlcv']
+    assert len(requests) == gap // 1500 + 1
+    assert np.all(np.diff(history[:, TIMESTAMP]) == MINUTE)
+    assert history[-1, TIMESTAMP] == now
+    stored = CandleStore(str(tmp_path)).read_ohlcv('BTCUSDT', '1m')
+    assert np.all(np.diff(stored[:, TIMESTAMP]) == MINUTE)
+    assert stored[-1, TIMESTAMP] == now - MINUTE
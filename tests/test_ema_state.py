@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ema_state import IncrementalEMA, EMABook
+from signals import ema_matrix
+from ohlcv import TIMESTAMP, CLOSE
+
+MINUTE = 60000
+
+
+def random_closes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    # Runs of equal closes take pandas' no-update path
+    closes[20:25] = closes[20]
+    return closes
+
+
+def pandas_ema(closes, period):
+    return pd.Series(closes).ewm(span=period, adjust=False).mean().to_numpy()
+
+
+def candles_of(closes, start=0):
+    rows = np.zeros((len(closes), 6))
+    rows[:, TIMESTAMP] = start + np.arange(len(closes)) * MINUTE
+    rows[:, CLOSE] = closes
+    return rows
+
+
+@pytest.mark.parametrize('period', [5, 9, 21, 99])
+def test_incremental_ema_matches_pandas(period):
+    closes = random_closes(300)
+    state = IncrementalEMA(period)
+    values = [state.update(index, close) for index, close in enumerate(closes.tolist())]
+    np.testing.assert_allclose(values, pandas_ema(closes, period), rtol=0, atol=1e-12)
+
+
+def test_provisional_does_not_commit_the_forming_candle():
+    closes = random_closes(50)
+    state = IncrementalEMA(9).seed(candles_of(closes[:-1]))
+    committed = state.value
+    assert state.provisional(closes[-1]) == pytest.approx(pandas_ema(closes, 9)[-1], abs=1e-12)
+    assert state.value == committed
+
+
+@pytest.mark.parametrize('period', [5, 21])
+def test_ema_matrix_matches_pandas_per_row_with_nan_padding(period):
+    rows = [random_closes(120, seed) for seed in range(3)]
+    closes = np.full((3, 120), np.nan)
+    closes[0] = rows[0]
+    closes[1, 40:] = rows[1][40:]
+    closes[2, 100:] = rows[2][100:]
+    emas = ema_matrix(closes, period)
+    np.testing.assert_allclose(emas[0], pandas_ema(rows[0], period), atol=1e-12)
+    np.testing.assert_allclose(emas[1, 40:], pandas_ema(rows[1][40:], period), atol=1e-12)
+    np.testing.assert_allclose(emas[2, 100:], pandas_ema(rows[2][100:], period), atol=1e-12)
+
+
+def test_book_tail_follows_new_candles_like_a_full_recalculation():
+    closes = random_closes(400)
+    book = EMABook()
+    for end in (200, 201, 230, 400):
+        candles = candles_of(closes[:end])
+        expected = pandas_ema(closes[:end], 21)[-4:]
+        np.testing.assert_allclose(book.tail('BTCUSDT', 21, candles, 4), expected, atol=1e-12)
+
+
+def test_book_reseeds_when_the_history_no_longer_overlaps():
+    closes = random_closes(400)
+    book = EMABook()
+    book.tail('BTCUSDT', 9, candles_of(closes[:100]), 4)
+    later = candles_of(closes[300:], start=300 * MINUTE)
+    np.testing.assert_allclose(book.tail('BTCUSDT', 9, later, 4), pandas_ema(closes[300:], 9)[-4:], atol=1e-12)
+
+
+def test_book_seeds_match_pandas_for_many_symbols():
+    book = EMABook()
+    histories = {f"S{seed}USDT": candles_of(random_closes(150 + seed * 10, seed)) for seed in range(4)}
+    symbols = list(histories)
+    seeds = book.seeds(symbols, 21, histories, 4)
+    for row, symbol in enumerate(symbols):
+        closes = histories[symbol][:, CLOSE]
+        # EMA at the candle just before the last 4 bars (the last one is forming)
+        assert seeds[row] == pytest.approx(pandas_ema(closes[:-1], 21)[-4], abs=1e-12)
@@ -0,0 +1,97 @@
+import asyncio
+import time
+import numpy as np
+from candle_cache import CandleCache
+from ema_state import EMABook
+from kline_stream import KlineReplayServer, follow_stream, kline_message, parse_kline_message, stream_urls
+from ohlcv import TIMESTAMP, CLOSE
+from signals import evaluate_signals, confirmed_crossover_signals
+
+MINUTE = 60000
+
+
+# Function to build one-minute candles with the given closes
+def candles(closes, start=0):
+    rows = np.zeros((len(closes), 6))
+    rows[:, TIMESTAMP] = start + np.arange(len(closes)) * MINUTE
+    rows[:, 1:5] = np.asarray(closes, dtype=float)[:, None]
+    return rows
+
+
+# Function to wait until a condition holds, polling the event loop
+async def wait_for(condition, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('condition not met in time')
+
+
+def test_kline_messages_round_trip():
+    message = kline_message('BTCUSDT', '1m', [MINUTE, 1.0, 2.0, 0.5, 1.5, 10.0], closed=False)
+    assert message['stream'] == 'btcusdt@kline_1m'
+    assert parse_kline_message(message) == ('BTCUSDT', [MINUTE, 1.0, 2.0, 0.5, 1.5, 10.0], False)
+    assert parse_kline_message({'result': None, 'id': 1}) is None
+
+
+def test_merge_closed_adds_the_just_opened_candle_to_the_returned_copy_only():
+    cache = CandleCache('1m', 10)
+    cache.merge('BTCUSDT', candles([1, 2, 3]))
+    history = cache.merge_closed('BTCUSDT', [2 * MINUTE, 3, 4, 3, 4, 1])
+    assert history[:, TIMESTAMP].tolist() == [0, MINUTE, 2 * MINUTE, 3 * MINUTE]
+    assert history[-1, 1:5].tolist() == [4, 4, 4, 4] and history[-1, 5] == 0
+    assert cache.get('BTCUSDT')[:, CLOSE].tolist() == [1, 2, 4]
+
+
+def test_stream_signals_fire_on_the_candle_that_closed():
+    closes = [10 - 0.1 * n for n in range(30)] + [7 + 0.5 * n for n in range(10)] + [12 - 0.4 * n for n in range(20)]
+    history = candles(closes)
+    stream_cache = CandleCache('1m', 100)
+    stream_cache.merge('BTCUSDT', history[:20])
+    stream_book, sweep_book = EMABook(), EMABook()
+
+    fired = []
+    for k in range(19, len(history) - 1):
+        # Stream mode: candle k just closed
+        stream = {'BTCUSDT': {'ohlcv': stream_cache.merge_closed('BTCUSDT', history[k].tolist())}}
+        # A sweep while candle k + 1 is forming sees the same closed candles
+        sweep = {'BTCUSDT': {'ohlcv': history[:k + 2]}}
+        streamed = evaluate_signals(stream, stream_book, 3, 7, confirmed_crossover_signals, {})
+        swept = evaluate_signals(sweep, sweep_book, 3, 7, confirmed_crossover_signals, {})
+        assert streamed == swept, k
+        if streamed:
+            fired.append((k, streamed['BTCUSDT']))
+    assert [signal for _, signal in fired] == ['BUY', 'SELL']
+
+
+def test_replayed_stream_catches_up_on_every_connection_before_handling_messages():
+    messages = [kline_message(symbol, '1m', [t, 1.0, 1.0, 1.0, 1.0, 1.0], closed)
+                for t in (0, MINUTE) for closed in (False, True) for symbol in ('BTCUSDT', 'ETHUSDT')]
+    events = []
+
+    def on_connect():
+        # The replay sends its messages meanwhile; they wait for the catch-up
+        time.sleep(0.2)
+        events.append('connect')
+
+    async def run():
+        server = KlineReplayServer(messages)
+        url = stream_urls(['BTCUSDT'], '1m', await server.start())[0]
+        follower = asyncio.ensure_future(follow_stream(
+            url, lambda symbol, candle: events.append((symbol, candle[0])), on_connect=on_connect, reconnect_delay=0.05))
+        try:
+            await wait_for(lambda: len(events) == 3)
+            assert events == ['connect', ('BTCUSDT', 0), ('BTCUSDT', MINUTE)]
+
+            # After the connection drops the stream reconnects and catches up again
+            port = server.port
+            await server.stop()
+            server = KlineReplayServer(messages, port=port)
+            await server.start()
+            await wait_for(lambda: len(events) == 6)
+            assert events[3:] == ['connect', ('BTCUSDT', 0), ('BTCUSDT', MINUTE)]
+        finally:
+            follower.cancel()
+            await server.stop()
+
+    asyncio.new_event_loop().run_until_complete(run())
@@ -0,0 +1,81 @@
+import pytest
+from market_index import MarketIndex, step_decimals
+
+
+def symbol_info(symbol, step_size, min_qty, tick_size, min_notional, market_step_size=None, market_min_qty=None):
+    filters = [
+        {'filterType': 'PRICE_FILTER', 'tickSize': tick_size},
+        {'filterType': 'LOT_SIZE', 'stepSize': step_size, 'minQty': min_qty},
+        {'filterType': 'MIN_NOTIONAL', 'notional': min_notional},
+    ]
+    if market_step_size is not None:
+        filters.append({'filterType': 'MARKET_LOT_SIZE', 'stepSize': market_step_size, 'minQty': market_min_qty})
+    return {'symbol': symbol, 'contractType': 'PERPETUAL', 'filters': filters}
+
+
+@pytest.fixture
+def index():
+    exchange_info = {'symbols': [
+        symbol_info('BTCUSDT', '0.001', '0.001', '0.10', '100', market_step_size='0.010', market_min_qty='0.010'),
+        symbol_info('DOGEUSDT', '1', '1', '0.000010', '5'),
+        symbol_info('ETHUSDT', '0.001', '0.001', '0.01', '20'),
+        {'symbol': 'BTCUSDT_240329', 'contractType': 'CURRENT_QUARTER', 'filters': []},
+    ]}
+    leverage_brackets = [{'symbol': 'BTCUSDT', 'brackets': [{'initialLeverage': 125}, {'initialLeverage': 50}]}]
+    return MarketIndex().build(exchange_info, leverage_brackets)
+
+
+def test_step_decimals():
+    assert step_decimals('0.00100000') == 3
+    assert step_decimals('1') == 0
+    assert step_decimals('1.0') == 0
+    assert step_decimals('0.000010') == 5
+
+
+def test_only_perpetuals_are_indexed(index):
+    assert set(index.rows) == {'BTCUSDT', 'DOGEUSDT', 'ETHUSDT'}
+    assert index.max_leverage[index.rows['BTCUSDT']] == 125
+
+
+def test_quantities_are_floored_to_the_step(index):
+    rounded = index.round_quantities(['ETHUSDT', 'DOGEUSDT', 'ETHUSDT'], [0.12345, 1234.9, 0.3], market=False)
+    assert rounded.tolist() == [0.123, 1234.0, 0.3]
+
+
+def test_a_whole_number_of_steps_survives_float_error(index):
+    # 0.1 + 0.2 is 0.30000000000000004 and 0.7 / 0.001 is 699.9999999999999
+    assert index.round_quantity('ETHUSDT', 0.1 + 0.2, market=False) == 0.3
+    assert index.round_quantity('ETHUSDT', 0.7, market=False) == 0.7
+
+
+def test_market_orders_use_the_market_lot_size(index):
+    assert index.round_quantity('BTCUSDT', 0.0567, market=True) == 0.05
+    assert index.round_quantity('BTCUSDT', 0.0567, market=False) == 0.056
+    # Symbols without MARKET_LOT_SIZE fall back to LOT_SIZE
+    assert index.round_quantity('ETHUSDT', 0.0567, market=True) == 0.056
+    mixed = index.round_quantities(['BTCUSDT', 'BTCUSDT'], [0.0567, 0.0567], market=[True, False])
+    assert mixed.tolist() == [0.05, 0.056]
+
+
+def test_quantities_below_the_minimums_become_zero(index):
+    rounded = index.round_quantities(['BTCUSDT', 'ETHUSDT', 'ETHUSDT'], [0.005, 0.009, 0.011], [30000.0, 2000.0, 2000.0])
+    # Under the market minimum quantity, then under the 20 USDT minimum notional
+    assert rounded.tolist() == [0.0, 0.0, 0.011]
+    with pytest.raises(ValueError):
+        index.round_quantity('ETHUSDT', 0.009, price=2000.0)
+
+
+def test_limit_prices_round_away_from_the_book(index):
+    prices = index.round_prices(['ETHUSDT', 'ETHUSDT', 'DOGEUSDT', 'DOGEUSDT'], [2000.057, 2000.051, 0.0812345, 0.0812345],
+                                ['BUY', 'SELL', 'BUY', 'SELL'])
+    assert prices.tolist() == [2000.05, 2000.06, 0.08123, 0.08124]
+    # Prices already on a tick are kept
+    assert index.round_price('BTCUSDT', 30000.3, 'BUY') == 30000.3
+    assert index.round_price('BTCUSDT', 30000.3, 'SELL') == 30000.3
+
+
+def test_formatting_uses_the_symbol_precision(index):
+    assert index.format_quantity('ETHUSDT', 0.3) == '0.300'
+    assert index.format_quantity('DOGEUSDT', 1234.0) == '1234'
+    assert index.format_price('DOGEUSDT', 0.08123) == '0.08123'
+    assert index.format_price('BTCUSDT', 30000.3) == '30000.3'
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import ccxt
+import ccxt.async_support as ccxt_async
+import numpy as np
+import pytest
+from mock_exchange import MockVenue, MockExchangeServer, mock_http_urls
+
+SYMBOLS = ['BTCUSDT', 'ETHUSDT']
+# Fixed clock half way through a minute
+NOW = 1700000000000 + 30000
+
+
+def venue(seed=7, **kwargs):
+    return MockVenue(SYMBOLS, '1m', seed=seed, history_days=1, clock=lambda: NOW, **kwargs)
+
+
+def klines(venue, interval='1m', **params):
+    return np.array(venue.fapiPublicGetKlines(dict(symbol='BTCUSDT', interval=interval, **params)), dtype=float)
+
+
+# Function to run a test body against a MockExchangeServer with a real ccxt
+# Binance client pointed at it
+def serve(venue, body):
+    async def run():
+        server = MockExchangeServer(venue, latency=0)
+        exchange = mock_http_urls(ccxt_async.binance({'apiKey': 'key', 'secret': 'secret'}), await server.start())
+        try:
+            return await body(server, exchange)
+        finally:
+            await exchange.close()
+            await server.stop()
+    return asyncio.new_event_loop().run_until_complete(run())
+
+
+# Function to rest a buy limit order far below the book through the client
+async def rest_limit_order(venue, exchange):
+    bid, _ = venue.book('BTCUSDT')
+    return await exchange.fapiPrivatePostOrder({'symbol': 'BTCUSDT', 'side': 'BUY', 'type': 'LIMIT',
+                                                'price': f"{bid * 0.5:.1f}", 'quantity': '1', 'timeInForce': 'GTC'})
+
+
+def test_paths_are_deterministic_per_seed_and_independent_of_paging():
+    full = klines(venue(), limit=1000)
+    assert np.array_equal(full, klines(venue(), limit=1000))
+    assert not np.array_equal(full[:, 4], klines(venue(seed=8), limit=1000)[:, 4])
+
+    # The same candles fetched in pages, and a later timeframe built from them
+    paged = venue()
+    start = int(full[0, 0])
+    pages = [klines(paged, startTime=start + n * 100 * 60000, limit=100) for n in range(10)]
+    assert np.array_equal(np.concatenate(pages), full)
+    five = klines(paged, interval='5m', startTime=start, limit=1)[0]
+    minutes = full[(full[:, 0] >= five[0]) & (full[:, 0] < five[0] + 5 * 60000)]
+    assert len(minutes) == 5
+    assert (five[1], five[2], five[3], five[4]) == (minutes[0, 1], minutes[:, 2].max(), minutes[:, 3].min(), minutes[-1, 4])
+
+
+def test_ccxt_client_reads_klines_over_http():
+    mock = venue()
+
+    async def body(server, exchange):
+        return await exchange.fapiPublicGetKlines({'symbol': 'BTCUSDT', 'interval': '1m', 'limit': 5})
+    assert np.array_equal(np.array(serve(mock, body), dtype=float), klines(mock, limit=5))
+
+
+def test_ccxt_client_places_lists_and_batch_cancels_orders():
+    mock = venue()
+
+    async def body(server, exchange):
+        order = await rest_limit_order(mock, exchange)
+        assert order['status'] == 'NEW'
+        assert [o['orderId'] for o in await exchange.fapiPrivateGetOpenOrders({'symbol': 'BTCUSDT'})] == [order['orderId']]
+        cancelled, unknown = await exchange.fapiPrivateDeleteBatchOrders(
+            {'symbol': 'BTCUSDT', 'orderIdList': json.dumps([int(order['orderId']), 999])})
+        assert cancelled['status'] == 'CANCELED' and int(unknown['code']) == -2011
+        assert await exchange.fapiPrivateGetOpenOrders() == []
+        with pytest.raises(ccxt.OrderNotFound):
+            await exchange.fapiPrivateDeleteOrder({'symbol': 'BTCUSDT', 'orderId': 999})
+    serve(mock, body)
+
+
+def test_cancels_are_pushed_on_the_user_data_websocket():
+    mock = venue()
+
+    async def body(server, exchange):
+        import aiohttp
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(f"{server.url}/ws/listen-key") as ws:
+                order = await rest_limit_order(mock, exchange)
+                await exchange.fapiPrivateDeleteOrder({'symbol': 'BTCUSDT', 'orderId': order['orderId']})
+                statuses = [json.loads((await ws.receive(timeout=5)).data)['o']['X'] for _ in range(2)]
+        assert statuses == ['NEW', 'CANCELED']
+    serve(mock, body)
+
+
+def test_requests_over_the_weight_limit_get_a_429():
+    mock = venue(weight_limit_per_minute=100)
+
+    async def body(server, exchange):
+        await exchange.fapiPrivateGetOpenOrders()
+        await exchange.fapiPrivateGetOpenOrders()
+        # 40 weight each: the third is over the limit
+        with pytest.raises(ccxt.DDoSProtection, match='429'):
+            await exchange.fapiPrivateGetOpenOrders()
+    serve(mock, body)
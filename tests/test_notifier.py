@@ -0,0 +1,88 @@
+import time
+from notifier import MAX_MESSAGE_LENGTH, TelegramNotifier, split_messages
+
+
+# Stand-in for telegram.Bot recording what it sends; `failures` are raised
+# by the first send attempts
+class FakeBot:
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.initialized = 0
+        self.sent = []
+
+    async def initialize(self):
+        self.initialized += 1
+
+    async def send_message(self, chat_id, text):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent.append((chat_id, text))
+
+
+# Function to wait until a condition holds
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition not met in time'
+        time.sleep(0.01)
+
+
+def test_split_messages_packs_lines_up_to_the_limit():
+    assert split_messages(['a', 'b', 'c']) == ['a\nb\nc']
+    assert split_messages(['aaaa', 'bbbb', 'cc'], limit=9) == ['aaaa\nbbbb', 'cc']
+    assert split_messages(['x' * 20], limit=8) == ['x' * 8]
+    texts = split_messages([str(n) * 100 for n in range(100)])
+    assert all(len(text) <= MAX_MESSAGE_LENGTH for text in texts)
+    assert '\n'.join(texts).split('\n') == [str(n) * 100 for n in range(100)]
+
+
+def test_a_burst_is_sent_as_one_digest_on_flush():
+    bot = FakeBot()
+    notifier = TelegramNotifier(bot, 42, coalesce_seconds=60, min_interval=0)
+    for n in range(5):
+        notifier.notify(f"order {n}")
+    time.sleep(0.05)
+    assert bot.sent == []
+    notifier.flush()
+    wait_for(lambda: bot.sent)
+    assert bot.sent == [(42, '\n'.join(f"order {n}" for n in range(5)))]
+    assert bot.initialized == 1
+
+
+def test_messages_are_sent_after_the_coalescing_delay_without_a_flush():
+    bot = FakeBot()
+    notifier = TelegramNotifier(bot, 42, coalesce_seconds=0.05, min_interval=0)
+    notifier.notify('one')
+    notifier.notify('two')
+    wait_for(lambda: bot.sent)
+    assert bot.sent == [(42, 'one\ntwo')]
+
+
+def test_messages_over_the_pending_limit_are_dropped_and_counted():
+    bot = FakeBot()
+    notifier = TelegramNotifier(bot, 42, coalesce_seconds=60, min_interval=0, max_pending=3)
+    for n in range(5):
+        notifier.notify(str(n))
+    notifier.flush()
+    wait_for(lambda: bot.sent)
+    assert bot.sent[0][1] == '0\n1\n2\n... 2 more messages dropped'
+
+
+def test_rate_limits_and_network_errors_are_retried():
+    from telegram.error import NetworkError, RetryAfter
+    bot = FakeBot([NetworkError('connection reset'), RetryAfter(0.01)])
+    notifier = TelegramNotifier(bot, 42, coalesce_seconds=0, min_interval=0, max_retries=3)
+    notifier.notify('filled')
+    wait_for(lambda: bot.sent, timeout=10)
+    assert bot.sent == [(42, 'filled')]
+
+
+def test_a_digest_is_given_up_after_max_retries():
+    from telegram.error import RetryAfter
+    bot = FakeBot([RetryAfter(0.01)] * 2)
+    notifier = TelegramNotifier(bot, 42, coalesce_seconds=0, min_interval=0, max_retries=1)
+    notifier.notify('lost')
+    wait_for(lambda: not bot.failures, timeout=10)
+    notifier.notify('next')
+    wait_for(lambda: bot.sent, timeout=10)
+    assert bot.sent == [(42, 'next')]
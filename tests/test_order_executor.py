@@ -0,0 +1,127 @@
+import asyncio
+import pytest
+from market_index import MarketIndex
+from mock_exchange import MockVenue, AsyncMockExchange
+from order_executor import MAX_BATCH_CANCELS, MAX_BATCH_ORDERS, close_order, execute_orders_async, flip_order
+
+SYMBOLS = ['BTCUSDT', 'ETHUSDT']
+
+
+# Async mock client that remembers the endpoints it was asked for
+class RecordingExchange(AsyncMockExchange):
+    def __init__(self, venue):
+        super().__init__(venue, latency=0)
+        self.calls = []
+
+    def __getattr__(self, name):
+        request = super().__getattr__(name)
+
+        async def recorded(*args, **kwargs):
+            self.calls.append(name)
+            return await request(*args, **kwargs)
+        return recorded
+
+
+@pytest.fixture
+def venue():
+    return MockVenue(SYMBOLS, '1m', seed=7, history_days=1)
+
+
+@pytest.fixture
+def exchange(venue):
+    return RecordingExchange(venue)
+
+
+@pytest.fixture
+def market_index(venue):
+    return MarketIndex().build(venue.fapiPublicGetExchangeInfo())
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+# Function to rest a buy limit order far below the book and return its id
+def rest_limit_order(venue, market_index, symbol):
+    bid, _ = venue.book(symbol)
+    price = market_index.format_price(symbol, bid * 0.5)
+    order = venue.fapiPrivatePostOrder({'symbol': symbol, 'side': 'BUY', 'type': 'LIMIT', 'price': price,
+                                        'quantity': market_index.format_quantity(symbol, 200 / float(price)),
+                                        'timeInForce': 'GTC'})
+    return str(order['orderId'])
+
+
+def test_flip_order_closes_the_opposite_position_and_opens_the_new_one_at_once():
+    assert flip_order('BTCUSDT', 'BUY', 2.0) == {'symbol': 'BTCUSDT', 'side': 'BUY', 'type': 'market', 'quantity': 2.0}
+    short = {'positionAmt': -1.5}
+    assert flip_order('BTCUSDT', 'BUY', 2.0, short, price=10.0)['quantity'] == 3.5
+    long = {'positionAmt': 0.5}
+    order = flip_order('BTCUSDT', 'SELL', 2.0, long, 'limit', 9.0)
+    assert (order['side'], order['type'], order['quantity'], order['price']) == ('SELL', 'limit', 2.5, 9.0)
+    # Topping up a position on the same side only orders the difference
+    assert flip_order('BTCUSDT', 'BUY', 2.0, long)['quantity'] == 1.5
+    assert flip_order('BTCUSDT', 'BUY', 0.5, long) is None
+
+
+def test_close_order_is_reduce_only_against_the_position():
+    order = close_order('ETHUSDT', {'positionAmt': -0.3, 'contracts': 0.3})
+    assert (order['side'], order['quantity'], order['reduceOnly']) == ('BUY', 0.3, True)
+    assert close_order('ETHUSDT', {'positionAmt': 0.3, 'contracts': 0.3})['side'] == 'SELL'
+
+
+def test_flip_and_close_orders_move_the_venue_position(venue, exchange, market_index):
+    price = venue.price('ETHUSDT')
+    run(execute_orders_async([flip_order('ETHUSDT', 'SELL', 100 / price, price=price)], market_index, exchange=exchange))
+    short = venue.positions['ETHUSDT'][0]
+    assert short < 0
+
+    position = {'positionAmt': short, 'contracts': -short}
+    run(execute_orders_async([flip_order('ETHUSDT', 'BUY', 100 / price, position, price=price)], market_index, exchange=exchange))
+    long = venue.positions['ETHUSDT'][0]
+    assert long == pytest.approx(-short, rel=0.01)
+
+    [result] = run(execute_orders_async([close_order('ETHUSDT', {'positionAmt': long, 'contracts': long})],
+                                        market_index, exchange=exchange))
+    assert result['id'] is not None and result['reduceOnly']
+    assert venue.positions.get('ETHUSDT', (0.0, 0.0))[0] == 0
+
+
+def test_orders_go_out_in_batches_of_at_most_max_batch_orders(venue, exchange, market_index):
+    price = venue.price('BTCUSDT')
+    orders = [{'symbol': 'BTCUSDT', 'side': 'BUY' if n % 2 else 'SELL', 'type': 'market', 'quantity': 200 / price, 'price': price}
+              for n in range(2 * MAX_BATCH_ORDERS + 1)]
+    results = run(execute_orders_async(orders, market_index, exchange=exchange))
+    assert exchange.calls == ['fapiPrivatePostBatchOrders', 'fapiPrivatePostBatchOrders', 'fapiPrivatePostOrder']
+    assert [result['side'] for result in results] == [order['side'] for order in orders]
+    assert all(result['id'] is not None and result['error'] is None for result in results)
+
+
+def test_rejected_and_unknown_orders_come_back_without_an_id(venue, exchange):
+    # Trading rules for a symbol the venue rejects
+    market_index = MarketIndex().build(MockVenue(SYMBOLS + ['SOLUSDT'], '1m', seed=7, history_days=1).fapiPublicGetExchangeInfo())
+    orders = [
+        {'symbol': symbol, 'side': 'BUY', 'type': 'market', 'quantity': 10.0, 'price': 100.0}
+        for symbol in ('BTCUSDT', 'SOLUSDT', 'XRPUSDT')
+    ]
+    results = run(execute_orders_async(orders, market_index, exchange=exchange))
+    # Orders without trading rules never reach the exchange
+    assert [result['symbol'] for result in results] == ['BTCUSDT', 'SOLUSDT']
+    assert results[0]['id'] is not None and results[0]['error'] is None
+    assert results[1]['id'] is None and results[1]['error']
+
+
+def test_cancels_only_touch_the_given_orders(venue, exchange, market_index):
+    own = [rest_limit_order(venue, market_index, 'BTCUSDT') for _ in range(2)]
+    other_bot = rest_limit_order(venue, market_index, 'BTCUSDT')
+    run(execute_orders_async([], market_index, [('BTCUSDT', order_id) for order_id in own], exchange=exchange))
+    assert exchange.calls == ['fapiPrivateDeleteBatchOrders']
+    assert [str(order['orderId']) for order in venue.fapiPrivateGetOpenOrders({'symbol': 'BTCUSDT'})] == [other_bot]
+
+
+def test_cancels_are_batched_per_symbol(venue, exchange, market_index):
+    btc = [rest_limit_order(venue, market_index, 'BTCUSDT') for _ in range(MAX_BATCH_CANCELS + 1)]
+    eth = rest_limit_order(venue, market_index, 'ETHUSDT')
+    cancels = [('BTCUSDT', order_id) for order_id in btc] + [('ETHUSDT', eth), ('ETHUSDT', eth)]
+    run(execute_orders_async([], market_index, cancels, exchange=exchange))
+    assert sorted(exchange.calls) == ['fapiPrivateDeleteBatchOrders', 'fapiPrivateDeleteOrder', 'fapiPrivateDeleteOrder']
+    assert venue.fapiPrivateGetOpenOrders() == []
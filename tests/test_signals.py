@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ema_state import EMABook
+from ohlcv import TIMESTAMP, CLOSE
+from signals import (SIGNAL_BARS, trend_signals, confirmed_crossover_signals, gap_crossover_signals,
+                     select_signals, evaluate_signals)
+
+# The per-symbol conditions of the original scripts, written against EMA
+# sequences indexed like pandas' iloc (-1 is the forming candle)
+
+def scalar_trend(s, l):
+    return s[-1] > l[-1], s[-1] < l[-1]
+
+
+def scalar_confirmed_crossover(s, l):
+    buy = s[-2] > l[-2] and s[-3] <= l[-3] and s[-4] <= l[-4]
+    sell = l[-2] > s[-2] and l[-3] <= s[-3] and l[-4] <= s[-4]
+    return buy, sell
+
+
+def scalar_gap_crossover(s, l, min_percentage_condition):
+    buy = (
+        ((s[-1] > l[-1] and l[-2] <= s[-2] and s[-3] <= l[-3]) or
+         (s[-1] > l[-1] and s[-2] >= l[-2] and l[-3] <= s[-3] and s[-4] <= l[-4])) and
+        (s[-1] - l[-1]) / s[-1] * 100 >= min_percentage_condition
+    )
+    sell = (
+        ((l[-1] > s[-1] and s[-2] <= l[-2] and l[-3] <= s[-3]) or
+         (l[-1] > s[-1] and l[-2] >= s[-2] and s[-3] <= l[-3] and l[-4] <= s[-4])) and
+        (l[-1] - s[-1]) / l[-1] * 100 >= min_percentage_condition
+    )
+    return buy, sell
+
+
+def random_emas(rows, seed):
+    rng = np.random.default_rng(seed)
+    # Few distinct levels, so equal EMAs (the <= / >= edges) come up often
+    short_ema = 100 + rng.integers(-3, 4, (rows, SIGNAL_BARS)) * 0.2
+    long_ema = 100 + rng.integers(-3, 4, (rows, SIGNAL_BARS)) * 0.2
+    return short_ema, long_ema
+
+
+@pytest.mark.parametrize('rule, scalar_rule, params', [
+    (trend_signals, scalar_trend, {}),
+    (confirmed_crossover_signals, scalar_confirmed_crossover, {}),
+    (gap_crossover_signals, scalar_gap_crossover, {'min_percentage_condition': 0.3}),
+])
+def test_vectorized_masks_match_the_scalar_rules(rule, scalar_rule, params):
+    short_ema, long_ema = random_emas(2000, seed=1)
+    buy, sell = rule(short_ema, long_ema, **params)
+    expected = [scalar_rule(list(s), list(l), **params) for s, l in zip(short_ema, long_ema)]
+    assert buy.tolist() == [bool(b) for b, _ in expected]
+    assert sell.tolist() == [bool(s) for _, s in expected]
+    # The sample reaches both sides of every rule
+    assert buy.any() and sell.any()
+
+
+def test_rules_work_on_sliding_windows():
+    short_ema, long_ema = random_emas(50, seed=2)
+    stacked_buy, stacked_sell = confirmed_crossover_signals(short_ema[None], long_ema[None])
+    buy, sell = confirmed_crossover_signals(short_ema, long_ema)
+    assert (stacked_buy[0] == buy).all() and (stacked_sell[0] == sell).all()
+
+
+def test_select_signals_skips_repeats_and_prefers_buy():
+    symbols = ['A', 'B', 'C', 'D']
+    buy = np.array([True, True, False, True])
+    sell = np.array([False, False, True, True])
+    last = {'A': 'BUY', 'B': 'SELL', 'C': 'SELL', 'D': None}
+    assert select_signals(symbols, buy, sell, last) == {'B': 'BUY', 'D': 'BUY'}
+
+
+@pytest.mark.parametrize('rule, scalar_rule', [
+    (trend_signals, scalar_trend),
+    (confirmed_crossover_signals, scalar_confirmed_crossover),
+])
+def test_evaluate_signals_matches_pandas_per_symbol(rule, scalar_rule):
+    rng = np.random.default_rng(3)
+    snapshot = {}
+    expected = {}
+    last_order_types = {}
+    for index in range(300):
+        symbol = f"S{index}USDT"
+        closes = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, 120)))
+        candles = np.zeros((len(closes), 6))
+        candles[:, TIMESTAMP] = np.arange(len(closes)) * 60000
+        candles[:, CLOSE] = closes
+        snapshot[symbol] = {'ohlcv': candles, 'ticker': {'close': closes[-1]}}
+        last_order_types[symbol] = [None, 'BUY', 'SELL'][index % 3]
+
+        s = pd.Series(closes).ewm(span=7, adjust=False).mean().iloc[-4:].tolist()
+        l = pd.Series(closes).ewm(span=21, adjust=False).mean().iloc[-4:].tolist()
+        buy, sell = scalar_rule(s, l)
+        if buy and last_order_types[symbol] != 'BUY':
+            expected[symbol] = 'BUY'
+        elif sell and last_order_types[symbol] != 'SELL':
+            expected[symbol] = 'SELL'
+
+    signals = evaluate_signals(snapshot, EMABook(), 7, 21, rule, last_order_types, min_bars=21)
+    assert expected
+    assert signals == expected
@@ -0,0 +1,88 @@
+import json
+import os
+from state_journal import StateJournal, order_record
+
+
+def journal(tmp_path, **kwargs):
+    return StateJournal('test', path=str(tmp_path), fsync=False, **kwargs)
+
+
+def test_replay_restores_signals_orders_and_positions(tmp_path):
+    first = journal(tmp_path).load()
+    first.record_signal('BTCUSDT', 'BUY')
+    first.record_signal('ETHUSDT', 'SELL')
+    first.record_signal('BTCUSDT', 'SELL')
+    first.record_order('BTCUSDT', {'id': '7', 'side': 'SELL', 'type': 'market', 'quantity': 0.01, 'price': 30000.0,
+                                   'status': 'NEW', 'latency_ms': 12.0})
+    first.record_position('BTCUSDT', -0.01)
+    first.record_position('ETHUSDT', 0.5)
+    first.record_position('ETHUSDT', 0.0)
+
+    restored = journal(tmp_path).load()
+    assert restored.last_order_types == {'BTCUSDT': 'SELL', 'ETHUSDT': 'SELL'}
+    assert restored.orders['BTCUSDT']['id'] == '7'
+    assert 'latency_ms' not in restored.orders['BTCUSDT']
+    assert restored.positions == {'BTCUSDT': -0.01}
+
+
+def test_ccxt_orders_are_journaled_with_their_amount(tmp_path):
+    record = order_record({'id': '1', 'side': 'buy', 'type': 'limit', 'amount': 2.0, 'price': 1.5, 'filled': 0.0,
+                           'status': 'open', 'info': {}})
+    assert record == {'id': '1', 'side': 'buy', 'type': 'limit', 'quantity': 2.0, 'price': 1.5, 'filled': 0.0, 'status': 'open'}
+    state = journal(tmp_path).load()
+    state.record_order('BTCUSDT', None)
+    assert state.orders == {}
+
+
+def test_cleared_orders_stay_cleared_after_a_restart(tmp_path):
+    state = journal(tmp_path).load()
+    state.record_order('BTCUSDT', {'id': '1', 'side': 'BUY'})
+    state.record_order('ETHUSDT', {'id': '2', 'side': 'SELL'})
+    state.clear_order('BTCUSDT')
+    assert journal(tmp_path).load().orders.keys() == {'ETHUSDT'}
+
+
+def test_loading_compacts_the_journal_into_a_snapshot(tmp_path):
+    state = journal(tmp_path).load()
+    for index in range(5):
+        state.record_signal(f"S{index}USDT", 'BUY')
+    assert len(open(state.journal_path).readlines()) == 5
+
+    restored = journal(tmp_path).load()
+    assert os.path.getsize(restored.journal_path) == 0
+    with open(restored.snapshot_path) as file:
+        assert len(json.load(file)['last_order_types']) == 5
+
+
+def test_the_journal_is_compacted_every_compact_every_entries(tmp_path):
+    state = journal(tmp_path, compact_every=3).load()
+    for index in range(7):
+        state.record_signal('BTCUSDT', 'BUY' if index % 2 else 'SELL')
+    # Two compactions, one entry since the last one
+    assert len(open(state.journal_path).readlines()) == 1
+    with open(state.snapshot_path) as file:
+        assert json.load(file)['last_order_types'] == {'BTCUSDT': 'BUY'}
+    assert journal(tmp_path).load().last_order_types == {'BTCUSDT': 'SELL'}
+
+
+def test_a_half_written_last_entry_is_skipped(tmp_path):
+    state = journal(tmp_path).load()
+    state.record_signal('BTCUSDT', 'BUY')
+    state.record_signal('ETHUSDT', 'SELL')
+    state.file.close()
+    with open(state.journal_path, 'a') as file:
+        file.write('{"kind": "signal", "symbol": "XRPU')
+
+    restored = journal(tmp_path).load()
+    assert restored.last_order_types == {'BTCUSDT': 'BUY', 'ETHUSDT': 'SELL'}
+
+
+def test_replaying_an_entry_twice_is_harmless(tmp_path):
+    state = journal(tmp_path).load()
+    state.record_position('BTCUSDT', 0.25)
+    state.file.close()
+    with open(state.journal_path) as file:
+        line = file.read()
+    with open(state.journal_path, 'a') as file:
+        file.write(line)
+    assert journal(tmp_path).load().positions == {'BTCUSDT': 0.25}
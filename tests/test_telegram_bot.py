@@ -0,0 +1,85 @@
+import pytest
+import telegram_bot
+from account_state import AccountState, order_entry
+from market_index import MarketIndex
+from mock_exchange import MockVenue, MockExchange
+from telegram_bot import OpenOrderReporter
+
+
+@pytest.fixture
+def venue(monkeypatch):
+    venue = MockVenue(['BTCUSDT', 'ETHUSDT'], '1m', seed=7, history_days=1)
+    monkeypatch.setattr(telegram_bot, '_exchange', MockExchange(venue, latency=0))
+    return venue
+
+
+# Lines the reporter sends to the chat, in order
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+    monkeypatch.setattr(telegram_bot, 'notify', sent.append)
+    monkeypatch.setattr(telegram_bot, 'flush', lambda: None)
+    return sent
+
+
+# Function to rest a buy limit order far below the book and return its id
+def rest_limit_order(venue, symbol):
+    market_index = MarketIndex().build(venue.fapiPublicGetExchangeInfo())
+    bid, _ = venue.book(symbol)
+    price = market_index.format_price(symbol, bid * 0.5)
+    order = venue.fapiPrivatePostOrder({'symbol': symbol, 'side': 'BUY', 'type': 'LIMIT', 'price': price,
+                                        'quantity': market_index.format_quantity(symbol, 200 / float(price)),
+                                        'timeInForce': 'GTC'})
+    return str(order['orderId'])
+
+
+def test_polled_orders_are_reported_once_then_only_their_changes(venue, sent):
+    reporter = OpenOrderReporter(AccountState(), poll_interval=0)
+    reporter.check()
+    assert sent == ['No open orders.']
+
+    order_id = rest_limit_order(venue, 'BTCUSDT')
+    reporter.check()
+    assert len(sent) == 2 and sent[1].startswith('New: BTCUSDT: BUY LIMIT')
+
+    # Nothing changed, nothing to report
+    reporter.check()
+    assert len(sent) == 2
+
+    venue.fapiPrivateDeleteOrder({'symbol': 'BTCUSDT', 'orderId': order_id})
+    reporter.check()
+    assert len(sent) == 3 and sent[2].startswith('Cancelled: BTCUSDT: BUY LIMIT')
+    assert reporter.summary() == ['No open orders.']
+
+
+def test_rest_is_only_polled_every_poll_interval(venue, sent):
+    reporter = OpenOrderReporter(AccountState(), poll_interval=3600)
+    reporter.check()
+    rest_limit_order(venue, 'ETHUSDT')
+    reporter.check()
+    assert sent == ['No open orders.']
+
+
+def test_stream_orders_are_reported_without_rest_requests(venue, sent, monkeypatch):
+    monkeypatch.setattr(telegram_bot, '_exchange', object())  # Any REST request would fail
+    state = AccountState()
+    reporter = OpenOrderReporter(state, poll_interval=0)
+    state.connected.set()
+    reporter.check()
+    assert sent == []  # Not reconciled yet
+
+    order = order_entry(1, 'BTCUSDT', 'BUY', 'LIMIT', 100.0, 2.0, 0.0, 'NEW', False)
+    state.open_orders = {'BTCUSDT': {'1': order}}
+    state.ready.set()
+    reporter.check()
+    assert sent == ['Open Futures Orders:', 'BTCUSDT: BUY LIMIT 2 @ 100']
+
+    state.open_orders['BTCUSDT']['1'] = dict(order, filled=0.5, status='PARTIALLY_FILLED')
+    reporter.check()
+    assert sent[2:] == ['Partially filled: BTCUSDT: BUY LIMIT 0.5/2 @ 100']
+
+    reporter.on_user_data({'e': 'ORDER_TRADE_UPDATE', 'o': {'i': 1, 'X': 'FILLED'}})
+    state.open_orders['BTCUSDT'] = {}
+    reporter.check()
+    assert sent[3:] == ['Filled: BTCUSDT: BUY LIMIT 0.5/2 @ 100']
+    assert reporter.statuses == {}
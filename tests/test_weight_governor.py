@@ -0,0 +1,86 @@
+import multiprocessing
+import time
+import pytest
+from weight_governor import WeightGovernor, govern_exchange
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'governor')
+
+
+def test_a_fresh_bucket_is_full_and_drains_by_the_request_weight(path):
+    governor = WeightGovernor(path, limit_per_minute=60)
+    assert governor.reserve(40) == 0
+    assert governor.reserve(20) == 0
+    # One token per second refills: the next 30 take about 30 seconds
+    assert governor.reserve(30) == pytest.approx(30, abs=0.5)
+
+
+def test_weight_refills_with_time(path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    governor = WeightGovernor(path, limit_per_minute=60)
+    assert governor.reserve(60) == 0
+    now[0] += 10
+    assert governor.reserve(10) == 0
+    assert governor.reserve(1) == pytest.approx(1)
+    # Never more than a minute's worth
+    now[0] += 3600
+    assert governor.reserve(60) == 0
+    assert governor.reserve(1) > 0
+
+
+def test_processes_sharing_the_file_share_the_bucket(path):
+    WeightGovernor(path, limit_per_minute=100).reserve(70)
+    context = multiprocessing.get_context('fork')
+    with context.Pool(4) as pool:
+        waits = pool.starmap(reserve_in_process, [(path, 10)] * 4)
+    # Only three of the four requests fit in the 30 weight left
+    assert sorted(wait == 0 for wait in waits) == [False, True, True, True]
+
+
+# Function to take weight from a governor opened in another process
+def reserve_in_process(path, weight):
+    return WeightGovernor(path, limit_per_minute=100).reserve(weight)
+
+
+def test_used_weight_headers_only_ever_lower_the_bucket(path):
+    governor = WeightGovernor(path, limit_per_minute=100)
+    governor.update({'X-MBX-USED-WEIGHT-1M': '90'})
+    assert governor.reserve(10) == 0
+    assert governor.reserve(10) > 0
+
+    other = WeightGovernor(str(path) + '2', limit_per_minute=100)
+    other.reserve(95)
+    other.update({'x-mbx-used-weight-1m': '10'})
+    assert other.reserve(10) > 0
+
+
+def test_a_rate_limit_response_stops_every_process_for_retry_after(path):
+    governor = WeightGovernor(path, limit_per_minute=100)
+    governor.update({'Retry-After': '30'}, status=429)
+    assert WeightGovernor(path, limit_per_minute=100).reserve(1) == pytest.approx(30, abs=0.5)
+
+
+def test_governed_exchange_charges_the_endpoint_cost_and_reads_the_headers(path):
+    calls = []
+
+    class Exchange:
+        enableRateLimit = False
+
+        def fetch(self, *args):
+            pass
+
+        def on_rest_response(self, code, reason, url, method, response_headers, response_body, request_headers, request_body):
+            calls.append(code)
+            return response_body
+
+    governor = WeightGovernor(path, limit_per_minute=100)
+    exchange = govern_exchange(Exchange(), governor)
+    assert exchange.enableRateLimit
+    exchange.throttle(40)
+    assert exchange.on_rest_response(200, 'OK', 'url', 'GET', {'X-MBX-USED-WEIGHT-1M': '50'}, 'body', {}, None) == 'body'
+    assert calls == [200]
+    assert governor.reserve(50) == 0
+    assert governor.reserve(1) > 0
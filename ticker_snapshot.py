@@ -0,0 +1,55 @@
+import asyncio
+import time
+from config import ticker_ttl
+
+# Latest close, bid and ask of every futures symbol, refreshed with two bulk
+# requests (24hr tickers and book tickers) instead of one fetch_ticker per
+# symbol. Entries are keyed by Binance symbol id (e.g. 'BTCUSDT') like the
+# symbols in config. Lookups within ticker_ttl seconds of the last refresh are
+# served from memory
+class TickerSnapshot:
+    def __init__(self, ttl=ticker_ttl):
+        self.ttl = ttl
+        self.tickers = {}
+        self.updated = None
+
+    def is_fresh(self):
+        return self.updated is not None and time.monotonic() - self.updated < self.ttl
+
+    # Function to merge bulk 24hr tickers (close) and book tickers (bid/ask)
+    def update(self, tickers, book_tickers):
+        for ticker in tickers.values():
+            symbol = ticker['info']['symbol']
+            self.tickers[symbol] = {
+                'symbol': symbol,
+                'close': ticker['close'],
+                'bid': None,
+                'ask': None,
+                'timestamp': ticker['timestamp'],
+            }
+        for ticker in book_tickers.values():
+            symbol = ticker['info']['symbol']
+            if symbol in self.tickers:
+                self.tickers[symbol]['bid'] = ticker['bid']
+                self.tickers[symbol]['ask'] = ticker['ask']
+        self.updated = time.monotonic()
+
+    # Function to refresh from a sync ccxt client when the snapshot is stale
+    def refresh(self, exchange, force=False):
+        if force or not self.is_fresh():
+            self.update(exchange.fetch_tickers(), exchange.fetch_bids_asks())
+        return self
+
+    # Function to refresh from an async ccxt client when the snapshot is stale
+    async def refresh_async(self, exchange, force=False):
+        if force or not self.is_fresh():
+            tickers, book_tickers = await asyncio.gather(exchange.fetch_tickers(), exchange.fetch_bids_asks())
+            self.update(tickers, book_tickers)
+        return self
+
+    # Ticker of a symbol as {'close', 'bid', 'ask', ...}; with an exchange the
+    # snapshot is refreshed first if it has gone stale
+    def get(self, symbol, exchange=None):
+        if exchange is not None:
+            self.refresh(exchange)
+        return self.tickers.get(symbol)
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import threading
+import time
+import aiohttp
+from config import user_data_stream_url, position_reconcile_interval
+
+# Binance closes a listen key that has not been kept alive for 60 minutes
+LISTEN_KEY_KEEPALIVE = 30 * 60
+
+# Function to create (or fetch the existing) futures listen key
+def create_listen_key(exchange):
+    return exchange.fapiPrivatePostListenKey()['listenKey']
+
+# Function to extend the listen key's validity
+def keep_alive_listen_key(exchange):
+    exchange.fapiPrivatePutListenKey()
+
+# Function to follow the user-data stream into an AccountState, reconnecting
+# when it drops. Each connection reconciles once connected, so events missed
+# while disconnected are picked up from REST
+async def follow_user_data(exchange, state, base_url=user_data_stream_url, reconnect_delay=1, max_reconnect_delay=60):
+    loop = asyncio.get_event_loop()
+    delay = reconnect_delay
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                listen_key = await loop.run_in_executor(None, create_listen_key, exchange)
+                async with session.ws_connect(f"{base_url}/ws/{listen_key}", heartbeat=60) as ws:
+                    delay = reconnect_delay
+                    state.connected.set()
+                    reconciliation = loop.run_in_executor(None, state.reconcile, exchange)
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        message = json.loads(msg.data)
+                        if message.get('e') == 'listenKeyExpired':
+                            print("User-data stream listen key expired")
+                            break
+                        state.handle_message(message)
+                    await reconciliation
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"User-data stream error: {e}")
+            finally:
+                state.connected.clear()
+            print(f"User-data stream disconnected, reconnecting in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_reconnect_delay)
+
+# Function to keep the listen key alive and reconcile the state periodically
+async def maintain_user_data(exchange, state, reconcile_interval=position_reconcile_interval):
+    loop = asyncio.get_event_loop()
+    last_keepalive = time.monotonic()
+    while True:
+        await asyncio.sleep(reconcile_interval)
+        try:
+            if time.monotonic() - last_keepalive >= LISTEN_KEY_KEEPALIVE:
+                await loop.run_in_executor(None, keep_alive_listen_key, exchange)
+                last_keepalive = time.monotonic()
+            await loop.run_in_executor(None, state.reconcile, exchange)
+        except Exception as e:
+            print(f"Error maintaining the user-data stream: {e}")
+
+async def stream_user_data(exchange, state, base_url=user_data_stream_url, reconcile_interval=position_reconcile_interval):
+    await asyncio.gather(
+        follow_user_data(exchange, state, base_url),
+        maintain_user_data(exchange, state, min(reconcile_interval, LISTEN_KEY_KEEPALIVE)),
+    )
+
+# Function to run the user-data stream in a background thread next to the
+# synchronous strategy loop
+def start_user_data_stream(exchange, state, base_url=user_data_stream_url, reconcile_interval=position_reconcile_interval):
+    if hasattr(exchange, 'subscribe_user_data'):
+        # The mock exchange pushes its fills and cancels directly
+        state.reconcile(exchange)
+        exchange.subscribe_user_data(state.handle_message)
+        state.connected.set()
+        return None
+    thread = threading.Thread(
+        target=lambda: asyncio.new_event_loop().run_until_complete(
+            stream_user_data(exchange, state, base_url, reconcile_interval)),
+        name='user-data-stream',
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+# Function to build an ORDER_TRADE_UPDATE message like Binance sends
+def order_update_message(symbol, order_id, side, order_type, status, price, quantity, filled=0.0,
+                         reduce_only=False, event_time=None):
+    event_time = int(time.time() * 1000) if event_time is None else event_time
+    return {
+        'e': 'ORDER_TRADE_UPDATE',
+        'E': event_time,
+        'T': event_time,
+        'o': {
+            's': symbol, 'i': order_id, 'S': side, 'o': order_type, 'X': status,
+            'p': str(price), 'q': str(quantity), 'z': str(filled), 'R': reduce_only,
+        },
+    }
+
+# Function to build an ACCOUNT_UPDATE message for one position
+def account_update_message(symbol, position_amt, entry_price, unrealized_pnl=0.0, event_time=None):
+    event_time = int(time.time() * 1000) if event_time is None else event_time
+    return {
+        'e': 'ACCOUNT_UPDATE',
+        'E': event_time,
+        'T': event_time,
+        'a': {
+            'm': 'ORDER',
+            'B': [],
+            'P': [{'s': symbol, 'pa': str(position_amt), 'ep': str(entry_price), 'up': str(unrealized_pnl), 'ps': 'BOTH'}],
+        },
+    }
+
+# Local stand-in for the Binance user-data stream endpoint. Every connected
+# client receives the messages passed to publish()
+class FakeUserDataServer:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.clients = set()
+        self.runner = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def handle(self, request):
+        from aiohttp import web
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.clients.add(ws)
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            self.clients.discard(ws)
+        return ws
+
+    async def publish(self, message):
+        for ws in list(self.clients):
+            await ws.send_str(json.dumps(message))
+
+    async def start(self):
+        # The server side of aiohttp is only loaded by offline tests
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/ws/{listen_key}', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        # Pick up the real port when an ephemeral one was requested
+        self.port = self.runner.addresses[0][1]
+        return self.url
+
+    async def stop(self):
+        for ws in list(self.clients):
+            await ws.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
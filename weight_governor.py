@@ -0,0 +1,129 @@
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from config import weight_governor_path, weight_limit_per_minute
+from metrics import RATE_LIMIT_WAIT_SECONDS, RATE_LIMIT_HITS
+
+# Layout of the shared state: available weight, time of the last refill, time
+# until which every process must stay silent after a 429/418
+_STATE = struct.Struct('<ddd')
+
+# Request weight budget shared by every bot process using the same API key/IP.
+# The token bucket lives in a small memory-mapped file guarded by flock, so
+# main.py, run.py, 2.py and telegram_bot.py all draw from the same bucket
+class WeightGovernor:
+    def __init__(self, path=weight_governor_path, limit_per_minute=weight_limit_per_minute):
+        self.path = path
+        self.limit = float(limit_per_minute)
+        self.refill_rate = self.limit / 60.0
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            if os.fstat(self.fd).st_size < _STATE.size:
+                os.ftruncate(self.fd, _STATE.size)
+        self.state = mmap.mmap(self.fd, _STATE.size)
+
+    @contextmanager
+    def _locked(self):
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    # Read the shared state, refilled up to now (callers must hold the lock)
+    def _read(self, now):
+        tokens, last_refill, ban_until = _STATE.unpack_from(self.state)
+        if last_refill == 0:
+            # First process to use a fresh state file
+            return self.limit, ban_until
+        tokens = min(self.limit, tokens + (now - last_refill) * self.refill_rate)
+        return tokens, ban_until
+
+    def _write(self, tokens, now, ban_until):
+        _STATE.pack_into(self.state, 0, tokens, now, ban_until)
+
+    # Function to take weight from the bucket; returns 0 when granted, otherwise
+    # the number of seconds to wait before trying again
+    def reserve(self, weight):
+        weight = min(float(weight or 1), self.limit)
+        now = time.time()
+        with self._locked():
+            tokens, ban_until = self._read(now)
+            if now < ban_until:
+                wait = ban_until - now
+            elif tokens >= weight:
+                tokens -= weight
+                wait = 0
+            else:
+                wait = (weight - tokens) / self.refill_rate
+            self._write(tokens, now, ban_until)
+        return wait
+
+    # Function to block until the weight is available
+    def acquire(self, weight=1):
+        wait = self.reserve(weight)
+        while wait > 0:
+            RATE_LIMIT_WAIT_SECONDS.inc(wait, limiter='governor')
+            time.sleep(wait)
+            wait = self.reserve(weight)
+
+    async def acquire_async(self, weight=1):
+        wait = self.reserve(weight)
+        while wait > 0:
+            RATE_LIMIT_WAIT_SECONDS.inc(wait, limiter='governor')
+            await asyncio.sleep(wait)
+            wait = self.reserve(weight)
+
+    # Function to correct the bucket from Binance response headers. The used
+    # weight header covers every client on the IP, so it wins when it reports
+    # less headroom than we think we have; a 429/418 stops the whole fleet for
+    # Retry-After seconds
+    def update(self, headers, status=None):
+        headers = {str(key).lower(): value for key, value in (headers or {}).items()}
+        used = headers.get('x-mbx-used-weight-1m', headers.get('x-mbx-used-weight'))
+        retry_after = headers.get('retry-after')
+        if used is None and status not in (418, 429):
+            return
+
+        now = time.time()
+        with self._locked():
+            tokens, ban_until = self._read(now)
+            if used is not None:
+                tokens = min(tokens, self.limit - float(used))
+            if status in (418, 429):
+                RATE_LIMIT_HITS.inc(status=status)
+                ban_until = max(ban_until, now + float(retry_after or 60))
+                print(f"Binance rate limit hit ({status}), pausing all requests for {ban_until - now:.0f}s")
+            self._write(tokens, now, ban_until)
+
+_governor = None
+
+# Function to get the process-wide governor
+def get_governor():
+    global _governor
+    if _governor is None:
+        _governor = WeightGovernor()
+    return _governor
+
+# Function to route every request of a ccxt exchange (sync or async) through
+# the governor. ccxt passes the endpoint weight to throttle() as the cost
+def govern_exchange(exchange, governor=None):
+    governor = governor or get_governor()
+    exchange.enableRateLimit = True
+    if asyncio.iscoroutinefunction(exchange.fetch):
+        exchange.throttle = governor.acquire_async
+    else:
+        exchange.throttle = governor.acquire
+
+    on_rest_response = exchange.on_rest_response
+
+    def governed_on_rest_response(code, reason, url, method, response_headers, response_body, request_headers, request_body):
+        governor.update(response_headers, code)
+        return on_rest_response(code, reason, url, method, response_headers, response_body, request_headers, request_body)
+
+    exchange.on_rest_response = governed_on_rest_response
+    return exchange